@@ -0,0 +1,112 @@
+#!/usr/bin/env python3
+"""
+Inference benchmark for Ctrl-ARM
+Times one gesture decision the way the controllers make it, through
+sklearn, the artifact's array tree and the compiled tree, and the feature
+vector behind it computed in full or only for the features a tree reads
+"""
+
+import argparse
+import time
+
+import numpy as np
+from sklearn.preprocessing import StandardScaler
+from sklearn.tree import DecisionTreeClassifier
+
+from feature_registry import window_features, set_window, LazyExtractor, FEATURE_SETS, CLASSIC
+from model_artifact import compile_tree, ArrayTree, ArrayScaler
+from train_model import load_dataset, load_recordings, DATA_DIR
+
+
+def load_windows(feature_set=CLASSIC):
+    X, y, _ = load_dataset(sorted(DATA_DIR.glob('*.csv')), feature_set=feature_set)
+    return X, y
+
+
+def raw_windows(size, count, seed=0):
+    """`count` random (emg1, emg2) windows of `size` samples from the recordings"""
+    recordings = [emg for _, emg in load_recordings() if len(emg) > size]
+    rng = np.random.default_rng(seed)
+    windows = []
+    for _ in range(count):
+        emg = recordings[rng.integers(len(recordings))]
+        start = rng.integers(len(emg) - size)
+        windows.append((emg[start:start + size, 0], emg[start:start + size, 1]))
+    return windows
+
+
+def time_per_call(decide, rows, repeats=3):
+    """Best of `repeats` passes over rows, in microseconds per call"""
+    best = np.inf
+    for _ in range(repeats):
+        start = time.perf_counter()
+        for row in rows:
+            decide(row)
+        best = min(best, (time.perf_counter() - start) / len(rows))
+    return best * 1e6
+
+
+def benchmark(model, scaler, X, rows):
+    nodes = model.tree_
+    array_tree = ArrayTree(nodes.children_left, nodes.children_right, nodes.feature, nodes.threshold,
+                           nodes.value[:, 0, :].argmax(axis=1), model.classes_)
+    array_scaler = ArrayScaler(scaler.mean_, scaler.scale_)
+    compiled = compile_tree(model, scaler)
+    sample = [row.tolist() for row in X[rows]]
+
+    # the controllers hand in a list of floats per window
+    timings = {
+        'sklearn': time_per_call(lambda f: model.predict(scaler.transform([f]))[0], sample),
+        'array tree': time_per_call(lambda f: array_tree.predict(array_scaler.transform([f]))[0], sample),
+        'compiled': time_per_call(compiled.predict_one, sample),
+    }
+    start = time.perf_counter()
+    compiled.predict(X)
+    timings['compiled, batch'] = (time.perf_counter() - start) / len(X) * 1e6
+    return timings
+
+
+def feature_benchmark(feature_set, count, baseline=(30.0, 35.0)):
+    """us per window for the full vector and for only what a depth 4 tree reads"""
+    X, y = load_windows(feature_set)
+    scaler = StandardScaler().fit(X)
+    model = DecisionTreeClassifier(max_depth=4, random_state=42).fit(scaler.transform(X), y)
+    lazy = LazyExtractor(feature_set, compile_tree(model, scaler).used_features)
+    windows = raw_windows(set_window(feature_set), count)
+
+    with np.errstate(invalid='ignore', divide='ignore'):
+        full_us = time_per_call(lambda w: window_features(*w, *baseline, feature_set), windows)
+        lazy_us = time_per_call(lambda w: lazy.window_features(*w, *baseline), windows)
+    return full_us, lazy_us, lazy.names, X.shape[1]
+
+
+def main():
+    parser = argparse.ArgumentParser(description='Time one gesture decision per inference path')
+    parser.add_argument('--windows', type=int, default=2000, help='windows timed one at a time')
+    args = parser.parse_args()
+
+    print("inference benchmark")
+    print("-" * 60)
+    X, y = load_windows()
+    rows = np.random.default_rng(0).integers(0, len(X), size=args.windows)
+    print(f"{len(X)} windows, {args.windows} timed one at a time\n")
+
+    scaler = StandardScaler().fit(X)
+    for max_depth in (4, 12):
+        model = DecisionTreeClassifier(max_depth=max_depth, random_state=42).fit(scaler.transform(X), y)
+        timings = benchmark(model, scaler, X, rows)
+        print(f"depth {max_depth} tree ({model.tree_.node_count} nodes)")
+        for name, us in timings.items():
+            print(f"  {name:16s} {us:9.2f} us/decision  {timings['sklearn'] / us:7.1f}x")
+        print()
+
+    print("feature vector per window, depth 4 tree")
+    for feature_set in FEATURE_SETS:
+        full_us, lazy_us, names, total = feature_benchmark(feature_set, args.windows)
+        print(f"  {feature_set:12s} all {total:2d}: {full_us:7.1f} us   used {len(names):2d}: {lazy_us:7.1f} us"
+              f"  {full_us / lazy_us:5.1f}x")
+        print(f"  {'':12s} {', '.join(names)}")
+
+
+if __name__ == "__main__":
+    main()
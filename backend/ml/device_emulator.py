@@ -0,0 +1,240 @@
+#!/usr/bin/env python3
+"""
+XIAO device emulator for Ctrl-ARM
+Opens a pseudo-terminal and writes the same byte stream as
+xiao_data_streamer.ino, boot banner included, so anything that opens a
+serial port can be run end to end without the board (linux / macOS only)
+"""
+
+import argparse
+import os
+import threading
+import time
+import tty
+
+import numpy as np
+
+from serial_ingest import EMG1, EMG2, ACCEL_X, GYRO_Z
+from sensor_source import ReplaySource, SyntheticSource
+from wire_protocol import encode_frames
+
+
+def format_csv(block):
+    """Sample rows exactly as the firmware prints them"""
+    lines = []
+    for row in block.tolist():
+        lines.append(f"{int(row[0])},{int(row[EMG1])},{int(row[EMG2])},"
+                     + ",".join(f"{v:.3f}" for v in row[ACCEL_X:GYRO_Z + 1]))
+    return ("\r\n".join(lines) + "\r\n").encode() if lines else b''
+
+
+class DeviceEmulator:
+    """Streams samples from a playback source into a pty like the real board.
+
+    Connect to `port` with pyserial as if it were the XIAO. Samples are
+    taken every 1000 / rate_hz ms with normally distributed jitter_ms on the
+    sample time; each sample is dropped with probability `dropout` and has a
+    random byte flipped with probability `corrupt`. Nothing blocks if no
+    one is reading: like the board's tx buffer, up to tx_buffer bytes wait
+    for the reader and whole samples past that are counted and lost.
+    """
+
+    def __init__(self, source=None, protocol='csv', rate_hz=200, jitter_ms=0.0, dropout=0.0,
+                 corrupt=0.0, boot_delay=0.4, tx_buffer=4096, seed=0):
+        self.source = source or SyntheticSource(rate_hz=rate_hz, seed=seed)
+        self.protocol = protocol
+        self.rate_hz = rate_hz
+        self.jitter_ms = jitter_ms
+        self.dropout = dropout
+        self.corrupt = corrupt
+        self.boot_delay = boot_delay
+        self.tx_buffer = tx_buffer
+        self.unsent = b''
+        self.rng = np.random.default_rng(seed)
+
+        self.master = None
+        self.slave = None
+        self.port = None
+        self.thread = None
+        self.is_running = False
+
+        self.samples_sent = 0
+        self.samples_dropped = 0
+        self.samples_corrupted = 0
+        self.bytes_lost = 0
+
+    def start(self):
+        """Create the pty and start streaming, returns the port path"""
+        self.master, self.slave = os.openpty()
+        tty.setraw(self.slave)
+        os.set_blocking(self.master, False)
+        self.port = os.ttyname(self.slave)
+
+        self.source.open()
+        self.is_running = True
+        self.thread = threading.Thread(target=self.stream, daemon=True)
+        self.thread.start()
+        return self.port
+
+    def stop(self):
+        self.is_running = False
+        if self.thread:
+            self.thread.join(timeout=1)
+        for fd in (self.master, self.slave):
+            if fd is not None:
+                os.close(fd)
+        self.master = self.slave = None
+        self.source.close()
+
+    def __enter__(self):
+        self.start()
+        return self
+
+    def __exit__(self, *exc):
+        self.stop()
+
+    def write(self, data):
+        # drop whole chunks, never part of a line or frame
+        if len(self.unsent) > self.tx_buffer:
+            self.bytes_lost += len(data)
+            data = b''
+        data = self.unsent + data
+        try:
+            written = os.write(self.master, data) if data else 0
+        except (BlockingIOError, OSError):
+            written = 0
+        self.unsent = data[written:]
+
+    def banner(self):
+        lines = ["# Starting XIAO"]
+        baseline = self.source.generate(0, 1)[0]
+        lines.append(f"# EMG1 on pin A0 reads: {int(baseline[EMG1])}")
+        lines.append(f"# EMG2 on pin A1 reads: {int(baseline[EMG2])}")
+        lines.append("# IMU working woohooo")
+        lines.append(f"# format: {self.protocol}")
+        return ("\r\n".join(lines) + "\r\n").encode()
+
+    def encode(self, block):
+        if self.protocol == 'binary':
+            return encode_frames(block)
+        return format_csv(block)
+
+    def stream(self):
+        time.sleep(self.boot_delay)
+        self.write(self.banner())
+
+        period = 1.0 / self.rate_hz
+        start = time.time()
+        index = 0
+        while self.is_running:
+            # take every sample that is due, batched like usb cdc transfers
+            due = int((time.time() - start) / period) + 1 - index
+            if due > 0:
+                send_times = (index + np.arange(due)) * period
+                if self.jitter_ms:
+                    send_times = send_times + self.rng.normal(0, self.jitter_ms / 1000.0, due)
+                send_times = np.maximum.accumulate(np.maximum(send_times, 0))
+
+                block = self.source.generate(self.source.position, self.source.position + due)
+                self.source.position += len(block)
+                if len(block) == 0:
+                    break
+                # millis() since setup() finished, like the firmware
+                block[:, 0] = np.floor(send_times[:len(block)] * 1000.0)
+                index += len(block)
+
+                keep = self.rng.random(len(block)) >= self.dropout
+                self.samples_dropped += int(np.count_nonzero(~keep))
+                self.send(block[keep])
+
+            next_time = start + index * period
+            time.sleep(max(0.0, min(next_time - time.time(), 0.01)))
+
+    def send(self, block):
+        if len(block) == 0:
+            return
+        corrupt = self.rng.random(len(block)) < self.corrupt
+        if not np.any(corrupt):
+            self.write(self.encode(block))
+        else:
+            data = bytearray()
+            for row, bad in zip(block, corrupt):
+                chunk = bytearray(self.encode(row[None, :]))
+                if bad:
+                    chunk[self.rng.integers(len(chunk))] ^= 1 << int(self.rng.integers(8))
+                data += chunk
+            self.samples_corrupted += int(np.count_nonzero(corrupt))
+            self.write(bytes(data))
+        self.samples_sent += len(block)
+
+    def report(self):
+        return (f"sent {self.samples_sent}, dropped {self.samples_dropped}, "
+                f"corrupted {self.samples_corrupted}, {self.bytes_lost} bytes lost unread")
+
+
+def check_connect(port, settle=1.5):
+    """Open the emulated port like the controllers do and time the first samples"""
+    from sensor_source import SerialSource
+
+    started = time.time()
+    source = SerialSource(port, settle=settle)
+    source.open()
+    opened = time.time()
+
+    first = None
+    received = 0
+    while time.time() - opened < 2:
+        block = source.read_block()
+        if len(block) and first is None:
+            first = time.time()
+        received += len(block)
+    source.close()
+
+    print(f"banner: {source.comments}")
+    print(f"open + settle: {(opened - started) * 1000:.0f} ms")
+    if first is not None:
+        print(f"first sample after open: {(first - opened) * 1000:.1f} ms")
+        print(f"connect to first sample: {(first - started) * 1000:.0f} ms")
+    print(f"samples in 2 s: {received}")
+    for line in source.health.report():
+        print(f"  {line}")
+
+
+def main():
+    parser = argparse.ArgumentParser(description='Emulate the XIAO data streamer on a pseudo-terminal')
+    parser.add_argument('--replay', nargs='+', metavar='CSV', help='stream recorded csv files instead of a synthetic signal')
+    parser.add_argument('--binary', action='store_true', help='send binary frames instead of csv')
+    parser.add_argument('--rate', type=float, default=200, help='samples per second')
+    parser.add_argument('--jitter', type=float, default=0.0, help='sample time jitter std in ms')
+    parser.add_argument('--dropout', type=float, default=0.0, help='probability of dropping each sample')
+    parser.add_argument('--corrupt', type=float, default=0.0, help='probability of flipping a bit in each sample')
+    parser.add_argument('--check', action='store_true', help='connect to the emulator and report timings, then exit')
+    parser.add_argument('--port-scan', action='store_true', help='run port_scanner.test_port against the emulator, then exit')
+    args = parser.parse_args()
+
+    source = ReplaySource(args.replay, loop=True, rate_hz=args.rate) if args.replay else None
+    emulator = DeviceEmulator(source, protocol='binary' if args.binary else 'csv', rate_hz=args.rate,
+                              jitter_ms=args.jitter, dropout=args.dropout, corrupt=args.corrupt)
+    port = emulator.start()
+    print(f"emulated XIAO on {port}")
+
+    try:
+        if args.check:
+            check_connect(port)
+        elif args.port_scan:
+            from port_scanner import test_port
+            test_port(port)
+        else:
+            print("press ctrl+c to stop")
+            while True:
+                time.sleep(5)
+                print(emulator.report())
+    except KeyboardInterrupt:
+        pass
+    finally:
+        emulator.stop()
+        print(emulator.report())
+
+
+if __name__ == "__main__":
+    main()
@@ -1,35 +1,53 @@
-import serial
 import serial.tools.list_ports
 import numpy as np
 import pyautogui
 import time
-import threading
-import queue
+from concurrent.futures import ThreadPoolExecutor
 from collections import deque
 from pathlib import Path
 import pickle
-from sklearn.tree import DecisionTreeClassifier
-from sklearn.preprocessing import StandardScaler
 import json
 import websockets
 import asyncio
+import argparse
 import yaml
+from serial_ingest import NUM_COLUMNS, HOST_TIME, EMG1, EMG2
+from sensor_source import SerialSource, add_source_arguments, source_from_args
+from port_discovery import discover_device
+from ring_buffer import RingBuffer
+from emg_filter import (ConditionedSource, add_conditioning_arguments, conditioning_from_args,
+                        ENVELOPE_ACTIVATION, ENVELOPE_STRONG)
+from feature_engine import IncrementalFeatures
+from feature_registry import window_features, LazyExtractor, feature_names, set_window, CLASSIC, LEFT_ACTIVITY, RIGHT_ACTIVITY
+from model_artifact import load_artifact, compile_tree, ARTIFACT_PATH
+from gesture_cascade import CascadeStages
+from personalization import OnlineGestureModel, CHECKPOINT_PATH
 
 pyautogui.FAILSAFE = True
 pyautogui.PAUSE = 0.001
 
-class SmartEMGController:
-    def __init__(self):
+class SmartEMGController(CascadeStages):
+    # threshold gestures are named after the gesture config
+    single_gestures = {'left': ('left_single', 'left_hard'), 'right': ('right_single', 'right_hard')}
+
+    def __init__(self, source=None, port=None, conditioning=None):
         print("\n" + "="*60)
         print(" "*15 + "SMART EMG CONTROL")
         print("="*60)
 
-        self.serial_conn = None
-        self.connect_device()
+        # any SensorSource, the serial device unless one is passed in
+        self.source = None
+        if source is None:
+            self.connect_device(port)
+        else:
+            self.open_source(source)
 
-        self.emg1_buffer = deque(maxlen=30)
-        self.emg2_buffer = deque(maxlen=30)
-        self.data_queue = queue.Queue(maxsize=200)
+        # ~5 s of samples, windows are zero-copy slices of this
+        self.samples = RingBuffer(capacity=1024, channels=NUM_COLUMNS)
+        self.skipped_windows = 0
+        # windows the tree scored together after the loop fell behind
+        self.batched_windows = 0
+        self.backlog_batches = 0
 
         self.baseline_left = 0
         self.baseline_right = 0
@@ -43,14 +61,42 @@ class SmartEMGController:
         
         # ml model
         self.decision_tree = None
-        self.scaler = StandardScaler()
+        self.scaler = None
+        self.model_conditioning = None
+        self.model_calibration = None
+        self.feature_set = CLASSIC
         self.load_model()
+
+        # a model trained on conditioned emg needs the same chain in front of it
+        if conditioning is None:
+            conditioning = self.model_conditioning
+        if conditioning and self.source:
+            self.source = ConditionedSource(self.source, **conditioning)
+            print(f"conditioning emg: {conditioning}")
+            # the envelope is on a much smaller scale than raw adc counts
+            self.activation_threshold = ENVELOPE_ACTIVATION
+            self.strong_threshold = ENVELOPE_STRONG
+        # calibration never goes below the default for the signal
+        self.activation_floor = self.activation_threshold
         
         # fast processing settings
         self.window_size = 15
-        self.process_interval = 15
+        self.process_interval = 15  # 1 classifies on every sample
+        self.features = IncrementalFeatures(self.window_size)
+        # history the model's feature set needs, e.g. longer windows for spectra
+        self.model_window = max(self.window_size, set_window(self.feature_set, self.window_size))
+        # only the features the tree splits on are computed for its decisions
+        self.extractor = LazyExtractor(self.feature_set, getattr(self.decision_tree, 'used_features', None))
+
+        # the user's own model, learns from windows the visualizer confirms or corrects
+        self.personal = OnlineGestureModel(feature_names(self.feature_set))
+        if self.personal.load():
+            print(f"loaded personal model: {self.personal.summary()}")
+        self.last_detection = None  # (gesture, window) of the last non-rest window
+        self.checkpoint_interval = 30
         
         self.is_running = False
+        self.last_display_time = 0
         self.last_action_time = 0
         self.action_cooldown = 0.3
         
@@ -60,15 +106,20 @@ class SmartEMGController:
         self.min_gesture_duration = 2
         
         self.gesture_counts = {}
-        self.threshold_count = 0
-        self.ml_count = 0
         
-        # WebSocket server for real-time visualization
+        # WebSocket server for real-time visualization, started with the control loop
         self.websocket_server = None
         self.connected_clients = set()
-        self.start_websocket_server()
+        self.outgoing = None
+
+        # pyautogui calls block, they run one at a time off the control loop
+        self.action_executor = ThreadPoolExecutor(max_workers=1)
+        self.loop = None
+        self.data_ready = None
         
         self.gesture_config = self.load_gesture_config()
+
+        self.build_cascade((getattr(self, 'full_config', None) or {}).get('cascade'))
         self.last_config_check = time.time()
         self.config_check_interval = 5  # Check config every 5 seconds
 
@@ -146,6 +197,20 @@ class SmartEMGController:
 
     def load_model(self):
         # load existing model if available
+        # the numpy artifact loads without sklearn, the pickle is the fallback
+        if ARTIFACT_PATH.exists():
+            try:
+                tree, scaler, schema = load_artifact(ARTIFACT_PATH)
+                # scaler folded into the thresholds, one decision is a few float compares
+                self.decision_tree = compile_tree(tree, scaler)
+                self.scaler = None
+                self.model_conditioning = schema.get('conditioning')
+                self.feature_set = schema['feature_set']
+                print(f"loaded decision tree model ({len(schema['labels'])} labels, {ARTIFACT_PATH.name})")
+                return
+            except (OSError, ValueError, KeyError) as e:
+                print(f"ignoring {ARTIFACT_PATH.name}: {e}")
+
         model_path = Path(__file__).parent / "emg_model.pkl"
         if model_path.exists():
             try:
@@ -153,6 +218,12 @@ class SmartEMGController:
                     data = pickle.load(f)
                     self.decision_tree = data['model']
                     self.scaler = data['scaler']
+                    self.model_conditioning = data.get('conditioning')
+                    self.model_calibration = data.get('calibration')
+                    self.feature_set = data.get('feature_set', CLASSIC)
+                    compiled = compile_tree(self.decision_tree, self.scaler, calibration=self.model_calibration)
+                    if compiled:
+                        self.decision_tree, self.scaler = compiled, None
                     print("loaded decision tree model")
             except:
                 print("no ml model found, using thresholds only")
@@ -161,31 +232,36 @@ class SmartEMGController:
             print("using threshold detection only")
             self.decision_tree = None
 
-    def connect_device(self):
+    def connect_device(self, port=None):
         print("\nconnecting to device...")
 
-        ports = list(serial.tools.list_ports.comports())
-        if not ports:
-            print("no devices found!")
-            return False
+        # an explicit port skips discovery, e.g. the device emulator's pty
+        if not port:
+            # probe every port at once, a streaming board needs no settle time
+            port, conn = discover_device()
+            if port:
+                return self.open_source(SerialSource(port, serial_conn=conn))
 
-        port = None
-        for p in ports:
-            if any(x in p.description for x in ['XIAO', 'Arduino', 'USB Serial']):
-                port = p.device
-                break
+            ports = list(serial.tools.list_ports.comports())
+            if not ports:
+                print("no devices found!")
+                return False
 
-        if not port:
-            port = ports[0].device
+            for p in ports:
+                if any(x in p.description for x in ['XIAO', 'Arduino', 'USB Serial']):
+                    port = p.device
+                    break
 
-        try:
-            self.serial_conn = serial.Serial(port, 115200, timeout=0.01)
-            time.sleep(1.5)
+            if not port:
+                port = ports[0].device
 
-            while self.serial_conn.in_waiting:
-                self.serial_conn.readline()
+        return self.open_source(SerialSource(port, settle=1.5))
 
-            print(f"connected to {port}")
+    def open_source(self, source):
+        try:
+            source.open()
+            self.source = source
+            print(f"connected to {source}")
             return True
 
         except Exception as e:
@@ -203,34 +279,27 @@ class SmartEMGController:
 
         print("\nreading baseline...")
 
-        baseline_data_left = []
-        baseline_data_right = []
+        blocks = []
 
         start_time = time.time()
         while time.time() - start_time < 2:
-            if self.serial_conn.in_waiting:
-                try:
-                    line = self.serial_conn.readline().decode('utf-8').strip()
-                    if line and not line.startswith('#'):
-                        values = line.split(',')
-                        if len(values) >= 9:
-                            baseline_data_left.append(int(values[1]))
-                            baseline_data_right.append(int(values[2]))
-                except:
-                    pass
+            block = self.source.read_block()
+            if len(block):
+                blocks.append(block)
 
-        if baseline_data_left:
-            self.baseline_left = np.mean(baseline_data_left)
-            self.baseline_right = np.mean(baseline_data_right)
-            self.noise_left = np.std(baseline_data_left)
-            self.noise_right = np.std(baseline_data_right)
+        if blocks:
+            baseline_data = np.concatenate(blocks)
+            self.baseline_left = np.mean(baseline_data[:, EMG1])
+            self.baseline_right = np.mean(baseline_data[:, EMG2])
+            self.noise_left = np.std(baseline_data[:, EMG1])
+            self.noise_right = np.std(baseline_data[:, EMG2])
 
             print(f"\ncalibration complete!")
             print(f"   left:  {self.baseline_left:.0f} +/- {self.noise_left:.0f}")
             print(f"   right: {self.baseline_right:.0f} +/- {self.noise_right:.0f}")
 
             # adjust threshold based on noise
-            min_threshold = max(40, self.noise_multiplier * max(self.noise_left, self.noise_right))
+            min_threshold = max(self.activation_floor, self.noise_multiplier * max(self.noise_left, self.noise_right))
             self.activation_threshold = min_threshold
             print(f"   activation threshold: {self.activation_threshold:.0f}")
 
@@ -239,144 +308,69 @@ class SmartEMGController:
             print("calibration failed - no data")
             return False
 
-    def start_websocket_server(self):
-        """Start WebSocket server for real-time data streaming"""
+    async def handle_client(self, websocket, path=None):
+        """Handle new WebSocket client connections"""
+        self.connected_clients.add(websocket)
+        print("Visualizer connected")
         try:
-            async def handle_client(websocket, path):
-                """Handle new WebSocket client connections"""
-                self.connected_clients.add(websocket)
-                print("Visualizer connected")
-                try:
-                    await websocket.wait_closed()
-                finally:
-                    self.connected_clients.discard(websocket)
-                    print("Visualizer disconnected")
-            
-            # Start WebSocket server in a separate thread
-            def run_server():
-                # Create new event loop for this thread
-                loop = asyncio.new_event_loop()
-                asyncio.set_event_loop(loop)
-                
+            # the gestures the visualizer can offer as corrections
+            await websocket.send(json.dumps({'type': 'hello', 'gestures': self.feedback_gestures()}))
+            async for message in websocket:
+                self.handle_feedback(message)
+        finally:
+            self.connected_clients.discard(websocket)
+            print("Visualizer disconnected")
+
+    def handle_feedback(self, message):
+        """Learn from the visualizer: {"type": "confirm"} or {"type": "correct", "gesture": name}"""
+        try:
+            feedback = json.loads(message)
+        except (TypeError, ValueError):
+            return
+        if not isinstance(feedback, dict):
+            return
+        label = self.learn_from_feedback(feedback.get('type'), feedback.get('gesture'))
+        if label:
+            print(f"\n[learned {label}: {self.personal.summary()}]")
+
+    async def checkpoint_personal_model(self):
+        """Save the personal model now and then, the write happens off the loop"""
+        while self.is_running:
+            await asyncio.sleep(self.checkpoint_interval)
+            if self.personal.dirty:
+                snapshot = self.personal.snapshot()
                 try:
-                    # Start the WebSocket server
-                    start_server = websockets.serve(handle_client, "localhost", 8765)
-                    loop.run_until_complete(start_server)
-                    print("WebSocket server started on ws://localhost:8765")
-                    loop.run_forever()
-                except Exception as e:
-                    print(f"WebSocket server error: {e}")
-                finally:
-                    loop.close()
-            
-            server_thread = threading.Thread(target=run_server, daemon=True)
-            server_thread.start()
-            
+                    await self.loop.run_in_executor(None, self.personal.save, CHECKPOINT_PATH, snapshot)
+                except OSError as e:
+                    print(f"\ncould not save personal model: {e}")
+
+    async def start_websocket_server(self):
+        """Start WebSocket server for real-time data streaming on the control loop"""
+        try:
+            self.websocket_server = await websockets.serve(self.handle_client, "localhost", 8765)
+            print("WebSocket server started on ws://localhost:8765")
         except Exception as e:
             print(f"Failed to start WebSocket server: {e}")
 
     def broadcast_data(self, data):
-        """Broadcast EMG data to all connected clients"""
-        if self.connected_clients:
-            message = json.dumps(data)
-            
-            # Create a task to send data to all clients
-            async def send_to_all():
-                disconnected = set()
-                for client in self.connected_clients:
-                    try:
-                        await client.send(message)
-                    except:
-                        disconnected.add(client)
-                # Remove disconnected clients
-                self.connected_clients -= disconnected
-            
-            # Try to get the event loop and schedule the task
-            try:
-                loop = asyncio.get_event_loop()
-                if loop.is_running():
-                    # If loop is running, create a task
-                    asyncio.create_task(send_to_all())
-                else:
-                    # If loop is not running, run until complete
-                    loop.run_until_complete(send_to_all())
-            except RuntimeError:
-                # No event loop in this thread, create a new one
-                loop = asyncio.new_event_loop()
-                asyncio.set_event_loop(loop)
-                loop.run_until_complete(send_to_all())
-                loop.close()
-
-    def extract_features(self, emg1_window, emg2_window):
-        # fast feature extraction for ml
-        emg1_array = np.array(emg1_window)
-        emg2_array = np.array(emg2_window)
-        
-        features = [
-            np.mean(emg1_array),
-            np.std(emg1_array),
-            np.max(emg1_array),
-            np.max(emg1_array) - np.min(emg1_array),
-            np.sqrt(np.mean(emg1_array**2)),
-            np.mean(emg2_array),
-            np.std(emg2_array),
-            np.max(emg2_array),
-            np.max(emg2_array) - np.min(emg2_array),
-            np.sqrt(np.mean(emg2_array**2)),
-            np.corrcoef(emg1_array, emg2_array)[0, 1] if len(emg1_array) > 1 else 0,
-            np.mean(emg1_array) - self.baseline_left,
-            np.mean(emg2_array) - self.baseline_right
-        ]
-        return features
+        """Queue EMG data for all connected clients, never waits on them"""
+        if not self.connected_clients:
+            return
+        if self.outgoing.full():
+            # the visualizer only needs the latest state, drop the oldest
+            self.outgoing.get_nowait()
+        self.outgoing.put_nowait(data)
 
-    def detect_gesture_smart(self, left_activity, right_activity, emg1_window, emg2_window):
-        # first try fast threshold detection
-        left_active = left_activity > self.activation_threshold
-        right_active = right_activity > self.activation_threshold
-        
-        # clear cases use thresholds for speed
-        if not left_active and not right_active:
-            self.threshold_count += 1
-            return 'rest'
-        
-        left_strong = left_activity > self.strong_threshold
-        right_strong = right_activity > self.strong_threshold
-        
-        # much lower thresholds for both actions (50% more sensitive for both)
-        both_activation = self.activation_threshold * 0.5  # 20 instead of 40
-        both_strong_threshold = self.strong_threshold * 0.6  # 120 instead of 200
-        left_active_both = left_activity > both_activation
-        right_active_both = right_activity > both_activation
-        left_strong_both = left_activity > both_strong_threshold
-        right_strong_both = right_activity > both_strong_threshold
-        
-        # check for both actions first with more sensitive thresholds
-        if left_active_both and right_active_both:
-            # use ml for better both gesture detection if available
-            if self.decision_tree:
-                try:
-                    features = self.extract_features(emg1_window, emg2_window)
-                    features_scaled = self.scaler.transform([features])
-                    gesture = self.decision_tree.predict(features_scaled)[0]
-                    self.ml_count += 1
-                    return gesture
-                except:
-                    pass
-            
-            # fallback to threshold logic with sensitive thresholds
-            self.threshold_count += 1
-            return 'both_strong' if (left_strong_both and right_strong_both) else 'both_flex'
-        
-        # single muscle actions use normal thresholds
-        self.threshold_count += 1
-        
-        if left_active and not right_active:
-            return 'left_hard' if left_strong else 'left_single'
-        elif right_active and not left_active:
-            return 'right_hard' if right_strong else 'right_single'
-        else:
-            # shouldn't reach here but default to both_flex
-            return 'both_flex'
+    async def broadcaster(self):
+        while self.is_running:
+            message = json.dumps(await self.outgoing.get())
+            clients = list(self.connected_clients)
+            results = await asyncio.gather(*(client.send(message) for client in clients),
+                                           return_exceptions=True)
+            # Remove disconnected clients
+            for client, result in zip(clients, results):
+                if isinstance(result, Exception):
+                    self.connected_clients.discard(client)
 
     def execute_action(self, gesture):
         current_time = time.time()
@@ -425,101 +419,141 @@ class SmartEMGController:
         except Exception as e:
             print(f"Error sending key '{key_combo}': {e}")
 
-    def read_serial_data(self):
+    def add_block(self, block):
+        if len(block):
+            self.samples.push(block)
+            self.data_ready.set()
+
+    def read_ready(self, fd, lost):
+        """Called by the loop when the port has bytes, reads them all"""
+        try:
+            self.add_block(self.source.read_block())
+        except Exception as e:
+            print(f"\nread error: {e}")
+        # the source dropped this fd, e.g. it is reconnecting
+        if self.source.fileno() != fd and not lost.done():
+            lost.set_result(None)
+
+    async def read_serial_data(self):
+        loop = asyncio.get_running_loop()
         while self.is_running:
+            fd = self.source.fileno()
+            if fd is None:
+                # replay, shared memory or a port that can't be polled,
+                # read on a worker thread (blocks for at most the timeout)
+                try:
+                    self.add_block(await loop.run_in_executor(None, self.source.read_block))
+                except Exception as e:
+                    # serial sources reconnect on their own, don't spin on anything else
+                    print(f"\nread error: {e}")
+                    await asyncio.sleep(0.1)
+                continue
+
+            # the port wakes the loop directly, no thread in between
+            lost = loop.create_future()
+            loop.add_reader(fd, self.read_ready, fd, lost)
             try:
-                if self.serial_conn and self.serial_conn.in_waiting:
-                    line = self.serial_conn.readline().decode('utf-8').strip()
-                    
-                    if line and not line.startswith('#'):
-                        values = line.split(',')
-                        if len(values) >= 9:
-                            emg1 = int(values[1])
-                            emg2 = int(values[2])
-                            
-                            if self.data_queue.qsize() > 150:
-                                try:
-                                    self.data_queue.get_nowait()
-                                except:
-                                    pass
-                            
-                            self.data_queue.put((emg1, emg2))
-            except:
-                pass
-            
-            time.sleep(0.001)
+                await lost
+            finally:
+                loop.remove_reader(fd)
+
+    def execute_action_safely(self, gesture):
+        try:
+            self.execute_action(gesture)
+        except Exception as e:
+            print(f"\naction failed: {e}")
+
+    def process_window(self, window, features=None, tree_result=None):
+        # window is model_window long, the last window_size samples drive the thresholds
+        left_data = window[-self.window_size:, EMG1]
+        right_data = window[-self.window_size:, EMG2]
+
+        # the classic set holds the activity, the model may want another set
+        if features is None:
+            features = window_features(left_data, right_data, self.baseline_left, self.baseline_right)
+        left_activity = features[LEFT_ACTIVITY]
+        right_activity = features[RIGHT_ACTIVITY]
+        if self.feature_set != CLASSIC:
+            features = None
+        
+        # smart detection uses both threshold and ml
+        gesture = self.detect_gesture_smart(left_activity, right_activity,
+                                            window[:, EMG1], window[:, EMG2], features, tree_result)
+        self.gesture_history.append(gesture)
+        if gesture != 'rest':
+            # kept for feedback, the ring slot will be overwritten
+            self.last_detection = (gesture, window.copy())
+
+        # Broadcast real-time data to visualizer
+        self.broadcast_data({
+            'timestamp': window[-1, HOST_TIME],
+            'emg1': int(left_data[-1]),
+            'emg2': int(right_data[-1]),
+            'left_activity': left_activity,
+            'right_activity': right_activity,
+            'gesture': gesture,
+            'baseline_left': self.baseline_left,
+            'baseline_right': self.baseline_right,
+            'activation_threshold': self.activation_threshold,
+            'strong_threshold': self.strong_threshold,
+            # what a confirm or correct from the visualizer would apply to
+            'last_detection': self.last_detection[0] if self.last_detection else None
+        })
 
-    def process_data(self):
+        current_time = time.time()
+        
+        # Periodically reload config to pick up changes
+        if current_time - self.last_config_check > self.config_check_interval:
+            new_config = self.load_gesture_config()
+            if new_config != self.gesture_config:
+                self.gesture_config = new_config
+                print("\n[Config reloaded]")
+            self.last_config_check = current_time
+        
+        if current_time - self.last_display_time > 0.15:
+            left_bar = "=" * min(10, int(left_activity / 10))
+            right_bar = "=" * min(10, int(right_activity / 10))
+
+            status = f"\rl:{left_activity:+4.0f} {left_bar:10s} | "
+            status += f"r:{right_activity:+4.0f} {right_bar:10s} | "
+            status += f"[{gesture:12s}]"
+
+            print(status, end='', flush=True)
+            self.last_display_time = current_time
+
+        if gesture != 'rest':
+            recent = list(self.gesture_history)[-self.min_gesture_duration:]
+            if len(recent) >= self.min_gesture_duration and all(g == gesture for g in recent):
+                self.loop.run_in_executor(self.action_executor, self.execute_action_safely, gesture)
+                self.gesture_history.clear()
+
+    async def process_data(self):
         print("\ncontrol active")
         print("-"*60)
 
-        last_display_time = time.time()
-        sample_count = 0
+        self.last_display_time = time.time()
+        processed = self.samples.total
 
         while self.is_running:
-            try:
-                if not self.data_queue.empty():
-                    emg1, emg2 = self.data_queue.get_nowait()
-                    self.emg1_buffer.append(emg1)
-                    self.emg2_buffer.append(emg2)
-                    sample_count += 1
-
-                    if sample_count % self.process_interval == 0 and len(self.emg1_buffer) >= self.window_size:
-                        left_data = list(self.emg1_buffer)[-self.window_size:]
-                        right_data = list(self.emg2_buffer)[-self.window_size:]
-                        
-                        left_activity = np.mean(left_data) - self.baseline_left
-                        right_activity = np.mean(right_data) - self.baseline_right
-                        
-                        # smart detection uses both threshold and ml
-                        gesture = self.detect_gesture_smart(left_activity, right_activity, left_data, right_data)
-                        self.gesture_history.append(gesture)
-
-                        # Broadcast real-time data to visualizer
-                        self.broadcast_data({
-                            'timestamp': time.time(),
-                            'emg1': emg1,
-                            'emg2': emg2,
-                            'left_activity': left_activity,
-                            'right_activity': right_activity,
-                            'gesture': gesture,
-                            'baseline_left': self.baseline_left,
-                            'baseline_right': self.baseline_right,
-                            'activation_threshold': self.activation_threshold,
-                            'strong_threshold': self.strong_threshold
-                        })
-
-                        current_time = time.time()
-                        
-                        # Periodically reload config to pick up changes
-                        if current_time - self.last_config_check > self.config_check_interval:
-                            new_config = self.load_gesture_config()
-                            if new_config != self.gesture_config:
-                                self.gesture_config = new_config
-                                print("\n[Config reloaded]")
-                            self.last_config_check = current_time
-                        
-                        if current_time - last_display_time > 0.15:
-                            left_bar = "=" * min(10, int(left_activity / 10))
-                            right_bar = "=" * min(10, int(right_activity / 10))
-
-                            status = f"\rl:{left_activity:+4.0f} {left_bar:10s} | "
-                            status += f"r:{right_activity:+4.0f} {right_bar:10s} | "
-                            status += f"[{gesture:12s}]"
-
-                            print(status, end='', flush=True)
-                            last_display_time = current_time
-
-                        if gesture != 'rest':
-                            recent = list(self.gesture_history)[-self.min_gesture_duration:]
-                            if len(recent) >= self.min_gesture_duration and all(g == gesture for g in recent):
-                                self.execute_action(gesture)
-                                self.gesture_history.clear()
-
-            except Exception:
-                pass
-
-            time.sleep(0.002)
+            # sleep until the reader adds a block, then handle all of it
+            await self.data_ready.wait()
+            self.data_ready.clear()
+            total = self.samples.total
+
+            # every sample goes through the feature engine, a window is
+            # classified when it ends on a process_interval boundary
+            pending = self.collect_windows(processed, total)
+
+            # more than one window waiting, the tree scores all of them in one
+            # call and the labels go through the debouncer in order
+            tree_results = self.classify_backlog(pending) if len(pending) > 1 else [None] * len(pending)
+            for (window, features), tree_result in zip(pending, tree_results):
+                try:
+                    self.process_window(window, features, tree_result)
+                except Exception:
+                    pass
+
+            processed = total
 
     def show_stats(self):
         print("\n\nsession statistics")
@@ -528,12 +562,6 @@ class SmartEMGController:
         if self.gesture_counts:
             total = sum(self.gesture_counts.values())
             print(f"total actions: {total}")
-            
-            # show detection method usage
-            total_detections = self.threshold_count + self.ml_count
-            if total_detections > 0:
-                print(f"threshold: {self.threshold_count} ({self.threshold_count/total_detections*100:.1f}%)")
-                print(f"ml model:  {self.ml_count} ({self.ml_count/total_detections*100:.1f}%)")
 
             print("\ngestures:")
             for gesture, count in sorted(self.gesture_counts.items(),
@@ -542,8 +570,44 @@ class SmartEMGController:
         else:
             print("no actions performed")
 
+        print("\ndetection cascade:")
+        for line in self.cascade.report():
+            print(f"  {line}")
+
+        if self.skipped_windows:
+            print(f"skipped windows (processing fell behind): {self.skipped_windows}")
+        if self.backlog_batches:
+            print(f"batched windows (tree caught up on a backlog): {self.batched_windows} in "
+                  f"{self.backlog_batches} batches")
+
+        if self.source:
+            print("\nstream health:")
+            for line in self.source.report():
+                print(f"  {line}")
+
+    async def control_loop(self):
+        """Ingest, processing and the websocket server, all on one event loop"""
+        self.loop = asyncio.get_running_loop()
+        self.data_ready = asyncio.Event()
+        self.outgoing = asyncio.Queue(maxsize=8)
+        await self.start_websocket_server()
+
+        tasks = [
+            asyncio.create_task(self.read_serial_data()),
+            asyncio.create_task(self.process_data()),
+            asyncio.create_task(self.broadcaster()),
+            asyncio.create_task(self.checkpoint_personal_model()),
+        ]
+        try:
+            await asyncio.gather(*tasks)
+        finally:
+            for task in tasks:
+                task.cancel()
+            if self.websocket_server:
+                self.websocket_server.close()
+
     def run(self):
-        if not self.serial_conn:
+        if not self.source:
             print("no device connected!")
             return
 
@@ -576,23 +640,34 @@ class SmartEMGController:
 
         self.is_running = True
 
-        read_thread = threading.Thread(target=self.read_serial_data, daemon=True)
-        read_thread.start()
-
         try:
-            self.process_data()
+            asyncio.run(self.control_loop())
         except KeyboardInterrupt:
             print("\n\nstopping...")
         finally:
             self.is_running = False
+            self.action_executor.shutdown(wait=False)
+            if self.personal.dirty:
+                try:
+                    self.personal.save()
+                    print(f"\npersonal model saved: {self.personal.summary()}")
+                except OSError as e:
+                    print(f"\ncould not save personal model: {e}")
             self.show_stats()
 
-            if self.serial_conn:
-                self.serial_conn.close()
+            if self.source:
+                self.source.close()
 
             print("\nsmart control stopped!")
 
 def main():
+    parser = argparse.ArgumentParser(description='Smart EMG control')
+    parser.add_argument('--port', type=str, help='serial port, skips auto-detection')
+    parser.add_argument('--interval', type=int, default=15, help='samples between classifications, 1 for every sample')
+    add_source_arguments(parser)
+    add_conditioning_arguments(parser)
+    args = parser.parse_args()
+
     try:
         import pyautogui
     except ImportError:
@@ -602,7 +677,9 @@ def main():
         subprocess.check_call([sys.executable, "-m", "pip", "install", "pyautogui"])
         import pyautogui
 
-    controller = SmartEMGController()
+    controller = SmartEMGController(source_from_args(args), port=args.port,
+                                    conditioning=conditioning_from_args(args))
+    controller.process_interval = max(1, args.interval)
     controller.run()
 
 if __name__ == "__main__":
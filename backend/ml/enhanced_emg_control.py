@@ -1,21 +1,30 @@
-import serial
 import serial.tools.list_ports
 import numpy as np
 import pyautogui
 import time
 import threading
-import queue
 from collections import deque
 from pathlib import Path
 import pickle
-from sklearn.tree import DecisionTreeClassifier
-from sklearn.preprocessing import StandardScaler
 import math
 import ctypes
 from ctypes import wintypes
 import platform
 import psutil
 import yaml
+import argparse
+import sys
+from serial_ingest import NUM_COLUMNS, EMG1, EMG2, ACCEL_X, ACCEL_Z
+from sensor_source import SerialSource, add_source_arguments, source_from_args
+from port_discovery import discover_device
+from ring_buffer import RingBuffer
+from emg_filter import (ConditionedSource, add_conditioning_arguments, conditioning_from_args,
+                        ENVELOPE_ACTIVATION, ENVELOPE_STRONG)
+from feature_engine import IncrementalFeatures
+from feature_registry import window_features, LazyExtractor, feature_names, set_window, CLASSIC, LEFT_ACTIVITY, RIGHT_ACTIVITY
+from model_artifact import load_artifact, compile_tree, ARTIFACT_PATH
+from gesture_cascade import CascadeStages
+from personalization import OnlineGestureModel, CHECKPOINT_PATH
 
 pyautogui.FAILSAFE = True
 pyautogui.PAUSE = 0.001
@@ -82,19 +91,25 @@ if platform.system() == 'Windows':
         'f1': 0x70, 'f2': 0x71, 'f3': 0x72, 'f4': 0x73, 'f5': 0x74, 'f6': 0x75
     }
 
-class EnhancedEMGController:
-    def __init__(self):
+class EnhancedEMGController(CascadeStages):
+    def __init__(self, source=None, port=None, conditioning=None):
         print("\n" + "="*60)
         print(" "*15 + "enhanced emg + imu control")
         print("="*60)
 
-        self.serial_conn = None
-        self.connect_device()
+        # any SensorSource, the serial device unless one is passed in
+        self.source = None
+        if source is None:
+            self.connect_device(port)
+        else:
+            self.open_source(source)
 
-        # EMG data buffers
-        self.emg1_buffer = deque(maxlen=30)
-        self.emg2_buffer = deque(maxlen=30)
-        self.data_queue = queue.Queue(maxsize=200)
+        # Sample buffer (~5 s), EMG windows are zero-copy slices of this
+        self.samples = RingBuffer(capacity=1024, channels=NUM_COLUMNS)
+        self.skipped_windows = 0
+        # Windows the tree scored together after the loop fell behind
+        self.batched_windows = 0
+        self.backlog_batches = 0
 
         # IMU data buffers for cursor control
         self.imu_buffer = deque(maxlen=10)  # Smaller buffer for real-time cursor control
@@ -113,15 +128,45 @@ class EnhancedEMGController:
         
         # ML model
         self.decision_tree = None
-        self.scaler = StandardScaler()
+        self.scaler = None
+        self.model_conditioning = None
+        self.model_calibration = None
+        self.feature_set = CLASSIC
         self.load_model()
+
+        # A model trained on conditioned EMG needs the same chain in front of it
+        if conditioning is None:
+            conditioning = self.model_conditioning
+        if conditioning and self.source:
+            self.source = ConditionedSource(self.source, **conditioning)
+            print(f"conditioning emg: {conditioning}")
+            # The envelope is on a much smaller scale than raw ADC counts
+            self.activation_threshold = ENVELOPE_ACTIVATION
+            self.strong_threshold = ENVELOPE_STRONG
+        # Calibration never goes below the default for the signal
+        self.activation_floor = self.activation_threshold
         
         # Processing settings
         self.window_size = 15
-        self.process_interval = 15
+        self.process_interval = 15  # 1 classifies on every sample
+        self.features = IncrementalFeatures(self.window_size)
+        # history the model's feature set needs, e.g. longer windows for spectra
+        self.model_window = max(self.window_size, set_window(self.feature_set, self.window_size))
+        # Only the features the tree splits on are computed for its decisions
+        self.extractor = LazyExtractor(self.feature_set, getattr(self.decision_tree, 'used_features', None))
+
+        # The user's own model, shared with smart control, learns from
+        # gestures confirmed or corrected on the terminal (--feedback)
+        self.personal = OnlineGestureModel(feature_names(self.feature_set))
+        if self.personal.load():
+            print(f"loaded personal model: {self.personal.summary()}")
+        self.last_detection = None  # (gesture, window) of the last non-rest window
+        self.checkpoint_interval = 30
+        self.feedback_input = False
         
         # Control state
         self.is_running = False
+        self.last_display_time = 0
         self.last_action_time = 0
         self.action_cooldown = 0.3
         
@@ -132,8 +177,6 @@ class EnhancedEMGController:
         
         # Statistics
         self.gesture_counts = {}
-        self.threshold_count = 0
-        self.ml_count = 0
         
         # imu cursor control settings
         self.cursor_sensitivity = 25.0  # much higher for actual movement
@@ -175,6 +218,9 @@ class EnhancedEMGController:
         # Load full config for mode switching
         self.load_gesture_config()
 
+        # Thresholds, then the personal model, then the tree
+        self.build_cascade((self.full_config or {}).get('cascade'))
+
     def load_gesture_config(self):
         """Load gesture configuration from config.yaml"""
         try:
@@ -376,6 +422,20 @@ class EnhancedEMGController:
 
     def load_model(self):
         """Load the existing EMG decision tree model"""
+        # The numpy artifact loads without sklearn, the pickle is the fallback
+        if ARTIFACT_PATH.exists():
+            try:
+                tree, scaler, schema = load_artifact(ARTIFACT_PATH)
+                # Scaler folded into the thresholds, one decision is a few float compares
+                self.decision_tree = compile_tree(tree, scaler)
+                self.scaler = None
+                self.model_conditioning = schema.get('conditioning')
+                self.feature_set = schema['feature_set']
+                print(f"loaded decision tree model for emg gestures ({len(schema['labels'])} labels, {ARTIFACT_PATH.name})")
+                return
+            except (OSError, ValueError, KeyError) as e:
+                print(f"ignoring {ARTIFACT_PATH.name}: {e}")
+
         model_path = Path(__file__).parent / "emg_model.pkl"
         if model_path.exists():
             try:
@@ -383,6 +443,12 @@ class EnhancedEMGController:
                     data = pickle.load(f)
                     self.decision_tree = data['model']
                     self.scaler = data['scaler']
+                    self.model_conditioning = data.get('conditioning')
+                    self.model_calibration = data.get('calibration')
+                    self.feature_set = data.get('feature_set', CLASSIC)
+                    compiled = compile_tree(self.decision_tree, self.scaler, calibration=self.model_calibration)
+                    if compiled:
+                        self.decision_tree, self.scaler = compiled, None
                     print("loaded decision tree model for emg gestures")
             except Exception as e:
                 print(f"failed to load ml model: {e}")
@@ -391,14 +457,39 @@ class EnhancedEMGController:
             print("using threshold detection only for emg gestures")
             self.decision_tree = None
 
-    def connect_device(self):
-        """Connect to the XIAO device"""
+    def connect_device(self, port=None):
+        """Connect to the XIAO device, port skips auto-detection"""
         print("\nconnecting to device...")
 
+        conn = None
+        if not port:
+            # probe every port at once, a streaming board needs no settle time
+            port, conn = discover_device()
+        if not port:
+            port = self.select_port()
+            if not port:
+                return False
+
+        print(f"\nattempting to connect to {port}...")
+
+        # Give the board time to reset before clearing the buffer
+        if self.open_source(SerialSource(port, settle=2.5, serial_conn=conn)):
+            return True
+
+        print("\ntroubleshooting tips:")
+        print("   - check usb cable connection")
+        print("   - verify xiao sense is powered on")
+        print("   - try a different usb port")
+        print("   - make sure arduino firmware is uploaded")
+        print("   - check if another program is using the port")
+        return False
+
+    def select_port(self):
+        """Find the XIAO among the serial ports or ask which one to use"""
         ports = list(serial.tools.list_ports.comports())
         if not ports:
             print("no devices found!")
-            return False
+            return None
 
         print("available ports:")
         for i, p in enumerate(ports):
@@ -436,44 +527,32 @@ class EnhancedEMGController:
                     print("please enter a valid number")
                 except KeyboardInterrupt:
                     print("\nexiting...")
-                    return False
+                    return None
 
-        print(f"\nattempting to connect to {port}...")
+        return port
 
+    def open_source(self, source):
+        """Open any SensorSource and check that samples arrive"""
         try:
-            self.serial_conn = serial.Serial(port, 115200, timeout=0.01)
-            time.sleep(2)  # Give more time for connection
-
-            # Clear any existing data
-            print("clearing buffer...")
-            time.sleep(0.5)
-            while self.serial_conn.in_waiting:
-                self.serial_conn.readline()
+            source.open()
+            self.source = source
 
-            print(f"connected to {port}")
+            print(f"connected to {source}")
             print("waiting for data...")
             
             # Test if we're getting data
             test_start = time.time()
             while time.time() - test_start < 3:
-                if self.serial_conn.in_waiting:
-                    line = self.serial_conn.readline().decode('utf-8', errors='ignore').strip()
-                    if line and not line.startswith('#'):
-                        print(f"sample data: {line[:50]}...")
-                        return True
-                time.sleep(0.1)
+                block = self.source.read_block()
+                if len(block):
+                    print(f"sample data: {block[-1].tolist()}")
+                    return True
             
             print("no data received. check if xiao is running the correct firmware.")
             return True  # Still return True, might work during calibration
 
         except Exception as e:
             print(f"connection failed: {e}")
-            print("\ntroubleshooting tips:")
-            print("   - check usb cable connection")
-            print("   - verify xiao sense is powered on")
-            print("   - try a different usb port")
-            print("   - make sure arduino firmware is uploaded")
-            print("   - check if another program is using the port")
             return False
 
     def calibrate_emg(self):
@@ -488,34 +567,27 @@ class EnhancedEMGController:
 
         print("\nReading baseline...")
 
-        baseline_data_left = []
-        baseline_data_right = []
+        blocks = []
 
         start_time = time.time()
         while time.time() - start_time < 2:
-            if self.serial_conn.in_waiting:
-                try:
-                    line = self.serial_conn.readline().decode('utf-8').strip()
-                    if line and not line.startswith('#'):
-                        values = line.split(',')
-                        if len(values) >= 9:
-                            baseline_data_left.append(int(values[1]))
-                            baseline_data_right.append(int(values[2]))
-                except:
-                    pass
+            block = self.source.read_block()
+            if len(block):
+                blocks.append(block)
 
-        if baseline_data_left:
-            self.baseline_left = np.mean(baseline_data_left)
-            self.baseline_right = np.mean(baseline_data_right)
-            self.noise_left = np.std(baseline_data_left)
-            self.noise_right = np.std(baseline_data_right)
+        if blocks:
+            baseline_data = np.concatenate(blocks)
+            self.baseline_left = np.mean(baseline_data[:, EMG1])
+            self.baseline_right = np.mean(baseline_data[:, EMG2])
+            self.noise_left = np.std(baseline_data[:, EMG1])
+            self.noise_right = np.std(baseline_data[:, EMG2])
 
             print(f"\nemg calibration complete")
             print(f"   Left:  {self.baseline_left:.0f} ± {self.noise_left:.0f}")
             print(f"   Right: {self.baseline_right:.0f} ± {self.noise_right:.0f}")
 
             # Adjust threshold based on noise
-            min_threshold = max(40, self.noise_multiplier * max(self.noise_left, self.noise_right))
+            min_threshold = max(self.activation_floor, self.noise_multiplier * max(self.noise_left, self.noise_right))
             self.activation_threshold = min_threshold
             print(f"   Activation threshold: {self.activation_threshold:.0f}")
 
@@ -536,23 +608,17 @@ class EnhancedEMGController:
 
         print("\nReading IMU baseline...")
 
-        imu_data = {'accel_x': [], 'accel_y': [], 'accel_z': []}
+        blocks = []
 
         start_time = time.time()
         while time.time() - start_time < 3:
-            if self.serial_conn.in_waiting:
-                try:
-                    line = self.serial_conn.readline().decode('utf-8').strip()
-                    if line and not line.startswith('#'):
-                        values = line.split(',')
-                        if len(values) >= 9:
-                            imu_data['accel_x'].append(float(values[3]))
-                            imu_data['accel_y'].append(float(values[4]))
-                            imu_data['accel_z'].append(float(values[5]))
-                except:
-                    pass
+            block = self.source.read_block()
+            if len(block):
+                blocks.append(block)
 
-        if imu_data['accel_x']:
+        if blocks:
+            accel = np.concatenate(blocks)[:, ACCEL_X:ACCEL_Z + 1]
+            imu_data = {'accel_x': accel[:, 0], 'accel_y': accel[:, 1], 'accel_z': accel[:, 2]}
             # calculate baseline with better averaging
             self.imu_baseline['accel_x'] = np.median(imu_data['accel_x'])  # use median to reduce outliers
             self.imu_baseline['accel_y'] = np.median(imu_data['accel_y'])
@@ -580,77 +646,6 @@ class EnhancedEMGController:
             print("imu calibration failed - no data")
             return False
 
-    def extract_features(self, emg1_window, emg2_window):
-        """Extract features for EMG gesture recognition"""
-        emg1_array = np.array(emg1_window)
-        emg2_array = np.array(emg2_window)
-        
-        features = [
-            np.mean(emg1_array),
-            np.std(emg1_array),
-            np.max(emg1_array),
-            np.max(emg1_array) - np.min(emg1_array),
-            np.sqrt(np.mean(emg1_array**2)),
-            np.mean(emg2_array),
-            np.std(emg2_array),
-            np.max(emg2_array),
-            np.max(emg2_array) - np.min(emg2_array),
-            np.sqrt(np.mean(emg2_array**2)),
-            np.corrcoef(emg1_array, emg2_array)[0, 1] if len(emg1_array) > 1 else 0,
-            np.mean(emg1_array) - self.baseline_left,
-            np.mean(emg2_array) - self.baseline_right
-        ]
-        return features
-
-    def detect_gesture_smart(self, left_activity, right_activity, emg1_window, emg2_window):
-        """Detect EMG gestures using hybrid threshold + ML approach"""
-        # Fast threshold detection
-        left_active = left_activity > self.activation_threshold
-        right_active = right_activity > self.activation_threshold
-        
-        # Clear cases use thresholds for speed
-        if not left_active and not right_active:
-            self.threshold_count += 1
-            return 'rest'
-        
-        left_strong = left_activity > self.strong_threshold
-        right_strong = right_activity > self.strong_threshold
-        
-        # Lower thresholds for both actions
-        both_activation = self.activation_threshold * 0.5
-        both_strong_threshold = self.strong_threshold * 0.6
-        left_active_both = left_activity > both_activation
-        right_active_both = right_activity > both_activation
-        left_strong_both = left_activity > both_strong_threshold
-        right_strong_both = right_activity > both_strong_threshold
-        
-        # Check for both actions first
-        if left_active_both and right_active_both:
-            # Use ML for better both gesture detection if available
-            if self.decision_tree:
-                try:
-                    features = self.extract_features(emg1_window, emg2_window)
-                    features_scaled = self.scaler.transform([features])
-                    gesture = self.decision_tree.predict(features_scaled)[0]
-                    self.ml_count += 1
-                    return gesture
-                except:
-                    pass
-            
-            # Fallback to threshold logic
-            self.threshold_count += 1
-            return 'both_strong' if (left_strong_both and right_strong_both) else 'both_flex'
-        
-        # Single muscle actions
-        self.threshold_count += 1
-        
-        if left_active and not right_active:
-            return 'left_strong' if left_strong else 'left_flex'
-        elif right_active and not left_active:
-            return 'right_strong' if right_strong else 'right_flex'
-        else:
-            return 'both_flex'
-
     def calculate_cursor_movement(self, accel_x, accel_y, accel_z):
         # calculate cursor movement based on imu data
         if not self.imu_calibrated:
@@ -910,91 +905,129 @@ class EnhancedEMGController:
         """Read data from serial port in separate thread"""
         while self.is_running:
             try:
-                if self.serial_conn and self.serial_conn.in_waiting:
-                    line = self.serial_conn.readline().decode('utf-8').strip()
-                    
-                    if line and not line.startswith('#'):
-                        values = line.split(',')
-                        if len(values) >= 9:
-                            emg1 = int(values[1])
-                            emg2 = int(values[2])
-                            accel_x = float(values[3])
-                            accel_y = float(values[4])
-                            accel_z = float(values[5])
-                            
-                            # Queue data for processing
-                            if self.data_queue.qsize() > 150:
-                                try:
-                                    self.data_queue.get_nowait()
-                                except:
-                                    pass
-                            
-                            self.data_queue.put((emg1, emg2, accel_x, accel_y, accel_z))
-            except:
-                pass
+                # Blocks for at most the port timeout when nothing is waiting
+                block = self.source.read_block()
+                if len(block):
+                    self.samples.push(block)
+            except Exception as e:
+                # serial sources reconnect on their own, don't spin on anything else
+                print(f"\nRead error: {e}")
+                time.sleep(0.1)
+
+    def process_window(self, window, features=None, tree_result=None):
+        """Detect and act on the EMG gesture in one window.
+
+        The window is model_window samples long, the last window_size of
+        them drive the thresholds.
+        """
+        left_data = window[-self.window_size:, EMG1]
+        right_data = window[-self.window_size:, EMG2]
+
+        # the classic set holds the activity, the model may want another set
+        if features is None:
+            features = window_features(left_data, right_data, self.baseline_left, self.baseline_right)
+        left_activity = features[LEFT_ACTIVITY]
+        right_activity = features[RIGHT_ACTIVITY]
+        if self.feature_set != CLASSIC:
+            features = None
+        
+        # Detect gesture
+        gesture = self.detect_gesture_smart(left_activity, right_activity,
+                                            window[:, EMG1], window[:, EMG2], features, tree_result)
+        self.gesture_history.append(gesture)
+        if gesture != 'rest':
+            # Kept for feedback, the ring slot will be overwritten
+            self.last_detection = (gesture, window.copy())
+
+        # Display status
+        current_time = time.time()
+        if current_time - self.last_display_time > 0.15:
+            left_bar = "=" * min(10, int(left_activity / 10))
+            right_bar = "=" * min(10, int(right_activity / 10))
+            
+            # show cursor velocity and click intent status
+            cursor_info = f"cursor: {self.cursor_velocity['x']:+.1f},{self.cursor_velocity['y']:+.1f}"
+            click_status = " [click-intent]" if self.click_intent_active else ""
             
-            time.sleep(0.001)
+            status = f"\remg l:{left_activity:+4.0f} {left_bar:10s} | r:{right_activity:+4.0f} {right_bar:10s} | [{gesture:12s}] | {cursor_info}{click_status}"
+            
+            print(status, end='', flush=True)
+            self.last_display_time = current_time
+
+        # Execute gesture actions
+        if gesture != 'rest':
+            recent = list(self.gesture_history)[-self.min_gesture_duration:]
+            if len(recent) >= self.min_gesture_duration and all(g == gesture for g in recent):
+                self.execute_action(gesture)
+                self.gesture_history.clear()
+
+    def read_feedback(self):
+        """Learn from the terminal: enter confirms the last gesture, a gesture name corrects it"""
+        for line in sys.stdin:
+            if not self.is_running:
+                break
+            command = line.strip()
+            if command in ('', 'y'):
+                kind, gesture = 'confirm', None
+            elif command in self.feedback_gestures():
+                kind, gesture = 'correct', command
+            else:
+                print(f"\n[unknown gesture {command!r}, one of: {', '.join(self.feedback_gestures())}]")
+                continue
+
+            if not self.last_detection:
+                print("\n[no gesture since the last feedback]")
+                continue
+            label = self.learn_from_feedback(kind, gesture)
+            if label:
+                print(f"\n[learned {label}: {self.personal.summary()}]")
+            else:
+                print("\n[could not learn from that window]")
+
+    def checkpoint_personal_model(self):
+        """Save the personal model now and then, off the processing thread"""
+        while self.is_running:
+            time.sleep(self.checkpoint_interval)
+            if self.is_running and self.personal.dirty:
+                try:
+                    self.personal.save(CHECKPOINT_PATH)
+                except OSError as e:
+                    print(f"\nCould not save personal model: {e}")
 
     def process_data(self):
         """Main data processing loop"""
         print("\nenhanced control active")
         print("-" * 60)
 
-        last_display_time = time.time()
-        sample_count = 0
+        self.last_display_time = time.time()
+        processed = self.samples.total
 
         while self.is_running:
-            try:
-                if not self.data_queue.empty():
-                    emg1, emg2, accel_x, accel_y, accel_z = self.data_queue.get_nowait()
-                    
-                    # Update EMG buffers
-                    self.emg1_buffer.append(emg1)
-                    self.emg2_buffer.append(emg2)
-                    
-                    # Update cursor position based on IMU
+            # Sleep until the serial thread pushes a block, then handle all of it
+            total = self.samples.wait(processed, timeout=0.1)
+
+            if total > processed:
+                # Update cursor position from the newest IMU sample
+                try:
+                    accel_x, accel_y, accel_z = self.samples.window(1)[0, ACCEL_X:ACCEL_Z + 1].tolist()
                     self.update_cursor(accel_x, accel_y, accel_z)
-                    
-                    sample_count += 1
-
-                    # Process EMG gestures
-                    if sample_count % self.process_interval == 0 and len(self.emg1_buffer) >= self.window_size:
-                        left_data = list(self.emg1_buffer)[-self.window_size:]
-                        right_data = list(self.emg2_buffer)[-self.window_size:]
-                        
-                        left_activity = np.mean(left_data) - self.baseline_left
-                        right_activity = np.mean(right_data) - self.baseline_right
-                        
-                        # Detect gesture
-                        gesture = self.detect_gesture_smart(left_activity, right_activity, left_data, right_data)
-                        self.gesture_history.append(gesture)
-
-                        # Display status
-                        current_time = time.time()
-                        if current_time - last_display_time > 0.15:
-                            left_bar = "=" * min(10, int(left_activity / 10))
-                            right_bar = "=" * min(10, int(right_activity / 10))
-                            
-                            # show cursor velocity and click intent status
-                            cursor_info = f"cursor: {self.cursor_velocity['x']:+.1f},{self.cursor_velocity['y']:+.1f}"
-                            click_status = " [click-intent]" if self.click_intent_active else ""
-                            
-                            status = f"\remg l:{left_activity:+4.0f} {left_bar:10s} | r:{right_activity:+4.0f} {right_bar:10s} | [{gesture:12s}] | {cursor_info}{click_status}"
-                            
-                            print(status, end='', flush=True)
-                            last_display_time = current_time
-
-                        # Execute gesture actions
-                        if gesture != 'rest':
-                            recent = list(self.gesture_history)[-self.min_gesture_duration:]
-                            if len(recent) >= self.min_gesture_duration and all(g == gesture for g in recent):
-                                self.execute_action(gesture)
-                                self.gesture_history.clear()
+                except Exception:
+                    pass
 
-            except Exception as e:
-                pass
+            # Every sample goes through the feature engine, a window is
+            # classified when it ends on a process_interval boundary
+            pending = self.collect_windows(processed, total)
 
-            time.sleep(0.002)
+            # More than one window waiting, the tree scores all of them in one
+            # call and the labels go through the debouncer in order
+            tree_results = self.classify_backlog(pending) if len(pending) > 1 else [None] * len(pending)
+            for (window, features), tree_result in zip(pending, tree_results):
+                try:
+                    self.process_window(window, features, tree_result)
+                except Exception:
+                    pass
+
+            processed = total
 
     def show_stats(self):
         """Display session statistics"""
@@ -1004,12 +1037,6 @@ class EnhancedEMGController:
         if self.gesture_counts:
             total = sum(self.gesture_counts.values())
             print(f"Total actions: {total}")
-            
-            # Show detection method usage
-            total_detections = self.threshold_count + self.ml_count
-            if total_detections > 0:
-                print(f"Threshold detection: {self.threshold_count} ({self.threshold_count/total_detections*100:.1f}%)")
-                print(f"ML model detection:  {self.ml_count} ({self.ml_count/total_detections*100:.1f}%)")
 
             print("\nGestures performed:")
             for gesture, count in sorted(self.gesture_counts.items(), key=lambda x: x[1], reverse=True):
@@ -1017,9 +1044,24 @@ class EnhancedEMGController:
         else:
             print("No actions performed")
 
+        print("\nDetection cascade:")
+        for line in self.cascade.report():
+            print(f"  {line}")
+
+        if self.skipped_windows:
+            print(f"Skipped windows (processing fell behind): {self.skipped_windows}")
+        if self.backlog_batches:
+            print(f"Batched windows (tree caught up on a backlog): {self.batched_windows} in "
+                  f"{self.backlog_batches} batches")
+
+        if self.source:
+            print("\nStream health:")
+            for line in self.source.report():
+                print(f"  {line}")
+
     def run(self):
         """Main run function"""
-        if not self.serial_conn:
+        if not self.source:
             print("no device connected")
             return
 
@@ -1055,6 +1097,8 @@ class EnhancedEMGController:
         print("  imu-based cursor control enabled")
         print("  latency ~30ms for gestures, ~16ms for cursor")
         print("  flight controls with click-intent smoothing")
+        if self.feedback_input:
+            print("\nfeedback: press enter to confirm the last gesture, type a gesture name to correct it")
         print("\nmove mouse to corner to stop")
         print("press ctrl+c to exit")
         print("="*60)
@@ -1064,6 +1108,9 @@ class EnhancedEMGController:
         # Start data reading thread
         read_thread = threading.Thread(target=self.read_serial_data, daemon=True)
         read_thread.start()
+        if self.feedback_input:
+            threading.Thread(target=self.read_feedback, daemon=True).start()
+            threading.Thread(target=self.checkpoint_personal_model, daemon=True).start()
 
         try:
             self.process_data()
@@ -1071,25 +1118,42 @@ class EnhancedEMGController:
             print("\n\nstopping...")
         finally:
             self.is_running = False
+            if self.personal.dirty:
+                try:
+                    self.personal.save(CHECKPOINT_PATH)
+                    print(f"\nPersonal model saved: {self.personal.summary()}")
+                except OSError as e:
+                    print(f"\nCould not save personal model: {e}")
             self.show_stats()
 
-            if self.serial_conn:
-                self.serial_conn.close()
+            if self.source:
+                self.source.close()
 
             print("\nenhanced control stopped")
 
 def main():
     """Main entry point"""
+    parser = argparse.ArgumentParser(description='Enhanced EMG + IMU control')
+    parser.add_argument('--port', type=str, help='serial port, skips auto-detection')
+    parser.add_argument('--interval', type=int, default=15, help='samples between classifications, 1 for every sample')
+    parser.add_argument('--feedback', action='store_true',
+                        help='confirm or correct gestures on the terminal to train the personal model')
+    add_source_arguments(parser)
+    add_conditioning_arguments(parser)
+    args = parser.parse_args()
+
     try:
         import pyautogui
     except ImportError:
         print("Installing pyautogui...")
         import subprocess
-        import sys
         subprocess.check_call([sys.executable, "-m", "pip", "install", "pyautogui"])
         import pyautogui
 
-    controller = EnhancedEMGController()
+    controller = EnhancedEMGController(source_from_args(args), port=args.port,
+                                       conditioning=conditioning_from_args(args))
+    controller.process_interval = max(1, args.interval)
+    controller.feedback_input = args.feedback
     controller.run()
 
 if __name__ == "__main__":
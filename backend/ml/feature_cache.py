@@ -0,0 +1,71 @@
+"""
+Training feature cache for Ctrl-ARM
+Window features of each recording stored as .npz, keyed by the file's
+content and everything that shapes the features, so retraining only
+processes recordings that are new or changed
+"""
+
+import hashlib
+import json
+import os
+from pathlib import Path
+
+import numpy as np
+
+CACHE_DIR = Path.home() / '.ctrlarm' / 'feature_cache'
+
+
+def file_digest(path, chunk_size=1 << 20):
+    digest = hashlib.sha256()
+    with open(path, 'rb') as f:
+        for chunk in iter(lambda: f.read(chunk_size), b''):
+            digest.update(chunk)
+    return digest.hexdigest()
+
+
+class FeatureCache:
+    """Content-addressed .npz files of per-recording feature matrices.
+
+    The key hashes the csv bytes together with `settings` (feature set
+    version, window, hop, conditioning), so renaming a file is free and
+    changing any setting misses instead of returning stale features.
+    """
+
+    def __init__(self, settings, cache_dir=CACHE_DIR):
+        self.cache_dir = Path(cache_dir)
+        self.settings = json.dumps(settings, sort_keys=True, default=str)
+        self.hits = 0
+        self.misses = 0
+
+    def key(self, path):
+        digest = hashlib.sha256()
+        digest.update(file_digest(path).encode())
+        digest.update(self.settings.encode())
+        return digest.hexdigest()
+
+    def path_for(self, key):
+        return self.cache_dir / f"{key}.npz"
+
+    def load(self, key):
+        """Cached features for a key, None on a miss"""
+        path = self.path_for(key)
+        try:
+            with np.load(path) as data:
+                features = data['features']
+        except (OSError, KeyError, ValueError):
+            self.misses += 1
+            return None
+        self.hits += 1
+        return features
+
+    def save(self, key, features):
+        self.cache_dir.mkdir(parents=True, exist_ok=True)
+        path = self.path_for(key)
+        # write then rename, a killed run never leaves half a file behind
+        tmp = path.with_name(f"{path.stem}.{os.getpid()}.tmp.npz")
+        np.savez(tmp, features=features)
+        os.replace(tmp, path)
+
+    def hit_rate(self):
+        lookups = self.hits + self.misses
+        return self.hits / lookups if lookups else 0.0
@@ -0,0 +1,123 @@
+"""
+Incremental feature engine for Ctrl-ARM
+The classic feature set from feature_registry, kept up to date in O(1) per
+sample over a sliding window
+"""
+
+import math
+from collections import deque
+
+import numpy as np
+
+
+class IncrementalFeatures:
+    """The classic window_features over a sliding window, O(1) per sample.
+
+    Keeps running sums, sums of squares and the cross product of the two
+    channels, plus monotonic deques for the window min and max. ADC values
+    are integers so the sums stay exact; for anything else (filtered or
+    interpolated input) they are recomputed from the window every
+    resync_every samples so rounding can't build up.
+    """
+
+    def __init__(self, window_size=15, resync_every=4096):
+        self.window_size = window_size
+        self.resync_every = resync_every
+        self.reset()
+
+    def reset(self):
+        self.values = deque()
+        self.count = 0
+        self.sum1 = self.sum2 = 0.0
+        self.sq1 = self.sq2 = 0.0
+        self.cross = 0.0
+        # (index, value), values decreasing for max and increasing for min
+        self.max1, self.min1 = deque(), deque()
+        self.max2, self.min2 = deque(), deque()
+
+    def __len__(self):
+        return len(self.values)
+
+    @property
+    def full(self):
+        return len(self.values) == self.window_size
+
+    def add(self, x1, x2):
+        """Slide the window forward by one sample"""
+        index = self.count
+        self.values.append((x1, x2))
+        self.sum1 += x1
+        self.sum2 += x2
+        self.sq1 += x1 * x1
+        self.sq2 += x2 * x2
+        self.cross += x1 * x2
+
+        for extremes, x, keep in ((self.max1, x1, 1), (self.min1, x1, -1),
+                                  (self.max2, x2, 1), (self.min2, x2, -1)):
+            while extremes and (extremes[-1][1] - x) * keep <= 0:
+                extremes.pop()
+            extremes.append((index, x))
+
+        if len(self.values) > self.window_size:
+            y1, y2 = self.values.popleft()
+            self.sum1 -= y1
+            self.sum2 -= y2
+            self.sq1 -= y1 * y1
+            self.sq2 -= y2 * y2
+            self.cross -= y1 * y2
+            oldest = index - self.window_size
+            for extremes in (self.max1, self.min1, self.max2, self.min2):
+                if extremes[0][0] <= oldest:
+                    extremes.popleft()
+
+        self.count += 1
+        if self.count % self.resync_every == 0:
+            self.resync()
+
+    def add_block(self, emg):
+        """Add every row of an (n, 2) array of emg1, emg2 values"""
+        for x1, x2 in np.asarray(emg, dtype=np.float64).tolist():
+            self.add(x1, x2)
+
+    def resync(self):
+        """Recompute the running sums from the samples in the window"""
+        self.sum1 = math.fsum(x1 for x1, _ in self.values)
+        self.sum2 = math.fsum(x2 for _, x2 in self.values)
+        self.sq1 = math.fsum(x1 * x1 for x1, _ in self.values)
+        self.sq2 = math.fsum(x2 * x2 for _, x2 in self.values)
+        self.cross = math.fsum(x1 * x2 for x1, x2 in self.values)
+
+    def features(self, baseline_left=0.0, baseline_right=0.0):
+        """Same vector as window_features on the current window"""
+        n = len(self.values)
+        mean1 = self.sum1 / n
+        mean2 = self.sum2 / n
+        # n * sum of squares - sum^2 is exact for integer input
+        spread1 = max(n * self.sq1 - self.sum1 * self.sum1, 0.0)
+        spread2 = max(n * self.sq2 - self.sum2 * self.sum2, 0.0)
+
+        if n < 2:
+            correlation = 0
+        elif spread1 == 0 or spread2 == 0:
+            correlation = float('nan')  # what np.corrcoef gives for a flat channel
+        else:
+            correlation = (n * self.cross - self.sum1 * self.sum2) / math.sqrt(spread1 * spread2)
+            correlation = min(1.0, max(-1.0, correlation))
+
+        max1, min1 = self.max1[0][1], self.min1[0][1]
+        max2, min2 = self.max2[0][1], self.min2[0][1]
+        return [
+            mean1,
+            math.sqrt(spread1) / n,
+            max1,
+            max1 - min1,
+            math.sqrt(self.sq1 / n),
+            mean2,
+            math.sqrt(spread2) / n,
+            max2,
+            max2 - min2,
+            math.sqrt(self.sq2 / n),
+            correlation,
+            mean1 - baseline_left,
+            mean2 - baseline_right
+        ]
@@ -0,0 +1,384 @@
+"""
+EMG feature registry for Ctrl-ARM
+Every feature is declared once here and computed vectorized over a
+(windows, samples, channels) array, so training and both controllers build
+exactly the same vectors. A model records the feature set it was trained on
+"""
+
+from functools import cached_property, lru_cache
+
+import numpy as np
+
+CHANNEL_NAMES = ('left', 'right')
+RATE_HZ = 200
+
+# bump when a feature's math changes, cached training features are keyed on it
+FEATURES_VERSION = 2
+
+# adc units, the emg noise floor at rest is a few counts
+ZERO_CROSSING_THRESHOLD = 5.0
+SLOPE_THRESHOLD = 5.0
+WILLISON_THRESHOLD = 10.0
+
+# relative power bands in Hz, the envelope puts nearly everything below 10
+SPECTRAL_BANDS = {
+    'band_low': (0.0, 10.0),
+    'band_mid': (10.0, 30.0),
+    'band_high': (30.0, np.inf),
+}
+
+class WindowStats:
+    """A (windows, samples, channels) array and the intermediates its features share.
+
+    Each intermediate is computed the first time a feature asks for it and
+    kept, so the window mean, the mean-removed and rectified windows, the
+    first differences, the variances and the power spectrum are each taken
+    once however many features read them.
+    """
+
+    def __init__(self, windows, rate_hz=RATE_HZ):
+        self.windows = windows
+        self.rate_hz = rate_hz
+
+    @cached_property
+    def mean(self):
+        return self.windows.mean(axis=1)
+
+    @cached_property
+    def centered(self):
+        return self.windows - self.mean[:, None]
+
+    @cached_property
+    def rectified(self):
+        # around the window mean, the adc counts themselves are all positive
+        return np.abs(self.centered)
+
+    @cached_property
+    def max(self):
+        return self.windows.max(axis=1)
+
+    @cached_property
+    def var(self):
+        return self.windows.var(axis=1)
+
+    @cached_property
+    def diff(self):
+        return np.diff(self.windows, axis=1)
+
+    @cached_property
+    def abs_diff(self):
+        return np.abs(self.diff)
+
+    @cached_property
+    def diff_var(self):
+        return self.diff.var(axis=1)
+
+    @cached_property
+    def mobility(self):
+        return safe_ratio(self.diff_var, self.var)
+
+    @cached_property
+    def spectrum(self):
+        """Power spectra of every window and channel in one rfft call, and their frequencies"""
+        taper, freqs = spectral_basis(self.windows.shape[1], self.rate_hz)
+        spectrum = np.fft.rfft(self.centered * taper[None, :, None], axis=1)
+        return spectrum.real**2 + spectrum.imag**2, freqs
+
+    @cached_property
+    def total_power(self):
+        """Total power per window and channel, and a copy that is safe to divide by"""
+        total = self.spectrum[0].sum(axis=1)
+        return total, np.where(total > 0, total, 1.0)
+
+
+# name -> (function, kind). every function gets the WindowStats of a batch;
+# per-channel ones return (w, c), cross-channel ones (w,), baseline ones also
+# get the (c,) baseline and spectral ones read the power spectrum
+FEATURES = {}
+
+
+def feature(name, kind='channel'):
+    def register(function):
+        FEATURES[name] = (function, kind)
+        return function
+    return register
+
+
+@feature('mean')
+def mean(w):
+    return w.mean
+
+
+@feature('std')
+def std(w):
+    return np.sqrt(w.var)
+
+
+@feature('max')
+def maximum(w):
+    return w.max
+
+
+@feature('ptp')
+def peak_to_peak(w):
+    return w.max - w.windows.min(axis=1)
+
+
+@feature('rms')
+def rms(w):
+    return np.sqrt(np.mean(w.windows**2, axis=1))
+
+
+@feature('mav')
+def mean_absolute_value(w):
+    return np.mean(w.rectified, axis=1)
+
+
+@feature('wl')
+def waveform_length(w):
+    return w.abs_diff.sum(axis=1)
+
+
+@feature('zc')
+def zero_crossings(w):
+    # around the window mean, the envelope itself never crosses zero
+    a, b = w.centered[:, :-1], w.centered[:, 1:]
+    return ((a * b < 0) & (np.abs(a - b) >= ZERO_CROSSING_THRESHOLD)).sum(axis=1)
+
+
+@feature('ssc')
+def slope_sign_changes(w):
+    # rise into a sample times the fall out of it
+    rise, fall = w.diff[:, :-1], -w.diff[:, 1:]
+    return ((rise * fall) >= SLOPE_THRESHOLD**2).sum(axis=1)
+
+
+@feature('wamp')
+def willison_amplitude(w):
+    return (w.abs_diff >= WILLISON_THRESHOLD).sum(axis=1)
+
+
+def safe_ratio(a, b):
+    with np.errstate(invalid='ignore', divide='ignore'):
+        return np.where(b > 0, np.sqrt(a / np.where(b > 0, b, 1)), 0.0)
+
+
+@feature('hjorth_activity')
+def hjorth_activity(w):
+    return w.var
+
+
+@feature('hjorth_mobility')
+def hjorth_mobility(w):
+    return w.mobility
+
+
+@feature('hjorth_complexity')
+def hjorth_complexity(w):
+    d2 = np.diff(w.diff, axis=1)
+    mobility_d1 = safe_ratio(d2.var(axis=1), w.diff_var)
+    with np.errstate(invalid='ignore', divide='ignore'):
+        return np.where(w.mobility > 0, mobility_d1 / np.where(w.mobility > 0, w.mobility, 1), 0.0)
+
+
+@feature('correlation', kind='cross')
+def correlation(w):
+    """Pearson correlation of the first two channels, nan for a flat one like np.corrcoef"""
+    if w.windows.shape[1] < 2 or w.windows.shape[2] < 2:
+        return np.zeros(len(w.windows))
+    a, b = w.centered[:, :, 0], w.centered[:, :, 1]
+    with np.errstate(invalid='ignore', divide='ignore'):
+        r = (a * b).sum(axis=1) / np.sqrt((a * a).sum(axis=1) * (b * b).sum(axis=1))
+    return np.clip(r, -1.0, 1.0)
+
+
+@feature('activity', kind='baseline')
+def activity(w, baseline):
+    return w.mean - baseline
+
+
+@lru_cache(maxsize=8)
+def spectral_basis(samples, rate_hz):
+    """Hann taper and rfft bin frequencies for a window length, built once"""
+    return np.hanning(samples), np.fft.rfftfreq(samples, 1.0 / rate_hz)
+
+
+@feature('mean_freq', kind='spectral')
+def mean_frequency(w):
+    power, freqs = w.spectrum
+    total, safe = w.total_power
+    return np.where(total > 0, (power * freqs[None, :, None]).sum(axis=1) / safe, 0.0)
+
+
+@feature('median_freq', kind='spectral')
+def median_frequency(w):
+    power, freqs = w.spectrum
+    total, _ = w.total_power
+    # first bin where the cumulative power reaches half the total
+    half = np.argmax(power.cumsum(axis=1) >= total[:, None, :] / 2, axis=1)
+    return np.where(total > 0, freqs[half], 0.0)
+
+
+def band_power(low, high):
+    def relative_power(w):
+        power, freqs = w.spectrum
+        _, safe = w.total_power
+        band = (freqs >= low) & (freqs < high)
+        return power[:, band].sum(axis=1) / safe
+    return relative_power
+
+
+for name, (low, high) in SPECTRAL_BANDS.items():
+    feature(name, kind='spectral')(band_power(low, high))
+
+
+CLASSIC = 'classic'
+
+# groups of features; per-channel groups are laid out channel by channel
+FEATURE_SETS = {
+    # what the first decision tree was trained on, and all feature_engine tracks
+    CLASSIC: [
+        ['mean', 'std', 'max', 'ptp', 'rms'],
+        ['correlation'],
+        ['activity'],
+    ],
+    'time_domain': [
+        ['mav', 'rms', 'wl', 'zc', 'ssc', 'wamp',
+         'hjorth_activity', 'hjorth_mobility', 'hjorth_complexity'],
+        ['correlation'],
+        ['activity'],
+    ],
+    'spectral': [
+        ['mean_freq', 'median_freq', 'band_low', 'band_mid', 'band_high'],
+        ['activity'],
+    ],
+    'combined': [
+        ['mav', 'rms', 'wl', 'wamp', 'hjorth_mobility',
+         'mean_freq', 'median_freq', 'band_low', 'band_mid', 'band_high'],
+        ['correlation'],
+        ['activity'],
+    ],
+}
+DEFAULT_FEATURE_SET = CLASSIC
+
+# samples per window the controllers classify
+DEFAULT_WINDOW = 15
+
+# samples per window a set needs, spectra want more than the default
+FEATURE_SET_WINDOWS = {
+    'spectral': 64,
+    'combined': 64,
+}
+
+
+def set_window(feature_set, default=DEFAULT_WINDOW):
+    return FEATURE_SET_WINDOWS.get(feature_set, default)
+
+
+def feature_set_version(feature_set):
+    """Changes whenever the vectors a set produces could change"""
+    thresholds = (ZERO_CROSSING_THRESHOLD, SLOPE_THRESHOLD, WILLISON_THRESHOLD, SPECTRAL_BANDS)
+    return f"{FEATURES_VERSION}/{feature_set}/{','.join(feature_names(feature_set))}/{thresholds}"
+
+
+def feature_columns(feature_set=DEFAULT_FEATURE_SET, channels=len(CHANNEL_NAMES)):
+    """(feature, channel) behind each column of a set's vectors, channel None for cross-channel ones"""
+    columns = []
+    for group in FEATURE_SETS[feature_set]:
+        for channel in range(channels):
+            columns.extend((name, channel) for name in group if FEATURES[name][1] != 'cross')
+        columns.extend((name, None) for name in group if FEATURES[name][1] == 'cross')
+    return columns
+
+
+def feature_names(feature_set=DEFAULT_FEATURE_SET, channels=CHANNEL_NAMES):
+    return [name if channel is None else f"{channels[channel]}_{name}"
+            for name, channel in feature_columns(feature_set, len(channels))]
+
+
+def extract(windows, feature_set=DEFAULT_FEATURE_SET, baseline=None, rate_hz=RATE_HZ):
+    """(windows, features) matrix for a (windows, samples, channels) array"""
+    windows = np.asarray(windows, dtype=np.float64)
+    channels = windows.shape[2]
+    baseline = np.zeros(channels) if baseline is None else np.asarray(baseline, dtype=np.float64)
+
+    stats = WindowStats(windows, rate_hz)
+    columns = []
+    for group in FEATURE_SETS[feature_set]:
+        values = {}
+        for name in group:
+            function, kind = FEATURES[name]
+            values[name] = function(stats, baseline) if kind == 'baseline' else function(stats)
+        for channel in range(channels):
+            columns.extend(values[name][:, channel] for name in group if FEATURES[name][1] != 'cross')
+        columns.extend(values[name] for name in group if FEATURES[name][1] == 'cross')
+    return np.column_stack(columns)
+
+
+def sliding_windows(samples, size, hop=1):
+    """(windows, size, channels) strided view over a (samples, channels) array, no copy"""
+    samples = np.asarray(samples, dtype=np.float64)
+    if len(samples) < size:
+        return np.empty((0, size, samples.shape[1]))
+    view = np.lib.stride_tricks.sliding_window_view(samples, size, axis=0)
+    return view[::hop].transpose(0, 2, 1)
+
+
+def window_features(emg1, emg2, baseline_left=0.0, baseline_right=0.0, feature_set=DEFAULT_FEATURE_SET):
+    """Feature vector of one window of both emg channels"""
+    window = np.column_stack([emg1, emg2])[None]
+    return extract(window, feature_set, (baseline_left, baseline_right))[0].tolist()
+
+
+class LazyExtractor:
+    """extract() restricted to the columns a model reads.
+
+    `used` is a mask over the set's columns, usually the features a tree
+    splits on. A feature is computed when any of its columns is used, on
+    all channels, so the values are bit-identical to extract(). The used
+    features share one WindowStats, so an intermediate such as the power
+    spectrum is taken once, and only when a used feature reads it. Unused
+    columns come back nan.
+    """
+
+    def __init__(self, feature_set=DEFAULT_FEATURE_SET, used=None, rate_hz=RATE_HZ):
+        self.feature_set = feature_set
+        self.rate_hz = rate_hz
+        columns = feature_columns(feature_set)
+        self.used = np.ones(len(columns), dtype=bool) if used is None else np.asarray(used, dtype=bool)
+        if len(self.used) != len(columns):
+            raise ValueError(f"mask has {len(self.used)} entries, '{feature_set}' has {len(columns)} features")
+
+        # feature name -> (channel, column) pairs it fills, in registry order
+        targets = {}
+        for column, ((name, channel), keep) in enumerate(zip(columns, self.used)):
+            if keep:
+                targets.setdefault(name, []).append((channel, column))
+        self.plan = [(name, FEATURES[name][0], FEATURES[name][1], targets[name]) for name in targets]
+
+    @property
+    def names(self):
+        return [name for name, keep in zip(feature_names(self.feature_set), self.used) if keep]
+
+    def extract(self, windows, baseline=None):
+        """(windows, features) matrix with only the used columns filled in"""
+        windows = np.asarray(windows, dtype=np.float64)
+        baseline = np.zeros(windows.shape[2]) if baseline is None else np.asarray(baseline, dtype=np.float64)
+        out = np.full((len(windows), len(self.used)), np.nan)
+        stats = WindowStats(windows, self.rate_hz)
+
+        for name, function, kind, targets in self.plan:
+            values = function(stats, baseline) if kind == 'baseline' else function(stats)
+            for channel, column in targets:
+                out[:, column] = values if channel is None else values[:, channel]
+        return out
+
+    def window_features(self, emg1, emg2, baseline_left=0.0, baseline_right=0.0):
+        """Like window_features, nan in the columns the model doesn't read"""
+        window = np.column_stack([emg1, emg2])[None]
+        return self.extract(window, (baseline_left, baseline_right))[0].tolist()
+
+
+FEATURE_NAMES = feature_names()
+LEFT_ACTIVITY = FEATURE_NAMES.index('left_activity')
+RIGHT_ACTIVITY = FEATURE_NAMES.index('right_activity')
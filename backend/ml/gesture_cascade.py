@@ -0,0 +1,343 @@
+"""
+Gesture cascade for Ctrl-ARM
+Runs the detection stages from cheapest to most expensive. Each stage
+answers with a label and a confidence; below its abstain threshold the
+window goes on to the next stage, and when the stages it went on to
+abstain too the answer is rest
+"""
+
+import time
+
+import numpy as np
+
+from serial_ingest import EMG1, EMG2
+from feature_registry import window_features, CLASSIC, LEFT_ACTIVITY, RIGHT_ACTIVITY
+from model_artifact import platt_scale
+
+STAGES = ('threshold', 'personal', 'tree')
+
+# confidence a stage needs to answer, overridable from the 'cascade' section of hardware/config.yaml
+DEFAULT_ABSTAIN = {
+    'threshold': 0.6,
+    'personal': 0.8,
+    'tree': 0.5,
+}
+
+# what the threshold rules claim where both channels are partly active, the
+# region where a model knows better; below the default so it escalates
+AMBIGUOUS_CONFIDENCE = 0.5
+
+
+class StageStats:
+    def __init__(self):
+        self.calls = 0
+        self.hits = 0
+        self.abstains = 0
+        self.skips = 0
+        self.seconds = 0.0
+
+
+class GestureCascade:
+    """Detection stages in order, each with an abstain threshold.
+
+    A stage is a function of the detection context returning (label,
+    confidence), or None when it can't run for this window (no model
+    loaded, personal model still learning, a feature it can't use). A
+    stage that raises counts as skipped too. Every call is timed per stage.
+    """
+
+    def __init__(self, stages, abstain=None, fallback='rest'):
+        thresholds = dict(DEFAULT_ABSTAIN, **(abstain or {}))
+        self.stages = [(name, function, float(thresholds.get(name, 0.0))) for name, function in stages]
+        self.fallback = fallback
+        self.stats = {name: StageStats() for name, _ in stages}
+        self.fallbacks = 0
+
+    @classmethod
+    def from_config(cls, functions, config=None):
+        """Cascade over `functions` (stage name -> function) from a config section like
+        {'stages': ['threshold', 'tree'], 'abstain': {'tree': 0.7}}"""
+        config = config or {}
+        names = config.get('stages') or [name for name in STAGES if name in functions]
+        unknown = [name for name in names if name not in functions]
+        if unknown:
+            raise ValueError(f"unknown cascade stages: {', '.join(unknown)}")
+        return cls([(name, functions[name]) for name in names], config.get('abstain'))
+
+    def abstain_below(self, name):
+        for stage, _, threshold in self.stages:
+            if stage == name:
+                return threshold
+        return None
+
+    def run(self, context):
+        """Label from the first stage confident enough.
+
+        A stage only abstains when a later stage runs on the window; when
+        none of them can (no model loaded, personal model still learning),
+        the abstaining stage's own label stands. Once a window has been
+        handed on, a stage that abstains passes it along, and the last one
+        to abstain leaves the fallback.
+        """
+        deferred = None  # (stats, label) of an abstaining stage until a later one runs
+        handed_on = False
+        for name, function, threshold in self.stages:
+            stats = self.stats[name]
+            start = time.perf_counter()
+            try:
+                result = function(context)
+            except Exception:
+                result = None
+            stats.seconds += time.perf_counter() - start
+            stats.calls += 1
+
+            if result is None:
+                stats.skips += 1
+                continue
+            if deferred is not None:
+                deferred[0].abstains += 1
+                deferred = None
+                handed_on = True
+            label, confidence = result
+            if label is not None and confidence >= threshold:
+                stats.hits += 1
+                return label
+            if label is None or handed_on:
+                stats.abstains += 1
+            else:
+                deferred = (stats, label)
+
+        if deferred is not None:
+            # nothing after it could run
+            deferred[0].hits += 1
+            return deferred[1]
+        self.fallbacks += 1
+        return self.fallback
+
+    def report(self):
+        decisions = sum(stats.hits for stats in self.stats.values()) + self.fallbacks
+        lines = [f"{'stage':10s} {'abstain <':>9s} {'hits':>7s} {'share':>6s} {'abstained':>9s} "
+                 f"{'skipped':>7s} {'us/call':>8s}"]
+        for name, _, threshold in self.stages:
+            stats = self.stats[name]
+            share = stats.hits / decisions if decisions else 0.0
+            per_call = stats.seconds / stats.calls * 1e6 if stats.calls else 0.0
+            lines.append(f"{name:10s} {threshold:9.2f} {stats.hits:7d} {share:6.1%} {stats.abstains:9d} "
+                         f"{stats.skips:7d} {per_call:8.1f}")
+        lines.append(f"fell back to {self.fallback}: {self.fallbacks}")
+        return lines
+
+
+class Detection:
+    """What the stages see of one window. `features` is filled in by the
+    first stage that needs the full vector, `tree_result` is a (label,
+    probability) already scored with a backlog."""
+
+    def __init__(self, left_activity, right_activity, emg1, emg2, features=None, tree_result=None):
+        self.left_activity = left_activity
+        self.right_activity = right_activity
+        self.emg1 = emg1
+        self.emg2 = emg2
+        self.features = features
+        self.tree_result = tree_result
+
+
+class CascadeStages:
+    """The detection stages both controllers run, as a mixin.
+
+    The controller provides the activation/strong thresholds, baselines,
+    feature_set and extractor, personal, decision_tree and scaler,
+    model_calibration (applied when the model isn't compiled),
+    model_window, last_detection, the samples ring buffer, the features
+    engine, process_interval and the skipped/batched window counters. It
+    calls build_cascade() once its config is loaded. `single_gestures`
+    names the (flex, strong) gesture of each side in the controller's
+    vocabulary.
+    """
+
+    single_gestures = {'left': ('left_flex', 'left_strong'), 'right': ('right_flex', 'right_strong')}
+
+    def build_cascade(self, config=None):
+        # thresholds, then the personal model, then the tree, each with an
+        # abstain threshold from the 'cascade' section of the config
+        self.cascade = GestureCascade.from_config({
+            'threshold': self.threshold_stage,
+            'personal': self.personal_stage,
+            'tree': self.tree_stage
+        }, config)
+
+    def extract_features(self, emg1_window, emg2_window, full=True):
+        # from scratch, the live path keeps these up to date in self.features.
+        # full=False only fills in the columns the tree reads
+        if full:
+            return window_features(emg1_window, emg2_window, self.baseline_left, self.baseline_right,
+                                   self.feature_set)
+        return self.extractor.window_features(emg1_window, emg2_window, self.baseline_left,
+                                              self.baseline_right)
+
+    def feedback_gestures(self):
+        """Labels a correction may use, the cascade's own vocabulary"""
+        labels = {'rest', 'both_flex', 'both_strong'}
+        for flex, strong in self.single_gestures.values():
+            labels.update((flex, strong))
+        if self.decision_tree is not None:
+            labels.update(str(label) for label in self.decision_tree.classes_)
+        return sorted(labels.union(self.personal.labels))
+
+    def learn_from_feedback(self, kind, gesture=None):
+        """Fold the last detected window into the personal model, 'confirm' keeps its
+        label and 'correct' relabels it as `gesture`. The label learned, None if nothing was"""
+        if not self.last_detection:
+            return None
+        detected, window = self.last_detection
+        if kind == 'confirm':
+            label = detected
+        elif kind == 'correct' and gesture in self.feedback_gestures():
+            label = gesture
+        else:
+            return None
+
+        features = self.extract_features(window[:, EMG1], window[:, EMG2])
+        if not self.personal.update(features, label):
+            return None
+        self.last_detection = None
+        return label
+
+    def detect_gesture_smart(self, left_activity, right_activity, emg1_window, emg2_window, features=None,
+                             tree_result=None):
+        # thresholds first, the models only when the thresholds abstain
+        return self.cascade.run(Detection(left_activity, right_activity, emg1_window, emg2_window,
+                                          features, tree_result))
+
+    def threshold_rules(self, left_activity, right_activity):
+        """(gesture, confidence) from the activation thresholds alone"""
+        left_active = left_activity > self.activation_threshold
+        right_active = right_activity > self.activation_threshold
+
+        # clear cases use thresholds for speed
+        if not left_active and not right_active:
+            return 'rest', 1.0
+
+        # much lower thresholds for both actions (50% more sensitive for both)
+        both_activation = self.activation_threshold * 0.5
+        both_strong_threshold = self.strong_threshold * 0.6
+        if left_activity > both_activation and right_activity > both_activation:
+            # a guess, the models tell both gestures from single ones better
+            both_strong = left_activity > both_strong_threshold and right_activity > both_strong_threshold
+            return ('both_strong' if both_strong else 'both_flex'), AMBIGUOUS_CONFIDENCE
+
+        # single muscle actions use normal thresholds
+        side, activity = ('left', left_activity) if left_active else ('right', right_activity)
+        flex, strong = self.single_gestures[side]
+        return (strong if activity > self.strong_threshold else flex), 1.0
+
+    def threshold_stage(self, detection):
+        return self.threshold_rules(detection.left_activity, detection.right_activity)
+
+    def personal_stage(self, detection):
+        if not self.personal.ready:
+            return None
+        # the personal model reads every feature
+        if detection.features is None:
+            detection.features = self.extract_features(detection.emg1, detection.emg2)
+        return self.personal.predict(detection.features, confidence=0.0)
+
+    def tree_stage(self, detection):
+        if not self.decision_tree:
+            return None
+        if detection.tree_result is not None:
+            # scored with the rest of a backlog
+            return detection.tree_result
+        features = detection.features
+        if features is None:
+            # the tree only needs the features it splits on
+            features = self.extract_features(detection.emg1, detection.emg2, full=False)
+        if self.scaler is None:
+            return self.decision_tree.classify_one(features)
+        proba = self.decision_tree.predict_proba(self.scaler.transform([features]))[0]
+        best = int(np.argmax(proba))
+        return self.decision_tree.classes_[best], float(platt_scale(proba[best], self.model_calibration))
+
+    def uses_model(self, left_activity, right_activity):
+        """Whether the threshold stage would hand a window on to the models"""
+        _, confidence = self.threshold_rules(left_activity, right_activity)
+        threshold = self.cascade.abstain_below('threshold')
+        return threshold is None or confidence < threshold
+
+    def classify_backlog(self, pending):
+        """Tree (label, probability) for (window, features) pairs in one predict, None where it isn't needed"""
+        tree_results = [None] * len(pending)
+        if not self.decision_tree or self.cascade.abstain_below('tree') is None:
+            return tree_results
+        rows = [i for i, (window, features) in enumerate(pending)
+                if len(window) == self.model_window
+                and self.uses_model(features[LEFT_ACTIVITY], features[RIGHT_ACTIVITY])]
+        if not rows:
+            return tree_results
+
+        # the engine already has classic vectors, other sets are extracted as one batch
+        if self.feature_set == CLASSIC:
+            X = np.array([pending[i][1] for i in rows], dtype=np.float64)
+        else:
+            windows = np.stack([pending[i][0][:, [EMG1, EMG2]] for i in rows])
+            with np.errstate(invalid='ignore', divide='ignore'):
+                X = self.extractor.extract(windows, (self.baseline_left, self.baseline_right))
+
+        # a row the tree can't score falls back to detect_gesture_smart on its own
+        used = getattr(self.decision_tree, 'used_features', None)
+        scorable = np.isfinite(X[:, used] if used is not None else X).all(axis=1)
+        if not scorable.any():
+            return tree_results
+        try:
+            if self.scaler is None:
+                # compiled tree, same calibrated probabilities as classify_one
+                labels, probabilities = self.decision_tree.classify(X[scorable])
+            else:
+                proba = self.decision_tree.predict_proba(self.scaler.transform(X[scorable]))
+                labels = self.decision_tree.classes_[proba.argmax(axis=1)]
+                probabilities = platt_scale(proba.max(axis=1), self.model_calibration)
+        except Exception:
+            return tree_results
+
+        labels = labels.tolist()
+        for i, label, probability in zip(np.array(rows)[scorable], labels, probabilities.tolist()):
+            tree_results[i] = (label, probability)
+        self.batched_windows += len(labels)
+        self.backlog_batches += 1
+        return tree_results
+
+    def skip_windows(self, start, end):
+        # samples [start, end) are gone, the windows ending in them aren't classified
+        self.skipped_windows += end // self.process_interval - start // self.process_interval
+        self.features.reset()
+
+    def collect_windows(self, start, total):
+        """Run samples [start, total) through the feature engine.
+
+        Returns the (window, features) pairs of the windows ending on a
+        process_interval boundary. The reader keeps pushing meanwhile, so
+        the oldest sample is read once and anything it overwrites before
+        it is copied out counts as skipped, like falling a buffer behind.
+        """
+        oldest = self.samples.oldest
+        if start < oldest:
+            # fell more than a buffer behind, these samples are gone
+            self.skip_windows(start, oldest)
+            start = oldest
+        try:
+            emg = self.samples.window(total - start, total)[:, [EMG1, EMG2]]
+        except IndexError:
+            self.skip_windows(start, total)
+            return []
+
+        pending = []
+        for end, (emg1, emg2) in enumerate(emg.tolist(), start + 1):
+            self.features.add(emg1, emg2)
+            if end % self.process_interval == 0 and self.features.full:
+                features = self.features.features(self.baseline_left, self.baseline_right)
+                history = min(self.model_window, end - oldest)
+                try:
+                    pending.append((self.samples.window(history, end), features))
+                except IndexError:
+                    self.skip_windows(end - 1, end)
+        return pending
@@ -1,36 +1,42 @@
 
-import serial
 import serial.tools.list_ports
+import argparse
 import numpy as np
 import time
 from collections import deque
 import matplotlib.pyplot as plt
 from matplotlib.animation import FuncAnimation
+from serial_ingest import EMG1, EMG2
+from sensor_source import SerialSource, add_source_arguments, source_from_args
+from port_discovery import discover_device
 
-def monitor_emg():
-    print("="*60)
-    print("LIVE EMG MONITOR")
-    print("="*60)
-    
+def find_device():
     ports = list(serial.tools.list_ports.comports())
     if not ports:
-        print("No devices found!")
-        return
-    
-    port = None
+        return None
+
     for p in ports:
         if any(x in p.description for x in ['XIAO', 'Arduino', 'USB Serial']):
-            port = p.device
-            break
-    if not port:
-        port = ports[0].device
-    
-    print(f"Connecting to {port}...")
-    ser = serial.Serial(port, 115200, timeout=0.1)
-    time.sleep(2)
+            return p.device
+    return ports[0].device
+
+def monitor_emg(source=None, port=None):
+    print("="*60)
+    print("LIVE EMG MONITOR")
+    print("="*60)
     
-    while ser.in_waiting:
-        ser.readline()
+    if source is None:
+        conn = None
+        if not port:
+            port, conn = discover_device()
+        port = port or find_device()
+        if not port:
+            print("No devices found!")
+            return
+        source = SerialSource(port, settle=2, serial_conn=conn)
+
+    print(f"Connecting to {source}...")
+    source.open()
     
     print("\n" + "="*60)
     print("MONITORING (Press Ctrl+C to stop)")
@@ -46,23 +52,18 @@ def monitor_emg():
     emg2_buffer = deque(maxlen=200)
 
     print("\nCalculating baseline (keep muscles relaxed)...")
-    baseline_data_1 = []
-    baseline_data_2 = []
+    blocks = []
     
     start_time = time.time()
     while time.time() - start_time < 2:
-        if ser.in_waiting:
-            try:
-                line = ser.readline().decode('utf-8').strip()
-                if line and not line.startswith('#'):
-                    values = line.split(',')
-                    if len(values) >= 9:
-                        baseline_data_1.append(int(values[1]))
-                        baseline_data_2.append(int(values[2]))
-            except:
-                pass
+        block = source.read_block()
+        if len(block):
+            blocks.append(block)
     
-    if baseline_data_1:
+    if blocks:
+        baseline_data = np.concatenate(blocks)
+        baseline_data_1 = baseline_data[:, EMG1]
+        baseline_data_2 = baseline_data[:, EMG2]
         baseline_1 = np.mean(baseline_data_1)
         baseline_2 = np.mean(baseline_data_2)
         noise_1 = np.std(baseline_data_1)
@@ -84,43 +85,37 @@ def monitor_emg():
 
     try:
         while True:
-            if ser.in_waiting:
-                try:
-                    line = ser.readline().decode('utf-8').strip()
-                    if line and not line.startswith('#'):
-                        values = line.split(',')
-                        if len(values) >= 9:
-                            emg1 = int(values[1])
-                            emg2 = int(values[2])
-
-                            emg1_buffer.append(emg1)
-                            emg2_buffer.append(emg2)
+            try:
+                block = source.read_block()
+                for emg1, emg2 in block[:, EMG1:EMG2 + 1].astype(int).tolist():
+                    emg1_buffer.append(emg1)
+                    emg2_buffer.append(emg2)
 
-                            sample_count += 1
+                    sample_count += 1
 
-                            if sample_count % 20 == 0 and len(emg1_buffer) >= 50:
-                                emg1_array = np.array(list(emg1_buffer)[-50:])
-                                emg2_array = np.array(list(emg2_buffer)[-50:])
+                    if sample_count % 20 == 0 and len(emg1_buffer) >= 50:
+                        emg1_array = np.array(list(emg1_buffer)[-50:])
+                        emg2_array = np.array(list(emg2_buffer)[-50:])
 
-                                left_activity = np.mean(emg1_array) - baseline_1
-                                right_activity = np.mean(emg2_array) - baseline_2
+                        left_activity = np.mean(emg1_array) - baseline_1
+                        right_activity = np.mean(emg2_array) - baseline_2
 
-                                left_rms = np.sqrt(np.mean((emg1_array - baseline_1)**2))
-                                right_rms = np.sqrt(np.mean((emg2_array - baseline_2)**2))
+                        left_rms = np.sqrt(np.mean((emg1_array - baseline_1)**2))
+                        right_rms = np.sqrt(np.mean((emg2_array - baseline_2)**2))
 
-                                gesture = gesture_detector.detect(left_activity, right_activity)
+                        gesture = gesture_detector.detect(left_activity, right_activity)
 
-                                left_indicator = get_indicator(left_activity)
-                                right_indicator = get_indicator(right_activity)
+                        left_indicator = get_indicator(left_activity)
+                        right_indicator = get_indicator(right_activity)
 
-                                display = f"\r{left_indicator} L: {emg1:4d} ({left_activity:+4.0f}) RMS:{left_rms:4.0f} | "
-                                display += f"{right_indicator} R: {emg2:4d} ({right_activity:+4.0f}) RMS:{right_rms:4.0f} | "
-                                display += f"[{gesture:12s}]"
+                        display = f"\r{left_indicator} L: {emg1:4d} ({left_activity:+4.0f}) RMS:{left_rms:4.0f} | "
+                        display += f"{right_indicator} R: {emg2:4d} ({right_activity:+4.0f}) RMS:{right_rms:4.0f} | "
+                        display += f"[{gesture:12s}]"
 
-                                print(display, end='')
+                        print(display, end='')
 
-                except Exception as e:
-                    print(f"\nError: {e}")
+            except Exception as e:
+                print(f"\nError: {e}")
 
     except KeyboardInterrupt:
         print("\n\n" + "="*60)
@@ -160,7 +155,7 @@ def monitor_emg():
                 print("  WARNING: Both sensors show similar values - might be cross-talk")
     
     finally:
-        ser.close()
+        source.close()
 
 def get_indicator(activity):
     if activity > 200:
@@ -194,6 +189,10 @@ class SimpleGestureDetector:
             return "REST"
 
 if __name__ == "__main__":
-    monitor_emg()
+    parser = argparse.ArgumentParser(description='Live EMG monitor')
+    parser.add_argument('--port', type=str, help='serial port, skips auto-detection')
+    add_source_arguments(parser)
+    args = parser.parse_args()
+    monitor_emg(source_from_args(args), port=args.port)
 
 
@@ -0,0 +1,342 @@
+"""
+Gesture model artifact for Ctrl-ARM
+The trained tree and scaler as plain arrays in a versioned .npz with a JSON
+schema, so the controllers load a model with NumPy alone and can tell
+whether it was trained on the features they compute, plus a compiled form
+of the tree with the scaler folded into its thresholds
+"""
+
+import json
+from math import isfinite
+from pathlib import Path
+
+import numpy as np
+
+from feature_registry import FEATURES_VERSION, feature_names, set_window
+
+ARTIFACT_PATH = Path(__file__).parent / "emg_model.npz"
+ARTIFACT_FORMAT = 'ctrlarm-gesture-model'
+ARTIFACT_VERSION = 1
+
+# node arrays a decision tree artifact has to carry
+TREE_ARRAYS = ('children_left', 'children_right', 'feature', 'threshold', 'leaf_class')
+
+# leaf probabilities are kept this far from 0 and 1 before taking their logit
+PLATT_CLIP = 1e-3
+
+
+class ArrayScaler:
+    """StandardScaler.transform from its mean and scale arrays"""
+
+    def __init__(self, mean, scale):
+        self.mean = np.asarray(mean, dtype=np.float64)
+        self.scale = np.asarray(scale, dtype=np.float64)
+
+    def transform(self, X):
+        return (np.asarray(X, dtype=np.float64) - self.mean) / self.scale
+
+
+def logit(probability):
+    p = np.clip(probability, PLATT_CLIP, 1 - PLATT_CLIP)
+    return np.log(p / (1 - p))
+
+
+def platt_scale(confidence, calibration):
+    """Probability that the top label is right for a leaf's top-label probability.
+
+    `calibration` is the artifact's calibration record, Platt scaling
+    fitted on held-out recordings: the logistic of slope * logit(p) +
+    intercept. Without one (or for another method) p comes back as is.
+    """
+    if not calibration or calibration.get('method') != 'platt':
+        return np.asarray(confidence, dtype=np.float64)
+    z = calibration['slope'] * logit(confidence) + calibration['intercept']
+    return 1 / (1 + np.exp(-z))
+
+
+def split_features(children_left, feature, features):
+    """Mask of the features a tree splits on, the only ones it ever reads"""
+    used = np.zeros(features, dtype=bool)
+    used[np.asarray(feature)[np.asarray(children_left) != -1]] = True
+    return used
+
+
+class ArrayTree:
+    """DecisionTreeClassifier.predict over flattened node arrays.
+
+    Like sklearn, features are compared as float32 and a sample goes left
+    when its value is <= the node threshold. Leaves have children -1.
+    leaf_proba holds each leaf's class probabilities when the artifact has
+    them, calibration its record of how to calibrate their top label.
+    """
+
+    def __init__(self, children_left, children_right, feature, threshold, leaf_class, classes,
+                 used_features=None, leaf_proba=None, calibration=None):
+        self.children_left = np.asarray(children_left, dtype=np.int64)
+        self.children_right = np.asarray(children_right, dtype=np.int64)
+        self.feature = np.asarray(feature, dtype=np.int64)
+        self.threshold = np.asarray(threshold, dtype=np.float64)
+        self.leaf_class = np.asarray(leaf_class, dtype=np.int64)
+        self.classes_ = np.asarray(classes)
+        self.used_features = used_features
+        self.leaf_proba = leaf_proba
+        self.calibration = calibration
+
+    def predict(self, X):
+        X = np.asarray(X, dtype=np.float32)
+        out = np.empty(len(X), dtype=np.int64)
+        for i, row in enumerate(X):
+            node = 0
+            while self.children_left[node] != -1:
+                if row[self.feature[node]] <= self.threshold[node]:
+                    node = self.children_left[node]
+                else:
+                    node = self.children_right[node]
+            out[i] = self.leaf_class[node]
+        return self.classes_[out]
+
+
+def fold_threshold(threshold, mean, scale):
+    """Largest raw feature value that goes left at a split on scaled features.
+
+    sklearn sends x left when float32((x - mean) / scale) <= threshold. Every
+    step of that is monotonic in x, so some raw cut T gives the same answer
+    as x <= T for every float64 x. t * scale + mean lands within a few ulps
+    of T, search from there for the exact one.
+    """
+    def goes_left(x):
+        # compared in float64 like sklearn, a bare np.float32 would round the threshold too
+        return float(np.float32((x - mean) / scale)) <= threshold
+
+    guess = threshold * scale + mean
+    step = max(abs(guess), scale) * 2.0**-30
+    lo = hi = guess
+    if goes_left(guess):
+        while goes_left(hi):
+            hi += step
+            step *= 2
+            if np.isinf(hi):
+                return np.inf
+    else:
+        while not goes_left(lo):
+            lo -= step
+            step *= 2
+            if np.isinf(lo):
+                return -np.inf
+
+    # bisect down to neighbouring floats, lo always goes left and hi doesn't
+    while True:
+        mid = lo / 2 + hi / 2
+        if mid <= lo or mid >= hi:
+            break
+        if goes_left(mid):
+            lo = mid
+        else:
+            hi = mid
+    while goes_left(np.nextafter(lo, np.inf)):
+        lo = np.nextafter(lo, np.inf)
+    return float(lo)
+
+
+class CompiledTree:
+    """A decision tree that takes raw, unscaled feature vectors.
+
+    The scaler lives in the thresholds (see fold_threshold), so a decision
+    is a handful of float compares with no sklearn validation or temporary
+    arrays. predict_one walks plain lists for a single window, predict
+    moves a whole batch down the tree one level at a time. used_features
+    masks the features it splits on, the rest can be left uncomputed.
+    leaf_proba gives predict_proba the class probabilities of each leaf;
+    without it every leaf is certain of its class. classify_one and
+    classify return a leaf's most probable label with that probability
+    passed through the Platt calibration, when there is one.
+    """
+
+    def __init__(self, children_left, children_right, feature, threshold, leaf_class, classes,
+                 used_features, leaf_proba=None, calibration=None):
+        self.children_left = np.asarray(children_left, dtype=np.int64)
+        self.children_right = np.asarray(children_right, dtype=np.int64)
+        self.feature = np.asarray(feature, dtype=np.int64)
+        self.threshold = np.asarray(threshold, dtype=np.float64)
+        self.leaf_class = np.asarray(leaf_class, dtype=np.int64)
+        self.classes_ = np.asarray(classes)
+        self.used_features = np.asarray(used_features, dtype=bool)
+        if leaf_proba is None:
+            leaf_proba = np.eye(len(self.classes_))[self.leaf_class]
+        self.leaf_proba = np.asarray(leaf_proba, dtype=np.float64)
+        self.calibration = calibration
+        self.leaf_best = self.leaf_proba.argmax(axis=1)
+        self.leaf_confidence = platt_scale(self.leaf_proba.max(axis=1), calibration)
+        leaves = self.children_left == -1
+        # leaves point at themselves so a finished row stays put in predict
+        nodes = np.arange(len(self.children_left))
+        self.step_left = np.where(leaves, nodes, self.children_left)
+        self.step_right = np.where(leaves, nodes, self.children_right)
+        self.depth = self.tree_depth()
+
+        # python lists index several times faster than arrays one element at a time
+        self.nodes = list(zip(self.children_left.tolist(), self.children_right.tolist(),
+                              self.feature.tolist(), self.threshold.tolist()))
+        self.labels = self.classes_[self.leaf_class].tolist()
+        self.best = list(zip(self.classes_[self.leaf_best].tolist(), self.leaf_confidence.tolist()))
+
+    def tree_depth(self):
+        depth = 0
+        level = [0]
+        while True:
+            level = [child for node in level if self.children_left[node] != -1
+                     for child in (self.children_left[node], self.children_right[node])]
+            if not level:
+                return depth
+            depth += 1
+
+    def leaf(self, features):
+        """Leaf one raw feature vector ends up in, ValueError on a NaN it has to split on"""
+        nodes = self.nodes
+        node = 0
+        left, right, feature, threshold = nodes[0]
+        while left != -1:
+            value = features[feature]
+            if not isfinite(value):
+                raise ValueError("feature vector contains NaN or inf")
+            node = left if value <= threshold else right
+            left, right, feature, threshold = nodes[node]
+        return node
+
+    def predict_one(self, features):
+        """Label for one raw feature vector, the same one sklearn predicts"""
+        return self.labels[self.leaf(features)]
+
+    def classify_one(self, features):
+        """(most probable label, its calibrated probability) for one raw feature vector"""
+        return self.best[self.leaf(features)]
+
+    def leaves(self, X):
+        """Leaf of every row of an (n, features) batch, columns it never reads may be nan"""
+        X = np.asarray(X, dtype=np.float64)
+        if not np.all(np.isfinite(X[:, self.used_features])):
+            raise ValueError("feature matrix contains NaN or inf")
+        rows = np.arange(len(X))
+        node = np.zeros(len(X), dtype=np.int64)
+        for _ in range(self.depth):
+            go_left = X[rows, self.feature[node]] <= self.threshold[node]
+            node = np.where(go_left, self.step_left[node], self.step_right[node])
+        return node
+
+    def predict(self, X):
+        """Labels for an (n, features) batch of raw feature vectors"""
+        return self.classes_[self.leaf_class[self.leaves(X)]]
+
+    def predict_proba(self, X):
+        """(n, classes) leaf probabilities for a batch, in classes_ order"""
+        return self.leaf_proba[self.leaves(X)]
+
+    def classify(self, X):
+        """classify_one for every row of a batch, (labels, calibrated probabilities)"""
+        leaves = self.leaves(X)
+        return self.classes_[self.leaf_best[leaves]], self.leaf_confidence[leaves]
+
+
+def leaf_fractions(tree):
+    """Class fractions of the training windows in every node of a sklearn tree"""
+    value = tree.tree_.value[:, 0, :]
+    return value / value.sum(axis=1, keepdims=True)
+
+
+def compile_tree(tree, scaler, leaf_proba=None, calibration=None):
+    """CompiledTree for a fitted tree and the scaler in front of it.
+
+    Takes an ArrayTree/ArrayScaler from an artifact or a sklearn
+    DecisionTreeClassifier/StandardScaler. Returns None for any other
+    model, which then keeps its own predict. Leaf probabilities and the
+    calibration default to the artifact's; a sklearn tree's leaves get
+    its training fractions.
+    """
+    if isinstance(tree, ArrayTree):
+        arrays = [tree.children_left, tree.children_right, tree.feature, tree.threshold, tree.leaf_class]
+        if leaf_proba is None:
+            leaf_proba = tree.leaf_proba
+        if calibration is None:
+            calibration = tree.calibration
+    elif type(tree).__name__ == 'DecisionTreeClassifier' and getattr(tree, 'n_outputs_', 1) == 1:
+        nodes = tree.tree_
+        arrays = [nodes.children_left, nodes.children_right, nodes.feature, nodes.threshold,
+                  nodes.value[:, 0, :].argmax(axis=1)]
+        if leaf_proba is None:
+            leaf_proba = leaf_fractions(tree)
+    else:
+        return None
+
+    features = len(scaler.mean) if isinstance(scaler, ArrayScaler) else scaler.n_features_in_
+    mean = getattr(scaler, 'mean', getattr(scaler, 'mean_', None))
+    scale = getattr(scaler, 'scale', getattr(scaler, 'scale_', None))
+    mean = np.zeros(features) if mean is None else np.asarray(mean, dtype=np.float64)
+    scale = np.ones(features) if scale is None else np.asarray(scale, dtype=np.float64)
+
+    children_left, children_right, feature, threshold, leaf_class = (np.asarray(a) for a in arrays)
+    used = getattr(tree, 'used_features', None)
+    if used is None:
+        used = split_features(children_left, feature, features)
+    folded = np.zeros(len(threshold))
+    for node in np.flatnonzero(children_left != -1):
+        f = feature[node]
+        folded[node] = fold_threshold(float(threshold[node]), float(mean[f]), float(scale[f]))
+    return CompiledTree(children_left, children_right, feature, folded, leaf_class, tree.classes_, used,
+                        leaf_proba, calibration)
+
+
+def check_schema(schema):
+    """Raise ValueError unless this runtime computes the features the model expects"""
+    if schema.get('format') != ARTIFACT_FORMAT:
+        raise ValueError(f"not a {ARTIFACT_FORMAT} artifact")
+    if schema.get('version', 0) > ARTIFACT_VERSION:
+        raise ValueError(f"artifact version {schema['version']} is newer than this code ({ARTIFACT_VERSION})")
+    if schema.get('model') != 'decision_tree':
+        raise ValueError(f"unsupported model type {schema.get('model')}")
+
+    feature_set = schema.get('feature_set')
+    try:
+        expected = feature_names(feature_set)
+    except KeyError:
+        raise ValueError(f"unknown feature set {feature_set}")
+    if schema.get('feature_names') != expected:
+        raise ValueError(f"feature order differs from the '{feature_set}' set this code computes")
+    if schema.get('features_version') != FEATURES_VERSION:
+        raise ValueError(f"trained on feature version {schema.get('features_version')}, "
+                         f"this code computes version {FEATURES_VERSION}")
+    if schema.get('window_size') != set_window(feature_set):
+        raise ValueError(f"trained on {schema.get('window_size')} sample windows, "
+                         f"'{feature_set}' uses {set_window(feature_set)}")
+
+
+def load_artifact(path=ARTIFACT_PATH):
+    """(tree, scaler, schema) from an artifact, checked against the feature registry"""
+    with np.load(path, allow_pickle=False) as data:
+        schema = json.loads(str(data['schema']))
+        check_schema(schema)
+        missing = [name for name in TREE_ARRAYS + ('classes', 'scaler_mean', 'scaler_scale') if name not in data]
+        if missing:
+            raise ValueError(f"artifact is missing {', '.join(missing)}")
+        # artifacts from before the mask was recorded get it from the splits
+        splits = split_features(data['children_left'], data['feature'], len(data['scaler_mean']))
+        used = data['used_features'].astype(bool) if 'used_features' in data else splits
+        leaf_proba = data['leaf_proba'] if 'leaf_proba' in data else None
+        tree = ArrayTree(*(data[name] for name in TREE_ARRAYS), classes=data['classes'], used_features=used,
+                         leaf_proba=leaf_proba, calibration=schema.get('calibration'))
+        scaler = ArrayScaler(data['scaler_mean'], data['scaler_scale'])
+    if list(tree.classes_) != schema['labels']:
+        raise ValueError("label vocabulary doesn't match the tree's classes")
+    if leaf_proba is not None and leaf_proba.shape != (len(tree.leaf_class), len(tree.classes_)):
+        raise ValueError("leaf probabilities don't match the tree's nodes and classes")
+    if used.shape != splits.shape or np.any(splits & ~used):
+        raise ValueError("used feature mask leaves out features the tree splits on")
+    calibration = tree.calibration
+    if calibration and calibration.get('method') == 'platt':
+        if not all(isinstance(calibration.get(key), (int, float)) for key in ('slope', 'intercept')):
+            raise ValueError("platt calibration needs a numeric slope and intercept")
+    return tree, scaler, schema
+
+
+def save_artifact(arrays, schema, path=ARTIFACT_PATH):
+    schema = dict(schema, format=ARTIFACT_FORMAT, version=ARTIFACT_VERSION)
+    np.savez_compressed(path, schema=np.array(json.dumps(schema)), **arrays)
@@ -0,0 +1,158 @@
+"""
+Multi-board ingest for Ctrl-ARM
+Reads several sources at once (one board per arm, an extra IMU board, ...)
+and resamples them onto one host timeline so the rest of the pipeline sees
+a single stream in the usual column layout
+"""
+
+import threading
+import time
+
+import numpy as np
+
+from ring_buffer import RingBuffer
+from sensor_source import SensorSource
+from serial_ingest import FIELDS, NUM_FIELDS, NUM_COLUMNS, TIMESTAMP, HOST_TIME, EMG1, EMG2
+
+# output column -> (source index, column), unmapped columns come from source 0.
+# one board per arm: the right board's first emg channel becomes emg2
+PER_ARM = {EMG1: (0, EMG1), EMG2: (1, EMG1)}
+
+
+class MultiSource(SensorSource):
+    """Merges several sources into one time-aligned stream.
+
+    Each source is read on its own thread into a ring buffer. Samples are
+    placed on the host clock with each board's HOST_TIME (device timestamp
+    plus that board's offset and drift estimate) and linearly interpolated
+    onto a shared grid at rate_hz, up to the newest time every board has
+    reached. A board that has sent nothing for max_lag seconds stops holding
+    the others back and its last values are repeated until it returns.
+
+    read_block() returns the usual (n, NUM_COLUMNS) blocks built from
+    `mapping`; `last_aligned` holds every board's channels for the same
+    rows as an (n, boards, 9) array.
+    """
+
+    def __init__(self, sources, mapping=None, rate_hz=200, max_lag=0.25, timeout=0.1, capacity=2048):
+        super().__init__(timeout, rate_hz)
+        self.sources = list(sources)
+        self.mapping = dict(mapping or {})
+        self.max_lag = max_lag
+        self.period = 1.0 / rate_hz
+        self.rings = [RingBuffer(capacity, NUM_COLUMNS) for _ in self.sources]
+        self.last_arrival = [0.0] * len(self.sources)
+        self.data_ready = threading.Condition()
+        self.threads = []
+        self.start_tick = None
+        self.next_tick = None
+        self.last_aligned = np.empty((0, len(self.sources), NUM_FIELDS))
+        self.name = " + ".join(str(source) for source in self.sources)
+
+        # for every output column, which source and column it comes from
+        self.columns = [self.mapping.get(col, (0, col)) for col in range(NUM_FIELDS)]
+
+    def open(self):
+        for source in self.sources:
+            if not source.is_open:
+                source.open()
+        self.is_open = True
+        self.threads = [threading.Thread(target=self.read_loop, args=(i,), daemon=True)
+                        for i in range(len(self.sources))]
+        for thread in self.threads:
+            thread.start()
+        return True
+
+    def close(self):
+        self.is_open = False
+        for thread in self.threads:
+            thread.join(timeout=1)
+        for source in self.sources:
+            source.close()
+
+    def read_loop(self, index):
+        source = self.sources[index]
+        while self.is_open:
+            try:
+                block = source.read_block()
+            except Exception as e:
+                print(f"\nread error on {source}: {e}")
+                time.sleep(0.1)
+                continue
+            # drop samples the clock model hasn't placed yet
+            block = block[np.isfinite(block[:, HOST_TIME])]
+            if len(block):
+                self.rings[index].push(block)
+                with self.data_ready:
+                    self.last_arrival[index] = time.time()
+                    self.data_ready.notify_all()
+
+    def horizon(self):
+        """Newest host time every live board has data for, None until all have started"""
+        now = time.time()
+        newest = []
+        for ring, arrival in zip(self.rings, self.last_arrival):
+            if ring.total == 0:
+                return None
+            if now - arrival <= self.max_lag:
+                newest.append(ring.window(1)[0, HOST_TIME])
+        if not newest:
+            return None
+        return min(newest)
+
+    def read_block(self):
+        deadline = time.time() + self.timeout
+        with self.data_ready:
+            while True:
+                horizon = self.horizon()
+                if horizon is not None and (self.next_tick is None or horizon >= self.next_tick):
+                    break
+                remaining = deadline - time.time()
+                if remaining <= 0:
+                    return np.empty((0, NUM_COLUMNS))
+                self.data_ready.wait(remaining)
+
+        if self.next_tick is None:
+            # start the grid once every board is running
+            first = max(ring.window(len(ring))[0, HOST_TIME] for ring in self.rings)
+            self.next_tick = np.ceil(first / self.period) * self.period
+            self.start_tick = self.next_tick
+            if horizon < self.next_tick:
+                return np.empty((0, NUM_COLUMNS))
+
+        count = int(np.floor((horizon - self.next_tick) / self.period)) + 1
+        ticks = self.next_tick + np.arange(count) * self.period
+        self.next_tick = ticks[-1] + self.period
+
+        aligned = np.empty((count, len(self.sources), NUM_FIELDS))
+        for i, ring in enumerate(self.rings):
+            # half the ring, so the reader thread can't overwrite what we read
+            recent = ring.window(min(len(ring), ring.capacity // 2))
+            times = np.maximum.accumulate(recent[:, HOST_TIME])
+            start = max(0, int(np.searchsorted(times, ticks[0])) - 1)
+            for col in range(NUM_FIELDS):
+                aligned[:, i, col] = np.interp(ticks, times[start:], recent[start:, col])
+        self.last_aligned = aligned
+
+        block = np.empty((count, NUM_COLUMNS))
+        for col, (source, source_col) in enumerate(self.columns):
+            block[:, col] = aligned[:, source, source_col]
+        block[:, TIMESTAMP] = np.round((ticks - self.start_tick) * 1000.0)
+        block[:, HOST_TIME] = ticks
+        return block
+
+    def report(self):
+        lines = []
+        reference = self.sources[0].health.offset_ms
+        for i, source in enumerate(self.sources):
+            lines.append(f"board {i + 1} ({source}):")
+            lines.extend(f"  {line}" for line in source.report())
+            offset = source.health.offset_ms
+            if i and offset is not None and reference is not None:
+                lines.append(f"  clock offset vs board 1: {offset - reference:+.1f} ms")
+        return lines
+
+    @staticmethod
+    def aligned_columns(boards):
+        """Csv column names for every board's channels, b1_emg1, b1_emg2, ..."""
+        return [f"b{i + 1}_{field}" for i in range(boards) for field in FIELDS]
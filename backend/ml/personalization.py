@@ -0,0 +1,141 @@
+"""
+Online personalization for Ctrl-ARM
+A small per-user gesture model that learns from windows the user confirms
+or corrects while the controller runs, and is checkpointed to disk so it
+carries over between sessions
+"""
+
+import json
+import os
+import threading
+from pathlib import Path
+
+import numpy as np
+
+CHECKPOINT_PATH = Path.home() / '.ctrlarm' / 'personal_model.npz'
+
+
+class OnlineGestureModel:
+    """Gaussian classifier built from running per-class feature statistics.
+
+    Every labelled window updates its class's mean and variance in place
+    (Welford's update, a few array ops on one feature vector), so learning
+    costs microseconds. Past `memory` windows a class turns into an
+    exponential moving average and follows drift in electrode placement.
+    It only answers once `min_samples` windows of at least two classes are
+    in, and only when its posterior is above `confidence`.
+    """
+
+    def __init__(self, feature_names, memory=200, min_samples=5, confidence=0.8):
+        self.feature_names = list(feature_names)
+        self.memory = memory
+        self.min_samples = min_samples
+        self.confidence = confidence
+        self.lock = threading.Lock()
+        self.reset()
+
+    def reset(self):
+        features = len(self.feature_names)
+        self.labels = []
+        self.counts = np.zeros(0)
+        self.means = np.zeros((0, features))
+        self.variances = np.zeros((0, features))
+        self.updates = 0
+        self.dirty = False
+
+    def class_index(self, label):
+        if label not in self.labels:
+            features = len(self.feature_names)
+            self.labels.append(label)
+            self.counts = np.append(self.counts, 0.0)
+            self.means = np.vstack([self.means, np.zeros(features)])
+            self.variances = np.vstack([self.variances, np.zeros(features)])
+        return self.labels.index(label)
+
+    def update(self, features, label):
+        """Fold one labelled feature vector into its class"""
+        x = np.asarray(features, dtype=np.float64)
+        if not np.all(np.isfinite(x)):
+            return False
+        with self.lock:
+            k = self.class_index(label)
+            self.counts[k] += 1
+            rate = 1.0 / min(self.counts[k], self.memory)
+            delta = x - self.means[k]
+            self.means[k] += rate * delta
+            self.variances[k] = (1.0 - rate) * (self.variances[k] + rate * delta * delta)
+            self.updates += 1
+            self.dirty = True
+        return True
+
+    @property
+    def ready(self):
+        return int(np.sum(self.counts >= self.min_samples)) >= 2
+
+    def predict(self, features, confidence=None):
+        """(label, posterior) for a feature vector, label None below `confidence` (default self.confidence)"""
+        x = np.asarray(features, dtype=np.float64)
+        with self.lock:
+            trained = self.counts >= self.min_samples
+            if trained.sum() < 2 or not np.all(np.isfinite(x)):
+                return None, 0.0
+            means = self.means[trained]
+            # floor the variances so a class seen a few times can't be infinitely sharp
+            spread = np.var(means, axis=0) + self.variances[trained].mean(axis=0)
+            variances = self.variances[trained] + 1e-3 * spread + 1e-9
+            labels = [label for label, keep in zip(self.labels, trained) if keep]
+
+        log_likelihood = -0.5 * np.sum(np.log(variances) + (x - means)**2 / variances, axis=1)
+        posterior = np.exp(log_likelihood - log_likelihood.max())
+        posterior /= posterior.sum()
+        best = int(np.argmax(posterior))
+        if posterior[best] < (self.confidence if confidence is None else confidence):
+            return None, float(posterior[best])
+        return labels[best], float(posterior[best])
+
+    def snapshot(self):
+        """Copy of the state to save off the control loop, clears dirty"""
+        with self.lock:
+            self.dirty = False
+            return {
+                'labels': np.array(self.labels, dtype=str),
+                'counts': self.counts.copy(),
+                'means': self.means.copy(),
+                'variances': self.variances.copy(),
+                'meta': np.array(json.dumps({
+                    'feature_names': self.feature_names,
+                    'memory': self.memory,
+                    'updates': self.updates
+                }))
+            }
+
+    def save(self, path=CHECKPOINT_PATH, snapshot=None):
+        snapshot = snapshot if snapshot is not None else self.snapshot()
+        path = Path(path)
+        path.parent.mkdir(parents=True, exist_ok=True)
+        # write then rename so a crash mid-save keeps the last checkpoint
+        tmp = path.with_name(f"{path.stem}.{os.getpid()}.tmp.npz")
+        np.savez(tmp, **snapshot)
+        os.replace(tmp, path)
+
+    def load(self, path=CHECKPOINT_PATH):
+        """Restore a checkpoint made for the same features, False if there is none"""
+        try:
+            with np.load(path) as data:
+                meta = json.loads(str(data['meta']))
+                if meta['feature_names'] != self.feature_names:
+                    print(f"personal model at {path} is for other features, starting fresh")
+                    return False
+                with self.lock:
+                    self.labels = [str(label) for label in data['labels']]
+                    self.counts = data['counts'].astype(np.float64)
+                    self.means = data['means'].astype(np.float64)
+                    self.variances = data['variances'].astype(np.float64)
+                    self.updates = meta.get('updates', 0)
+                    self.dirty = False
+        except (OSError, KeyError, ValueError):
+            return False
+        return True
+
+    def summary(self):
+        return ", ".join(f"{label} {int(count)}" for label, count in zip(self.labels, self.counts))
@@ -0,0 +1,159 @@
+"""
+Serial port discovery for Ctrl-ARM
+Probes every candidate port at once and recognises the XIAO by the data it
+sends rather than the port description, then remembers the board so the
+next launch goes straight to it
+"""
+
+import json
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor, as_completed
+from pathlib import Path
+
+import serial
+import serial.tools.list_ports
+
+from serial_ingest import detect_format
+
+CACHE_PATH = Path.home() / '.ctrlarm' / 'last_device.json'
+
+# usb serial chips the board or its clones show up as
+KNOWN_DESCRIPTIONS = ['xiao', 'arduino', 'usb serial', 'usb-serial', 'ch340', 'cp210', 'ftdi']
+
+
+def port_identity(info):
+    """What identifies a board across replugs, the device path can change"""
+    return {
+        'device': info.device,
+        'description': info.description,
+        'vid': info.vid,
+        'pid': info.pid,
+        'serial_number': info.serial_number,
+    }
+
+
+def load_cached_device(path=CACHE_PATH):
+    try:
+        with open(path) as f:
+            return json.load(f)
+    except (OSError, ValueError):
+        return None
+
+
+def save_cached_device(identity, path=CACHE_PATH):
+    try:
+        path.parent.mkdir(parents=True, exist_ok=True)
+        with open(path, 'w') as f:
+            json.dump(identity, f, indent=2)
+    except OSError as e:
+        print(f"could not save device cache: {e}")
+
+
+def find_cached_port(ports, cached):
+    """The port matching the cached board, by usb ids first, then by path"""
+    if not cached:
+        return None
+    if cached.get('vid') is not None:
+        for info in ports:
+            if (info.vid, info.pid, info.serial_number) == (cached['vid'], cached['pid'], cached.get('serial_number')):
+                return info
+    for info in ports:
+        if info.device == cached.get('device'):
+            return info
+    return None
+
+
+def candidate_ports(ports):
+    """Ports worth probing, likely ones first.
+
+    USB ports and known descriptions come first; legacy ports with no usb
+    ids (the dozens of /dev/ttyS* on linux) are only tried if there is
+    nothing else.
+    """
+    known = [p for p in ports if any(x in p.description.lower() for x in KNOWN_DESCRIPTIONS)]
+    usb = [p for p in ports if p.vid is not None and p not in known]
+    return known + usb or list(ports)
+
+
+def probe_port(device, baudrate=115200, timeout=2.5, stop=None):
+    """Open a port and wait until it sends csv lines or binary frames.
+
+    Returns the open serial connection if it does, otherwise None. Reading
+    starts right away so a board that is already streaming is recognised
+    within a few samples instead of after a fixed settle time.
+    """
+    try:
+        conn = serial.Serial(device, baudrate, timeout=0.05)
+    except (serial.SerialException, OSError):
+        return None
+
+    data = b''
+    start = time.time()
+    try:
+        while time.time() - start < timeout and not (stop and stop.is_set()):
+            data = (data + conn.read(max(1, conn.in_waiting)))[-4096:]
+            if detect_format(data) is not None:
+                return conn
+    except (serial.SerialException, OSError):
+        pass
+    conn.close()
+    return None
+
+
+def probe_ports(devices, baudrate=115200, timeout=2.5, first_only=True):
+    """Probe several ports concurrently.
+
+    Returns {device: open connection} for the ports that streamed our data,
+    with first_only it stops at the first one and closes the rest.
+    """
+    found = {}
+    if not devices:
+        return found
+
+    stop = threading.Event()
+    with ThreadPoolExecutor(max_workers=len(devices)) as pool:
+        futures = {pool.submit(probe_port, device, baudrate, timeout, stop): device for device in devices}
+        for future in as_completed(futures):
+            conn = future.result()
+            if conn is None:
+                continue
+            if first_only and found:
+                conn.close()
+                continue
+            found[futures[future]] = conn
+            if first_only:
+                stop.set()
+    return found
+
+
+def discover_device(baudrate=115200, timeout=2.5, use_cache=True, cache_path=CACHE_PATH):
+    """Find the board, returns (device, open serial connection) or (None, None).
+
+    The board from the last session is tried on its own first; otherwise
+    every candidate port is probed at once and the first one streaming
+    wins and is cached.
+    """
+    ports = list(serial.tools.list_ports.comports())
+    if not ports:
+        return None, None
+
+    cached = find_cached_port(ports, load_cached_device(cache_path)) if use_cache else None
+    if cached is not None:
+        conn = probe_port(cached.device, baudrate, timeout)
+        if conn is not None:
+            print(f"found last used device on {cached.device}")
+            return cached.device, conn
+
+    start = time.time()
+    candidates = [p for p in candidate_ports(ports) if cached is None or p.device != cached.device]
+    found = probe_ports([p.device for p in candidates], baudrate, timeout)
+    if not found:
+        return None, None
+
+    device, conn = next(iter(found.items()))
+    print(f"found device on {device} ({len(candidates)} port(s) probed in {time.time() - start:.1f}s)")
+    if use_cache:
+        info = next(p for p in candidates if p.device == device)
+        save_cached_device(port_identity(info), cache_path)
+    return device, conn
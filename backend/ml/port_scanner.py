@@ -8,6 +8,7 @@ import serial
 import serial.tools.list_ports
 import time
 import sys
+from port_discovery import probe_ports
 
 def scan_ports():
     """Scan all available serial ports"""
@@ -97,19 +98,26 @@ def test_port(port_device, baudrate=115200):
         return False
 
 def test_all_ports(ports):
-    """Test all available ports"""
+    """Test all available ports at once"""
     print("🧪 Testing all ports...")
     print("=" * 60)
     
+    # every port gets the full 5 seconds, but in parallel
+    start_time = time.time()
+    found = probe_ports([port.device for port in ports], timeout=5, first_only=False)
+    for conn in found.values():
+        conn.close()
+    
     working_ports = []
     
     for i, port in enumerate(ports):
-        print(f"\n[{i+1}/{len(ports)}] Testing {port.device}")
-        print("-" * 40)
-        
-        if test_port(port.device):
+        if port.device in found:
+            print(f"[{i+1}/{len(ports)}] ✅ {port.device} is streaming Ctrl-ARM data")
             working_ports.append(port)
+        else:
+            print(f"[{i+1}/{len(ports)}] ⚠️  {port.device} sent no sensor data")
     
+    print(f"\n⏱️  Tested {len(ports)} port(s) in {time.time() - start_time:.1f}s")
     return working_ports
 
 def main():
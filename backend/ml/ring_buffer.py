@@ -0,0 +1,96 @@
+"""
+Ring buffer for Ctrl-ARM sample streams
+Preallocated multi-channel numpy storage shared by one producer (the serial
+thread) and one consumer (the processing loop)
+"""
+
+import threading
+import numpy as np
+
+
+class RingBuffer:
+    """Fixed-capacity sample buffer with zero-copy window views.
+
+    Every sample is written twice, at slot i and i + capacity, so any run of
+    up to capacity consecutive samples is one contiguous slice. Samples are
+    addressed by a monotonic index: `total` is the number of samples ever
+    pushed and only moves forward, after the data is in place.
+
+    Views stay valid until the producer has written another capacity
+    samples, so keep capacity well above the longest window times the
+    worst expected consumer lag.
+
+    The consumer can block in wait() instead of polling; push() wakes it
+    once per block, so it handles whole batches per wakeup.
+    """
+
+    def __init__(self, capacity, channels, dtype=np.float64):
+        self.capacity = capacity
+        self.channels = channels
+        self.data = np.zeros((2 * capacity, channels), dtype=dtype)
+        self.total = 0
+        self.data_ready = threading.Condition()
+
+    def __len__(self):
+        return min(self.total, self.capacity)
+
+    @property
+    def oldest(self):
+        """Index of the oldest sample still held"""
+        return max(0, self.total - self.capacity)
+
+    def push(self, block):
+        """Append an (n, channels) block, returns the new total"""
+        n = len(block)
+        if n == 0:
+            return self.total
+
+        total = self.total
+        if n > self.capacity:
+            # only the newest capacity samples can be kept
+            total += n - self.capacity
+            block = block[-self.capacity:]
+            n = self.capacity
+
+        start = total % self.capacity
+        first = min(n, self.capacity - start)
+        self.data[start:start + first] = block[:first]
+        self.data[start + self.capacity:start + self.capacity + first] = block[:first]
+
+        rest = n - first
+        if rest:
+            self.data[:rest] = block[first:]
+            self.data[self.capacity:self.capacity + rest] = block[first:]
+
+        # publish only once the samples are written
+        with self.data_ready:
+            self.total = total + n
+            self.data_ready.notify_all()
+        return self.total
+
+    def wait(self, index, timeout=None):
+        """Block until samples past `index` arrive or timeout, returns total"""
+        with self.data_ready:
+            self.data_ready.wait_for(lambda: self.total > index, timeout)
+            return self.total
+
+    def window(self, length, end=None):
+        """View of the `length` samples ending just before index `end`"""
+        if end is None:
+            end = self.total
+        if length > self.capacity or end > self.total or end - length < self.oldest:
+            raise IndexError(f"samples [{end - length}, {end}) not in buffer")
+
+        start = (end - length) % self.capacity
+        return self.data[start:start + length]
+
+    def read_since(self, index):
+        """Everything pushed since `index`.
+
+        Returns (view, next_index, lost) where lost counts samples that were
+        overwritten before the consumer got to them.
+        """
+        total = self.total
+        lost = max(0, total - self.capacity - index)
+        index += lost
+        return self.window(total - index, total), total, lost
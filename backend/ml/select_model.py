@@ -0,0 +1,187 @@
+#!/usr/bin/env python3
+"""
+Model selection for Ctrl-ARM
+Cross-validates several gesture classifiers by recording, measures how long
+one window takes to classify the way the controllers run the model, and
+saves the most accurate model that fits the latency budget, calibrated on
+held-out recordings
+"""
+
+import argparse
+import time
+
+import numpy as np
+from joblib import Parallel, delayed
+from sklearn.base import clone
+from sklearn.discriminant_analysis import LinearDiscriminantAnalysis
+from sklearn.ensemble import HistGradientBoostingClassifier, RandomForestClassifier
+from sklearn.linear_model import LogisticRegression
+from sklearn.metrics import accuracy_score
+from sklearn.model_selection import GroupKFold, GroupShuffleSplit
+from sklearn.neighbors import KNeighborsClassifier
+from sklearn.preprocessing import StandardScaler
+from sklearn.tree import DecisionTreeClassifier
+
+from emg_filter import add_conditioning_arguments, conditioning_from_args
+from feature_registry import FEATURE_SETS, DEFAULT_FEATURE_SET
+from model_artifact import compile_tree
+from train_model import (load_dataset, save_model, export_artifact, calibrate, dataset_digest, MODEL_PATH, HOP,
+                         DATA_DIR)
+
+
+def candidates():
+    """Fresh, unfitted estimators by name"""
+    return {
+        'tree_depth4': DecisionTreeClassifier(max_depth=4, min_samples_split=5, min_samples_leaf=2, random_state=42),
+        'tree_depth8': DecisionTreeClassifier(max_depth=8, min_samples_leaf=5, random_state=42),
+        'tree_depth12': DecisionTreeClassifier(max_depth=12, min_samples_leaf=10, random_state=42),
+        'random_forest': RandomForestClassifier(n_estimators=100, max_depth=12, min_samples_leaf=5,
+                                                n_jobs=1, random_state=42),
+        'gradient_boosting': HistGradientBoostingClassifier(max_iter=100, random_state=42),
+        'lda': LinearDiscriminantAnalysis(),
+        'knn': KNeighborsClassifier(n_neighbors=15),
+        'logistic': LogisticRegression(max_iter=2000),
+    }
+
+
+def score_fold(estimator, X, y, train_index, test_index):
+    scaler = StandardScaler().fit(X[train_index])
+    model = clone(estimator).fit(scaler.transform(X[train_index]), y[train_index])
+    return accuracy_score(y[test_index], model.predict(scaler.transform(X[test_index])))
+
+
+def cross_validate(models, X, y, groups, folds=5, jobs=-1):
+    """Mean and std of grouped cv accuracy per model, every (model, fold) fit in parallel"""
+    splits = list(GroupKFold(n_splits=folds).split(X, y, groups))
+    jobs_list = [(name, train_index, test_index) for name in models for train_index, test_index in splits]
+    scores = Parallel(n_jobs=jobs)(
+        delayed(score_fold)(models[name], X, y, train_index, test_index)
+        for name, train_index, test_index in jobs_list)
+
+    results = {name: [] for name in models}
+    for (name, _, _), score in zip(jobs_list, scores):
+        results[name].append(score)
+    return {name: (np.mean(s), np.std(s)) for name, s in results.items()}
+
+
+def runtime_classifier(model, scaler):
+    """One feature list -> (label, probability), the call the cascade's tree stage makes.
+
+    A tree is compiled with the scaler folded in, as the controllers load
+    it; any other model keeps scaler.transform and predict_proba.
+    """
+    compiled = compile_tree(model, scaler)
+    if compiled is not None:
+        return compiled.classify_one
+
+    def classify(features):
+        proba = model.predict_proba(scaler.transform([features]))[0]
+        best = int(np.argmax(proba))
+        return model.classes_[best], float(proba[best])
+    return classify
+
+
+def measure_latency(classify, X, repeats=300, seed=0):
+    """p50 and p99 ms for classify() on a single window's feature list"""
+    rng = np.random.default_rng(seed)
+    rows = X[rng.integers(0, len(X), size=repeats)].tolist()
+    for row in rows[:20]:
+        classify(row)
+
+    times = np.empty(repeats)
+    for i, row in enumerate(rows):
+        start = time.perf_counter()
+        classify(row)
+        times[i] = time.perf_counter() - start
+    return np.percentile(times, 50) * 1000, np.percentile(times, 99) * 1000
+
+
+def pareto_front(results):
+    """Names no other model beats on both accuracy and p99 latency"""
+    front = []
+    best = -1.0
+    for name in sorted(results, key=lambda n: (results[n]['p99_ms'], -results[n]['accuracy'])):
+        if results[name]['accuracy'] > best:
+            front.append(name)
+            best = results[name]['accuracy']
+    return front
+
+
+def select(results, budget_ms):
+    """Most accurate model whose p99 fits the budget, None if none does"""
+    fitting = [name for name in results if results[name]['p99_ms'] <= budget_ms]
+    if not fitting:
+        return None
+    return max(fitting, key=lambda n: (results[n]['accuracy'], -results[n]['p99_ms']))
+
+
+def main():
+    parser = argparse.ArgumentParser(description='Compare gesture classifiers on accuracy and latency')
+    parser.add_argument('--budget-ms', type=float, default=1.0,
+                        help='p99 time allowed to classify one window')
+    parser.add_argument('--features', choices=sorted(FEATURE_SETS), default=DEFAULT_FEATURE_SET)
+    parser.add_argument('--hop', type=int, default=HOP, help='samples between training windows')
+    parser.add_argument('--folds', type=int, default=5, help='cross-validation folds, split by recording')
+    parser.add_argument('--jobs', type=int, default=-1, help='parallel fits, -1 for one per cpu')
+    parser.add_argument('--no-save', action='store_true', help='only report, keep the current model')
+    add_conditioning_arguments(parser)
+    args = parser.parse_args()
+    conditioning = conditioning_from_args(args)
+
+    print("model selection")
+    print("-" * 60)
+    csv_files = sorted(DATA_DIR.glob('*.csv'))
+    X, y, groups = load_dataset(csv_files, conditioning, args.features, hop=args.hop)
+    print(f"{len(X)} windows from {len(np.unique(groups))} files")
+    if len(np.unique(groups)) < args.folds:
+        print("not enough recordings to cross-validate")
+        return
+
+    models = candidates()
+    print(f"\ncross-validating {len(models)} models, {args.folds} folds...")
+    started = time.time()
+    scores = cross_validate(models, X, y, groups, args.folds, args.jobs)
+    print(f"done in {time.time() - started:.1f}s")
+
+    # the final fit holds out files like train_model, they calibrate the saved
+    # model. timed one at a time, parallel work would skew it
+    split = GroupShuffleSplit(n_splits=1, test_size=0.2, random_state=42)
+    train_index, test_index = next(split.split(X, y, groups))
+    scaler = StandardScaler().fit(X[train_index])
+    X_train_scaled = scaler.transform(X[train_index])
+    fitted = {}
+    results = {}
+    for name, estimator in models.items():
+        fitted[name] = clone(estimator).fit(X_train_scaled, y[train_index])
+        p50, p99 = measure_latency(runtime_classifier(fitted[name], scaler), X)
+        results[name] = {'accuracy': scores[name][0], 'accuracy_std': scores[name][1],
+                         'p50_ms': p50, 'p99_ms': p99}
+
+    front = pareto_front(results)
+    chosen = select(results, args.budget_ms)
+
+    print(f"\n{'model':18s} {'accuracy':>14s} {'p50 ms':>8s} {'p99 ms':>8s}")
+    for name in sorted(results, key=lambda n: -results[n]['accuracy']):
+        r = results[name]
+        marks = (' pareto' if name in front else '') + (' <- selected' if name == chosen else '')
+        print(f"{name:18s} {r['accuracy']:7.1%} +/-{r['accuracy_std']:4.1%} "
+              f"{r['p50_ms']:8.3f} {r['p99_ms']:8.3f}{marks}")
+
+    if chosen is None:
+        print(f"\nno model classifies a window within {args.budget_ms} ms at p99")
+        return
+    if args.no_save:
+        return
+
+    # the probabilities the cascade's tree stage compares with its abstain threshold
+    calibration = calibrate(fitted[chosen], scaler.transform(X[test_index]), y[test_index], groups[test_index])
+    training_data = dataset_digest(csv_files)
+    save_model(fitted[chosen], scaler, conditioning, args.features, hop=args.hop, training_data=training_data,
+               calibration=calibration, selection={'name': chosen, 'budget_ms': args.budget_ms, **results[chosen]})
+    print(f"\nsaved {chosen} to {MODEL_PATH}")
+    export_artifact(fitted[chosen], scaler, conditioning, args.features, training_data, calibration=calibration,
+                    hop=args.hop)
+
+
+if __name__ == "__main__":
+    main()
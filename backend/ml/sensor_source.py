@@ -0,0 +1,471 @@
+"""
+Sensor sources for Ctrl-ARM
+Everything that produces sample blocks goes through one interface, so the
+controllers, live monitor and data logger run the same way against the XIAO,
+a replay of recorded sessions or a synthetic signal
+"""
+
+import glob
+import os
+import time
+from pathlib import Path
+
+import numpy as np
+
+from serial_ingest import (SerialBlockReader, with_host_time, empty_block,
+                           NUM_FIELDS, NUM_COLUMNS, EMG1, EMG2, ACCEL_X, ACCEL_Z, GYRO_X, GYRO_Z)
+from stream_stats import StreamHealth
+
+DATA_DIR = Path(__file__).parent.parent.parent / 'data' / 'raw'
+
+# csv columns written by the data logger, in serial_ingest.FIELDS order
+CSV_COLUMNS = [
+    'timestamp_ms', 'emg1_left', 'emg2_right',
+    'accel_x', 'accel_y', 'accel_z',
+    'gyro_x', 'gyro_y', 'gyro_z'
+]
+
+
+class SensorSource:
+    """A stream of sample blocks.
+
+    open() returns True once samples can be read, read_block() returns an
+    (n, NUM_COLUMNS) array like SerialBlockReader.read_block and waits at
+    most `timeout` seconds when nothing is ready, close() releases it.
+    """
+
+    name = 'source'
+
+    def __init__(self, timeout=0.1, rate_hz=200):
+        self.timeout = timeout
+        self.rate_hz = rate_hz
+        self.health = StreamHealth(rate_hz)
+        self.comments = []
+        self.is_open = False
+
+    def open(self):
+        self.is_open = True
+        return True
+
+    def read_block(self):
+        raise NotImplementedError
+
+    def close(self):
+        self.is_open = False
+
+    def report(self):
+        """Stream health lines for the session stats"""
+        return self.health.report()
+
+    def fileno(self):
+        """A file descriptor an event loop can wait on, None if read_block has to be polled"""
+        return None
+
+    def __enter__(self):
+        self.open()
+        return self
+
+    def __exit__(self, *exc):
+        self.close()
+
+    def __str__(self):
+        return self.name
+
+
+class SerialSource(SensorSource):
+    """The XIAO over USB serial.
+
+    Pass serial_conn to take over a port that is already open and known to
+    be streaming (see port_discovery), which skips the settle time.
+
+    If the port dies mid-stream and `reconnect` is set, read_block() keeps
+    returning empty blocks while it retries with exponential backoff. The
+    same board is found again by its usb ids, even if the os gave it a new
+    device path, and outages are recorded in `health`.
+    """
+
+    def __init__(self, port, baudrate=115200, timeout=0.1, settle=1.5, protocol='auto', rate_hz=200,
+                 serial_conn=None, reconnect=True, max_backoff=2.0):
+        super().__init__(timeout, rate_hz)
+        self.port = port
+        self.baudrate = baudrate
+        self.settle = settle
+        self.protocol = protocol
+        self.serial_conn = serial_conn
+        self.reader = None
+        self.name = port
+
+        self.reconnect = reconnect
+        self.max_backoff = max_backoff
+        self.identity = None
+        self.outage_start = None
+        self.backoff = 0.1
+        self.next_attempt = 0.0
+
+    def open(self):
+        """Open the port, wait for the board to settle and drop the boot output.
+
+        Raises serial.SerialException if the port can't be opened.
+        """
+        import serial
+
+        if self.serial_conn is None or not self.serial_conn.is_open:
+            self.serial_conn = serial.Serial(self.port, self.baudrate, timeout=self.timeout)
+            time.sleep(self.settle)
+        else:
+            self.serial_conn.timeout = self.timeout
+
+        # keep the banner lines, throw away any half-sent samples
+        if self.serial_conn.in_waiting:
+            boot = self.serial_conn.read(self.serial_conn.in_waiting)
+            self.comments.extend(line.strip().decode('utf-8', errors='ignore')
+                                 for line in boot.split(b'\n') if line.startswith(b'#'))
+        self.serial_conn.reset_input_buffer()
+
+        self.reader = SerialBlockReader(self.serial_conn, self.protocol, rate_hz=self.rate_hz)
+        self.reader.health = self.health
+        self.reader.comments = self.comments
+        self.identity = self.find_identity()
+        self.is_open = True
+        return True
+
+    def find_identity(self):
+        """Usb ids of the open port so a replugged board can be found again"""
+        from port_discovery import port_identity
+        import serial.tools.list_ports
+
+        for info in serial.tools.list_ports.comports():
+            if info.device == self.port:
+                return port_identity(info)
+        return {'device': self.port}
+
+    def fileno(self):
+        # posix only, windows can't select() on a com port
+        if os.name != 'posix' or self.outage_start is not None or not self.is_open:
+            return None
+        return self.serial_conn.fileno()
+
+    def read_block(self):
+        if self.outage_start is not None:
+            return self.try_reconnect()
+        try:
+            return self.reader.read_block()
+        except OSError as e:
+            # serial.SerialException is an OSError, a dead handle raises here
+            if not self.reconnect:
+                raise
+            self.lost_connection(e)
+            return np.empty((0, NUM_COLUMNS))
+
+    def lost_connection(self, error):
+        print(f"\nlost connection to {self.port}: {error}")
+        print("reconnecting...")
+        try:
+            self.serial_conn.close()
+        except OSError:
+            pass
+        self.outage_start = time.time()
+        self.backoff = 0.1
+        self.next_attempt = self.outage_start + self.backoff
+
+    def try_reconnect(self):
+        """One reconnect attempt if it's due, otherwise wait like a read would"""
+        import serial
+        import serial.tools.list_ports
+        from port_discovery import find_cached_port
+
+        now = time.time()
+        if now < self.next_attempt:
+            time.sleep(min(self.next_attempt - now, self.timeout))
+            return np.empty((0, NUM_COLUMNS))
+
+        info = find_cached_port(list(serial.tools.list_ports.comports()), self.identity)
+        port = info.device if info is not None else self.port
+        try:
+            self.serial_conn = serial.Serial(port, self.baudrate, timeout=self.timeout)
+        except OSError:
+            self.backoff = min(self.backoff * 2, self.max_backoff)
+            self.next_attempt = time.time() + self.backoff
+            return np.empty((0, NUM_COLUMNS))
+
+        # same board, same parser state, only the partial line is stale
+        self.port = port
+        self.name = port
+        self.reader.serial_conn = self.serial_conn
+        self.reader.reset()
+        outage = time.time() - self.outage_start
+        self.health.record_outage(outage, self.outage_start)
+        self.outage_start = None
+        print(f"reconnected to {port} after {outage:.1f}s")
+        return np.empty((0, NUM_COLUMNS))
+
+    def close(self):
+        if self.serial_conn:
+            self.serial_conn.close()
+        self.is_open = False
+
+
+class PlaybackSource(SensorSource):
+    """Base for sources that make up samples instead of reading a device.
+
+    Samples are released on the wall clock according to their timestamps,
+    `speed` times faster than real time, or as fast as they are asked for
+    when speed is 0. Subclasses provide timestamps() and generate().
+    """
+
+    def __init__(self, speed=1.0, block_size=64, timeout=0.1, rate_hz=200):
+        super().__init__(timeout, rate_hz)
+        self.speed = speed
+        self.block_size = block_size
+        self.position = 0
+        self.start_time = None
+        self.start_ms = 0.0
+
+    @property
+    def finished(self):
+        return False
+
+    def timestamps(self, start, stop):
+        """Device timestamps (ms) of samples [start, stop)"""
+        raise NotImplementedError
+
+    def generate(self, start, stop):
+        """The (stop - start, 9) block of samples [start, stop)"""
+        raise NotImplementedError
+
+    def open(self):
+        self.position = 0
+        self.start_time = time.time()
+        self.start_ms = float(self.timestamps(0, 1)[0]) if not self.finished else 0.0
+        self.is_open = True
+        return True
+
+    def due_samples(self, now):
+        """How many samples past position are due at wall time now"""
+        if self.speed <= 0:
+            return self.block_size
+        due_ms = self.start_ms + (now - self.start_time) * 1000.0 * self.speed
+        count = 0
+        # the common case is a few blocks, search in growing steps
+        step = max(self.block_size, int(self.rate_hz * self.timeout * self.speed) + 1)
+        while True:
+            stamps = self.timestamps(self.position + count, self.position + count + step)
+            due = int(np.searchsorted(stamps, due_ms, side='right'))
+            count += due
+            if due < len(stamps) or len(stamps) == 0:
+                return count
+
+    def read_block(self):
+        if self.start_time is None:
+            self.open()
+        if self.finished:
+            time.sleep(self.timeout)
+            return np.empty((0, NUM_COLUMNS))
+
+        now = time.time()
+        count = self.due_samples(now)
+        if count == 0:
+            # like a serial read, wait for the next sample up to the timeout
+            next_ms = float(self.timestamps(self.position, self.position + 1)[0])
+            wait = (next_ms - self.start_ms) / (1000.0 * self.speed) - (now - self.start_time)
+            time.sleep(min(max(wait, 0.0), self.timeout))
+            now = time.time()
+            count = self.due_samples(now)
+            if count == 0:
+                return np.empty((0, NUM_COLUMNS))
+
+        block = self.generate(self.position, self.position + count)
+        self.position += len(block)
+        if len(block) == 0:
+            return np.empty((0, NUM_COLUMNS))
+        return with_host_time(block, self.health, now)
+
+
+class ReplaySource(PlaybackSource):
+    """Streams recorded sessions from data/raw back as if they were live.
+
+    paths is a csv path, a glob pattern or a list of either. Files are
+    played back to back with their timestamps made continuous, and pauses
+    longer than max_gap_ms inside a recording are cut to one sample period.
+    `labels` holds the recorded label of every sample.
+    """
+
+    def __init__(self, paths=None, speed=1.0, loop=False, max_gap_ms=1000, block_size=64,
+                 timeout=0.1, rate_hz=200):
+        super().__init__(speed, block_size, timeout, rate_hz)
+        if paths is None:
+            paths = str(DATA_DIR / '*.csv')
+        if isinstance(paths, (str, Path)):
+            paths = [paths]
+
+        self.files = []
+        for path in paths:
+            matches = sorted(glob.glob(str(path)))
+            self.files.extend(matches if matches else [str(path)])
+        self.loop = loop
+        self.max_gap_ms = max_gap_ms
+        self.samples = empty_block()
+        self.labels = np.empty(0, dtype=object)
+        self.name = f"replay of {len(self.files)} file(s)"
+
+    def load(self):
+        # pandas takes a while to import, only replays pay for it
+        import pandas as pd
+
+        period = 1000.0 / self.rate_hz
+        blocks = []
+        labels = []
+        next_ms = 0.0
+        for path in self.files:
+            df = pd.read_csv(path)
+            if len(df) == 0:
+                continue
+            block = df[CSV_COLUMNS].to_numpy(dtype=np.float64)
+
+            stamps = block[:, 0]
+            deltas = np.diff(stamps, prepend=stamps[0] - period)
+            deltas[deltas > self.max_gap_ms] = period
+            block[:, 0] = next_ms + np.cumsum(deltas) - period
+            next_ms = block[-1, 0] + period
+
+            blocks.append(block)
+            labels.append(df['label'].to_numpy() if 'label' in df else np.full(len(df), None))
+
+        if not blocks:
+            raise FileNotFoundError(f"no samples in {self.files}")
+        self.samples = np.concatenate(blocks)
+        self.labels = np.concatenate(labels)
+
+    def open(self):
+        if len(self.samples) == 0:
+            self.load()
+        return super().open()
+
+    @property
+    def finished(self):
+        return not self.loop and self.position >= len(self.samples)
+
+    def timestamps(self, start, stop):
+        if not self.loop:
+            return self.samples[start:stop, 0]
+        index = np.arange(start, stop)
+        laps, index = np.divmod(index, len(self.samples))
+        span = self.samples[-1, 0] + 1000.0 / self.rate_hz
+        return self.samples[index, 0] + laps * span
+
+    def generate(self, start, stop):
+        if not self.loop:
+            return self.samples[start:stop].copy()
+        block = self.samples[np.arange(start, stop) % len(self.samples)].copy()
+        block[:, 0] = self.timestamps(start, stop)
+        return block
+
+
+class SyntheticSource(PlaybackSource):
+    """Parametric EMG + IMU signal for testing without recordings.
+
+    Cycles through `gestures`, each held for gesture_ms with rest_ms of rest
+    in between. EMG is an envelope like the MyoWare output: baseline plus
+    noise, with a smooth bump of the gesture's amplitude on each active
+    channel. The IMU reads gravity on z with small noise. Runs forever
+    unless duration (seconds of signal) is given.
+    """
+
+    # (left, right) envelope amplitude above baseline
+    GESTURES = {
+        'rest': (0, 0),
+        'left_flex': (120, 0),
+        'right_flex': (0, 120),
+        'both_flex': (120, 120),
+        'left_strong': (400, 0),
+        'right_strong': (0, 400),
+    }
+
+    def __init__(self, gestures=None, gesture_ms=600, rest_ms=900, baseline=(25, 30), noise=4.0,
+                 imu_noise=0.01, duration=None, seed=0, speed=1.0, block_size=64, timeout=0.1,
+                 rate_hz=200):
+        super().__init__(speed, block_size, timeout, rate_hz)
+        self.gestures = list(gestures or [g for g in self.GESTURES if g != 'rest'])
+        self.gesture_ms = gesture_ms
+        self.rest_ms = rest_ms
+        self.baseline = np.asarray(baseline, dtype=np.float64)
+        self.noise = noise
+        self.imu_noise = imu_noise
+        self.duration = duration
+        self.seed = seed
+        self.rng = np.random.default_rng(seed)
+        self.name = "synthetic"
+
+    def open(self):
+        self.rng = np.random.default_rng(self.seed)
+        return super().open()
+
+    @property
+    def total_samples(self):
+        return None if self.duration is None else int(self.duration * self.rate_hz)
+
+    @property
+    def finished(self):
+        return self.total_samples is not None and self.position >= self.total_samples
+
+    def timestamps(self, start, stop):
+        if self.total_samples is not None:
+            stop = min(stop, self.total_samples)
+        return np.arange(start, max(start, stop)) * (1000.0 / self.rate_hz)
+
+    def label_at(self, stamps):
+        """Gesture name active at each timestamp"""
+        cycle = self.gesture_ms + self.rest_ms
+        index = (stamps // cycle).astype(int) % len(self.gestures)
+        active = stamps % cycle >= self.rest_ms
+        names = np.array(self.gestures, dtype=object)[index]
+        names[~active] = 'rest'
+        return names
+
+    def generate(self, start, stop):
+        stamps = self.timestamps(start, stop)
+        n = len(stamps)
+        block = np.zeros((n, NUM_FIELDS))
+        block[:, 0] = stamps
+
+        cycle = self.gesture_ms + self.rest_ms
+        phase = (stamps % cycle - self.rest_ms) / self.gesture_ms
+        shape = np.where((phase >= 0) & (phase < 1), np.sin(np.pi * np.clip(phase, 0, 1)) ** 2, 0.0)
+        index = (stamps // cycle).astype(int) % len(self.gestures)
+        amplitude = np.array([self.GESTURES.get(g, (0, 0)) for g in self.gestures], dtype=np.float64)[index]
+
+        emg = self.baseline + amplitude * shape[:, None] + self.rng.normal(0, self.noise, (n, 2))
+        block[:, EMG1:EMG2 + 1] = np.clip(np.round(emg), 0, 1023)
+        block[:, ACCEL_X:ACCEL_Z + 1] = np.round(self.rng.normal(0, self.imu_noise, (n, 3)) + [0, 0, 1], 3)
+        block[:, GYRO_X:GYRO_Z + 1] = np.round(self.rng.normal(0, 0.5, (n, 3)), 2)
+        return block
+
+
+def add_source_arguments(parser):
+    """Add the --replay/--synthetic/--speed/--boards/--shared options to an argparse parser"""
+    parser.add_argument('--shared', nargs='?', const='ctrlarm_stream', metavar='NAME',
+                        help='read the stream published by stream_daemon.py instead of opening the port')
+    parser.add_argument('--boards', nargs='+', metavar='PORT',
+                        help='read several boards at once and merge them, first one per arm')
+    parser.add_argument('--replay', nargs='+', metavar='CSV',
+                        help='replay recorded csv files or globs instead of reading the device')
+    parser.add_argument('--synthetic', action='store_true',
+                        help='use a synthetic signal instead of the device')
+    parser.add_argument('--speed', type=float, default=1.0,
+                        help='replay/synthetic speed multiplier, 0 for as fast as possible')
+
+
+def source_from_args(args):
+    """Build the source selected on the command line, None means the serial device"""
+    if getattr(args, 'shared', None):
+        from shared_ring import SharedStreamSource
+        return SharedStreamSource(args.shared)
+    if getattr(args, 'boards', None):
+        from multi_source import MultiSource, PER_ARM
+        sources = [SerialSource(port) for port in args.boards]
+        return MultiSource(sources, mapping=PER_ARM if len(sources) == 2 else None)
+    if getattr(args, 'replay', None):
+        return ReplaySource(args.replay, speed=args.speed)
+    if getattr(args, 'synthetic', False):
+        return SyntheticSource(speed=args.speed)
+    return None
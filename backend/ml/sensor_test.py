@@ -3,6 +3,7 @@ import serial
 import serial.tools.list_ports
 import time
 import numpy as np
+from serial_ingest import SerialBlockReader, EMG1, EMG2
 
 def test_sensors():
     print("="*60)
@@ -27,8 +28,8 @@ def test_sensors():
     ser = serial.Serial(port, 115200, timeout=0.1)
     time.sleep(2)
     
-    while ser.in_waiting:
-        ser.readline()
+    ser.reset_input_buffer()
+    reader = SerialBlockReader(ser)
     
     print("\n" + "="*60)
     print("SENSOR MAPPING TEST")
@@ -42,39 +43,37 @@ def test_sensors():
     
     try:
         while True:
-            if ser.in_waiting:
-                try:
-                    line = ser.readline().decode('utf-8').strip()
-                    if line and not line.startswith('#'):
-                        values = line.split(',')
-                        if len(values) >= 9:
-                            timestamp = values[0]
-                            emg1_value = int(values[1])
-                            emg2_value = int(values[2])
+            try:
+                block = reader.read_block()
+                if not len(block):
+                    continue
 
-                            emg1_activity = max(0, emg1_value - 500)
-                            emg2_activity = max(0, emg2_value - 500)
+                # only the newest sample matters for the display
+                emg1_value, emg2_value = block[-1, EMG1:EMG2 + 1].astype(int).tolist()
 
-                            bar1 = "█" * min(20, emg1_activity // 10)
-                            bar2 = "█" * min(20, emg2_activity // 10)
+                emg1_activity = max(0, emg1_value - 500)
+                emg2_activity = max(0, emg2_value - 500)
 
-                            if emg1_activity > 50 and emg2_activity > 50:
-                                status = "BOTH ACTIVE"
-                            elif emg1_activity > 50:
-                                status = "A0 ACTIVE (should be LEFT)"
-                            elif emg2_activity > 50:
-                                status = "A1 ACTIVE (should be RIGHT)"
-                            else:
-                                status = "BOTH REST"
+                bar1 = "█" * min(20, emg1_activity // 10)
+                bar2 = "█" * min(20, emg2_activity // 10)
 
-                            display = f"\r{status:30s} | "
-                            display += f"A0: {emg1_value:4d} {bar1:20s} | "
-                            display += f"A1: {emg2_value:4d} {bar2:20s}"
-                            
-                            print(display, end='')
-                            
-                except Exception as e:
-                    pass
+                if emg1_activity > 50 and emg2_activity > 50:
+                    status = "BOTH ACTIVE"
+                elif emg1_activity > 50:
+                    status = "A0 ACTIVE (should be LEFT)"
+                elif emg2_activity > 50:
+                    status = "A1 ACTIVE (should be RIGHT)"
+                else:
+                    status = "BOTH REST"
+
+                display = f"\r{status:30s} | "
+                display += f"A0: {emg1_value:4d} {bar1:20s} | "
+                display += f"A1: {emg2_value:4d} {bar2:20s}"
+                
+                print(display, end='')
+                
+            except Exception as e:
+                pass
     
     except KeyboardInterrupt:
         print("\n\n" + "="*60)
@@ -0,0 +1,190 @@
+"""
+Bulk serial ingest for Ctrl-ARM
+Reads everything the XIAO has sent in one call and parses whole batches of
+CSV lines or binary frames into numpy blocks instead of one readline() per
+sample
+"""
+
+import time
+import numpy as np
+from wire_protocol import FrameDecoder
+from stream_stats import StreamHealth
+
+# column layout of one sample as sent by the firmware
+FIELDS = (
+    'timestamp_ms', 'emg1', 'emg2',
+    'accel_x', 'accel_y', 'accel_z',
+    'gyro_x', 'gyro_y', 'gyro_z'
+)
+NUM_FIELDS = len(FIELDS)
+
+# column indices into a parsed block
+TIMESTAMP = 0
+EMG1 = 1
+EMG2 = 2
+ACCEL_X = 3
+ACCEL_Y = 4
+ACCEL_Z = 5
+GYRO_X = 6
+GYRO_Y = 7
+GYRO_Z = 8
+
+# blocks handed to the pipeline carry one extra column, the sample's device
+# timestamp mapped onto the host clock (seconds, see stream_stats)
+HOST_TIME = NUM_FIELDS
+NUM_COLUMNS = NUM_FIELDS + 1
+
+
+def empty_block():
+    return np.empty((0, NUM_FIELDS), dtype=np.float64)
+
+
+def parse_lines(data):
+    """Parse every complete line in data into an (n, 9) array.
+
+    Returns (block, remainder, comments) where remainder is the trailing
+    partial line to prepend to the next read and comments are the '#'
+    banner lines the firmware prints on boot.
+    """
+    end = data.rfind(b'\n')
+    if end < 0:
+        return empty_block(), data, []
+
+    remainder = data[end + 1:]
+    lines = data[:end].replace(b'\r', b'').split(b'\n')
+
+    comments = [line for line in lines if line.startswith(b'#')]
+    good = [line for line in lines if line.count(b',') == NUM_FIELDS - 1 and not line.startswith(b'#')]
+    if not good:
+        return empty_block(), remainder, comments
+
+    try:
+        # one conversion call for the whole batch
+        values = np.array(b','.join(good).split(b','), dtype=np.float64)
+        return values.reshape(-1, NUM_FIELDS), remainder, comments
+    except ValueError:
+        pass
+
+    # a corrupt field somewhere in the batch, fall back to line by line
+    rows = []
+    for line in good:
+        try:
+            rows.append(np.array(line.split(b','), dtype=np.float64))
+        except ValueError:
+            continue
+    if not rows:
+        return empty_block(), remainder, comments
+    return np.vstack(rows), remainder, comments
+
+
+def detect_format(data, min_samples=3):
+    """Guess whether raw bytes are csv lines or binary frames.
+
+    Returns 'csv', 'binary' or None if there isn't enough data to tell yet.
+    """
+    frames = len(FrameDecoder().decode(data))
+    lines = len(parse_lines(data)[0])
+
+    if frames >= min_samples and frames > lines:
+        return 'binary'
+    if lines >= min_samples:
+        return 'csv'
+    return None
+
+
+def with_host_time(block, health, host_time=None):
+    """Append the host-aligned time column to a parsed (n, 9) block"""
+    out = np.empty((len(block), NUM_COLUMNS), dtype=np.float64)
+    out[:, :NUM_FIELDS] = block
+    out[:, HOST_TIME] = health.update(block[:, TIMESTAMP], host_time)
+    return out
+
+
+class SerialBlockReader:
+    """Reads all available bytes from a serial port and returns sample blocks.
+
+    protocol is 'csv', 'binary' or 'auto' to detect it from the first bytes
+    the device sends. Blocks come back as (n, NUM_COLUMNS) arrays, the
+    firmware fields plus HOST_TIME, and `health` tracks loss, jitter and
+    clock drift from the device timestamps.
+    """
+
+    def __init__(self, serial_conn, protocol='auto', max_pending=4096, rate_hz=200):
+        self.serial_conn = serial_conn
+        self.protocol = protocol
+        self.max_pending = max_pending
+        self.pending = b''
+        self.decoder = FrameDecoder()
+        self.health = StreamHealth(rate_hz)
+        self.comments = []
+        self.samples_read = 0
+        self.bad_lines = 0
+
+    @property
+    def bad_frames(self):
+        return self.decoder.bad_frames
+
+    def reset(self):
+        """Drop any partial line or frame, e.g. after flushing the port"""
+        self.pending = b''
+        self.decoder.pending = b''
+
+    def read_available(self):
+        """Read every byte the port has buffered in one call.
+
+        If nothing is waiting this blocks for at most the port timeout so
+        callers can loop on it without sleeping.
+        """
+        waiting = self.serial_conn.in_waiting
+        if waiting:
+            return self.serial_conn.read(waiting)
+
+        chunk = self.serial_conn.read(1)
+        if chunk:
+            waiting = self.serial_conn.in_waiting
+            if waiting:
+                chunk += self.serial_conn.read(waiting)
+        return chunk
+
+    def read_block(self):
+        """Return all complete samples received so far as an (n, NUM_COLUMNS) array"""
+        chunk = self.read_available()
+        if not chunk:
+            return np.empty((0, NUM_COLUMNS))
+        host_time = time.time()
+
+        block = self.parse(chunk)
+        if len(block) == 0:
+            return np.empty((0, NUM_COLUMNS))
+        return with_host_time(block, self.health, host_time)
+
+    def parse(self, chunk):
+        """Parse a raw chunk into an (n, 9) block with the active protocol"""
+        if self.protocol == 'auto':
+            self.pending += chunk
+            detected = detect_format(self.pending)
+            if detected is None:
+                self.pending = self.pending[-self.max_pending:]
+                return empty_block()
+            self.protocol = detected
+            chunk, self.pending = self.pending, b''
+
+        if self.protocol == 'binary':
+            block = self.decoder.decode_block(chunk)
+            self.samples_read += len(block)
+            return block
+
+        data = self.pending + chunk
+        block, self.pending, comments = parse_lines(data)
+
+        # a stream with no newlines is not ours, don't let it grow forever
+        if len(self.pending) > self.max_pending:
+            self.pending = b''
+
+        if comments:
+            self.comments.extend(line.decode('utf-8', errors='ignore') for line in comments)
+
+        lines = data.count(b'\n')
+        self.bad_lines += lines - len(comments) - len(block)
+        self.samples_read += len(block)
+        return block
@@ -0,0 +1,204 @@
+"""
+Shared-memory sample ring for Ctrl-ARM
+One process (stream_daemon.py) owns the serial port and writes samples
+here; any number of local processes attach by name and read at their own
+pace without ever blocking the writer
+"""
+
+import os
+import time
+from multiprocessing import shared_memory
+
+import numpy as np
+
+from sensor_source import SensorSource
+from serial_ingest import NUM_COLUMNS, TIMESTAMP
+
+DEFAULT_NAME = 'ctrlarm_stream'
+MAGIC = 0x4354524C41524D31  # "CTRLARM1"
+
+# int64 header fields
+MAGIC_FIELD = 0
+CAPACITY_FIELD = 1
+CHANNELS_FIELD = 2
+TOTAL_FIELD = 3
+HEARTBEAT_FIELD = 4  # writer's time.time_ns() at its last push or beat
+PID_FIELD = 5
+RATE_FIELD = 6
+HEADER_FIELDS = 8
+
+
+class SharedRing:
+    """Single-writer, many-reader ring of samples in shared memory.
+
+    Every slot carries the monotonic index of the sample in it as an extra
+    column, written after the sample itself. `total` in the header is the
+    sequence counter, bumped once per block after its slots are written.
+    Readers copy the rows they want and keep only the ones whose stamp
+    matches the index they expected, so a row the writer overwrote or
+    hasn't finished is never returned. The writer never waits for anyone.
+    """
+
+    def __init__(self, name=DEFAULT_NAME, capacity=4096, channels=NUM_COLUMNS, create=False, rate_hz=200):
+        self.name = name
+        self.create = create
+        header_bytes = HEADER_FIELDS * 8
+
+        if create:
+            size = header_bytes + capacity * (channels + 1) * 8
+            try:
+                self.shm = shared_memory.SharedMemory(name=name, create=True, size=size)
+            except FileExistsError:
+                # left behind by a writer that crashed
+                stale = shared_memory.SharedMemory(name=name)
+                stale.close()
+                stale.unlink()
+                self.shm = shared_memory.SharedMemory(name=name, create=True, size=size)
+        else:
+            self.shm = shared_memory.SharedMemory(name=name)
+            untrack(self.shm)
+
+        self.header = np.ndarray((HEADER_FIELDS,), dtype=np.int64, buffer=self.shm.buf)
+        if create:
+            self.header[:] = 0
+            self.header[CAPACITY_FIELD] = capacity
+            self.header[CHANNELS_FIELD] = channels
+            self.header[PID_FIELD] = os.getpid()
+            self.header[RATE_FIELD] = rate_hz
+            self.header[MAGIC_FIELD] = MAGIC
+        elif self.header[MAGIC_FIELD] != MAGIC:
+            self.shm.close()
+            raise ValueError(f"shared memory '{name}' is not a Ctrl-ARM stream")
+
+        self.capacity = int(self.header[CAPACITY_FIELD])
+        self.channels = int(self.header[CHANNELS_FIELD])
+        self.rate_hz = int(self.header[RATE_FIELD])
+        self.slots = np.ndarray((self.capacity, self.channels + 1), dtype=np.float64,
+                                buffer=self.shm.buf, offset=header_bytes)
+        if create:
+            self.slots[:, -1] = -1
+
+    @property
+    def total(self):
+        return int(self.header[TOTAL_FIELD])
+
+    def push(self, block):
+        """Writer side: append an (n, channels) block, returns the new total"""
+        n = len(block)
+        total = self.total
+        if n:
+            if n > self.capacity:
+                total += n - self.capacity
+                block = block[-self.capacity:]
+                n = self.capacity
+            index = total + np.arange(n)
+            slots = index % self.capacity
+            self.slots[slots, -1] = -1
+            self.slots[slots, :-1] = block
+            self.slots[slots, -1] = index
+            self.header[TOTAL_FIELD] = total + n
+        self.beat()
+        return total + n
+
+    def beat(self):
+        self.header[HEARTBEAT_FIELD] = time.time_ns()
+
+    def writer_age(self):
+        """Seconds since the writer last pushed or beat"""
+        return (time.time_ns() - int(self.header[HEARTBEAT_FIELD])) / 1e9
+
+    def read_since(self, index):
+        """Reader side: copy of every sample from `index` on.
+
+        Returns (block, next_index, skipped) where skipped counts samples
+        that were overwritten before this reader got to them.
+        """
+        total = self.total
+        oldest = max(0, total - self.capacity)
+        skipped = max(0, oldest - index)
+        index = max(index, oldest)
+        if index >= total:
+            return np.empty((0, self.channels)), index, skipped
+
+        wanted = np.arange(index, total)
+        rows = self.slots[wanted % self.capacity]
+
+        # the writer may have lapped us while copying, it overwrites oldest
+        # first so everything up to the last foreign stamp is gone
+        bad = np.flatnonzero(rows[:, -1] != wanted)
+        if len(bad):
+            cut = int(bad[-1]) + 1
+            skipped += cut
+            index += cut
+            rows = rows[cut:]
+        return rows[:, :-1], index + len(rows), skipped
+
+    def close(self):
+        self.shm.close()
+        if self.create:
+            self.shm.unlink()
+
+
+def untrack(shm):
+    """Stop this process's resource tracker from unlinking a segment it only attached to"""
+    try:
+        from multiprocessing import resource_tracker
+        resource_tracker.unregister(shm._name, 'shared_memory')
+    except Exception:
+        pass
+
+
+class SharedStreamSource(SensorSource):
+    """Reads the stream published by stream_daemon.py.
+
+    Starts at the newest sample, like opening the port would. A reader
+    that falls more than the ring's capacity behind skips ahead and counts
+    what it missed; it never slows the daemon or the other readers.
+    """
+
+    def __init__(self, name=DEFAULT_NAME, timeout=0.1, poll=0.002, stale_after=2.0):
+        super().__init__(timeout)
+        self.ring_name = name
+        self.poll = poll
+        self.stale_after = stale_after
+        self.ring = None
+        self.index = 0
+        self.samples_read = 0
+        self.skipped = 0
+        self.name = f"shared stream '{name}'"
+
+    def open(self):
+        """Attach to the daemon's ring, raises FileNotFoundError if it isn't running"""
+        self.ring = SharedRing(self.ring_name)
+        self.rate_hz = self.ring.rate_hz
+        self.health.period_ms = 1000.0 / self.rate_hz
+        self.index = self.ring.total
+        self.is_open = True
+        return True
+
+    def read_block(self):
+        deadline = time.time() + self.timeout
+        while True:
+            block, self.index, skipped = self.ring.read_since(self.index)
+            if skipped:
+                self.skipped += skipped
+            if len(block) or time.time() >= deadline:
+                break
+            time.sleep(self.poll)
+
+        if len(block):
+            self.samples_read += len(block)
+            # host times come from the daemon, this only does the accounting
+            self.health.update(block[:, TIMESTAMP])
+        return block
+
+    def close(self):
+        if self.ring:
+            self.ring.close()
+        self.is_open = False
+
+    def report(self):
+        lines = [f"read {self.samples_read} samples, skipped {self.skipped} (reader fell behind)"]
+        if self.ring and self.ring.writer_age() > self.stale_after:
+            lines.append(f"daemon silent for {self.ring.writer_age():.0f}s")
+        return lines + self.health.report()
@@ -0,0 +1,65 @@
+#!/usr/bin/env python3
+"""
+Stream daemon for Ctrl-ARM
+Owns the sensor (only one process can open the serial port) and publishes
+every sample into a shared-memory ring, so emg_control, live_monitor and
+the data logger can all run at once with --shared
+"""
+
+import argparse
+import time
+
+from port_discovery import discover_device
+from sensor_source import SerialSource, add_source_arguments, source_from_args
+from shared_ring import SharedRing, DEFAULT_NAME
+
+
+def run_daemon(source, name=DEFAULT_NAME, capacity=4096, status_interval=10):
+    print(f"opening {source}...")
+    source.open()
+    ring = SharedRing(name, capacity=capacity, create=True, rate_hz=source.rate_hz)
+    print(f"publishing to shared memory '{name}' ({capacity} samples)")
+    print("press ctrl+c to stop")
+
+    last_status = time.time()
+    try:
+        while True:
+            # an empty read still refreshes the heartbeat readers watch
+            ring.push(source.read_block())
+
+            if time.time() - last_status > status_interval:
+                last_status = time.time()
+                print(f"\n{ring.total} samples published")
+                for line in source.report():
+                    print(f"  {line}")
+    except KeyboardInterrupt:
+        print("\nstopping...")
+    finally:
+        ring.close()
+        source.close()
+
+
+def main():
+    parser = argparse.ArgumentParser(description='Publish the sensor stream to shared memory')
+    parser.add_argument('--port', type=str, help='serial port, skips auto-detection')
+    parser.add_argument('--name', type=str, default=DEFAULT_NAME, help='shared memory name')
+    parser.add_argument('--capacity', type=int, default=4096, help='samples kept for slow readers')
+    add_source_arguments(parser)
+    args = parser.parse_args()
+
+    source = source_from_args(args)
+    if source is None:
+        conn = None
+        port = args.port
+        if not port:
+            port, conn = discover_device()
+        if not port:
+            print("no device found!")
+            return
+        source = SerialSource(port, serial_conn=conn)
+
+    run_daemon(source, args.name, args.capacity)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,200 @@
+"""
+Stream health accounting for Ctrl-ARM
+Uses the board's timestamp_ms to count lost and duplicate samples, measure
+inter-sample jitter and estimate device vs host clock offset and drift, so
+every sample can be placed on the host timeline
+"""
+
+import time
+from collections import deque
+
+import numpy as np
+
+
+class StreamHealth:
+    """Running counters and histograms for one device stream.
+
+    Feed it every block with update(); it returns the host-aligned time of
+    each sample in seconds. Offset is estimated from the smallest observed
+    host - device difference (transport delay only ever adds to it) and
+    drift from a least squares fit over per-second minima.
+    """
+
+    def __init__(self, rate_hz=200, gap_factor=1.5, fit_points=120, fit_tolerance_ms=5.0):
+        self.period_ms = 1000.0 / rate_hz
+        self.gap_factor = gap_factor
+        self.fit_tolerance_ms = fit_tolerance_ms
+
+        self.samples = 0
+        self.lost_samples = 0
+        self.gaps = 0
+        self.longest_gap_ms = 0.0
+        self.duplicates = 0
+        self.resets = 0
+        self.recent_gaps = deque(maxlen=20)  # (host time, gap ms)
+        self.outages = []  # (host time, seconds) the device was disconnected
+
+        # inter-sample deviation from the nominal period, 0.5 ms bins
+        self.jitter_edges = np.arange(-10.0, 10.5, 0.5)
+        self.jitter_hist = np.zeros(len(self.jitter_edges) - 1, dtype=np.int64)
+        self.jitter_sum = 0.0
+        self.jitter_sq_sum = 0.0
+        self.jitter_count = 0
+
+        self.last_device_ms = None
+        self.offset_ms = None
+        self.drift = 0.0  # host ms gained per device ms
+        self.fit = deque(maxlen=fit_points)
+        self.bucket_start = None
+        self.bucket_min = None
+
+    def reset_clock(self):
+        """Forget the clock model, e.g. after the board rebooted"""
+        self.last_device_ms = None
+        self.offset_ms = None
+        self.drift = 0.0
+        self.fit.clear()
+        self.bucket_start = None
+        self.bucket_min = None
+
+    def update(self, device_ms, host_time=None):
+        """Account for one block of device timestamps read at host_time.
+
+        Returns the host-aligned time of every sample in seconds.
+        """
+        device_ms = np.asarray(device_ms, dtype=np.float64)
+        if host_time is None:
+            host_time = time.time()
+        n = len(device_ms)
+        if n == 0:
+            return device_ms
+
+        if self.last_device_ms is not None and device_ms[0] < self.last_device_ms - 1000:
+            # timestamps jumped back by more than a second, the board restarted
+            self.resets += 1
+            self.reset_clock()
+
+        if self.last_device_ms is None:
+            deltas = np.diff(device_ms)
+        else:
+            deltas = np.diff(device_ms, prepend=self.last_device_ms)
+        self.last_device_ms = device_ms[-1]
+        self.samples += n
+
+        self.account_deltas(deltas, host_time)
+        self.update_clock(device_ms[-1], host_time * 1000.0)
+        return self.to_host(device_ms)
+
+    def account_deltas(self, deltas, host_time):
+        self.duplicates += int(np.count_nonzero(deltas <= 0))
+
+        gap_mask = deltas > self.gap_factor * self.period_ms
+        if np.any(gap_mask):
+            gaps = deltas[gap_mask]
+            self.gaps += len(gaps)
+            self.lost_samples += int(np.sum(np.round(gaps / self.period_ms) - 1))
+            self.longest_gap_ms = max(self.longest_gap_ms, float(gaps.max()))
+            for gap in gaps.tolist():
+                self.recent_gaps.append((host_time, gap))
+
+        normal = deltas[(deltas > 0) & ~gap_mask] - self.period_ms
+        if len(normal):
+            self.jitter_hist += np.histogram(np.clip(normal, -9.99, 9.99), bins=self.jitter_edges)[0]
+            self.jitter_sum += float(normal.sum())
+            self.jitter_sq_sum += float(np.dot(normal, normal))
+            self.jitter_count += len(normal)
+
+    def update_clock(self, device_ms, host_ms):
+        offset = host_ms - device_ms
+        if self.offset_ms is None:
+            self.offset_ms = offset
+
+        # keep the minimum offset seen in each second of device time
+        if self.bucket_start is None or device_ms - self.bucket_start >= 1000:
+            if self.bucket_min is not None:
+                self.fit.append(self.bucket_min)
+                self.refit()
+            self.bucket_start = device_ms
+            self.bucket_min = (device_ms, offset)
+        elif offset < self.bucket_min[1]:
+            self.bucket_min = (device_ms, offset)
+
+        if len(self.fit) < 2:
+            self.offset_ms = min(self.offset_ms, offset)
+
+    def refit(self):
+        if len(self.fit) < 2:
+            return
+        points = np.array(self.fit)
+        device, offset = points[:, 0], points[:, 1]
+        keep = np.ones(len(points), dtype=bool)
+        for _ in range(4):
+            device_mean = device[keep].mean()
+            spread = np.dot(device[keep] - device_mean, device[keep] - device_mean)
+            if spread <= 0:
+                return
+            drift = np.dot(device[keep] - device_mean, offset[keep] - offset[keep].mean()) / spread
+            intercept = offset[keep].mean() - drift * device_mean
+
+            # delay only ever adds, seconds well above the line were read late
+            # (e.g. a backlog flushed at once), fit again without them
+            residual = offset - (intercept + drift * device)
+            refined = residual <= np.median(residual[keep]) + self.fit_tolerance_ms
+            if refined.sum() < 2 or np.array_equal(refined, keep):
+                break
+            keep = refined
+
+        self.drift = float(drift)
+        self.offset_ms = float(intercept)
+
+    def to_host(self, device_ms):
+        """Map device timestamps (ms) to host time (s)"""
+        if self.offset_ms is None:
+            return np.full(len(device_ms), np.nan)
+        return (device_ms * (1.0 + self.drift) + self.offset_ms) / 1000.0
+
+    def record_outage(self, seconds, host_time=None):
+        """Note a disconnect, the gap in timestamps is counted separately"""
+        self.outages.append((time.time() if host_time is None else host_time, seconds))
+
+    def jitter_percentile(self, q):
+        if self.jitter_count == 0:
+            return 0.0
+        cumulative = np.cumsum(self.jitter_hist)
+        index = int(np.searchsorted(cumulative, q / 100.0 * cumulative[-1]))
+        return float(self.jitter_edges[min(index + 1, len(self.jitter_edges) - 1)])
+
+    def summary(self):
+        expected = self.samples + self.lost_samples
+        mean = self.jitter_sum / self.jitter_count if self.jitter_count else 0.0
+        var = self.jitter_sq_sum / self.jitter_count - mean ** 2 if self.jitter_count else 0.0
+        return {
+            'samples': self.samples,
+            'lost_samples': self.lost_samples,
+            'loss_percent': 100.0 * self.lost_samples / expected if expected else 0.0,
+            'gaps': self.gaps,
+            'longest_gap_ms': self.longest_gap_ms,
+            'duplicates': self.duplicates,
+            'resets': self.resets,
+            'jitter_std_ms': float(np.sqrt(max(var, 0.0))),
+            'jitter_p99_ms': self.jitter_percentile(99),
+            'drift_ppm': self.drift * 1e6,
+            'disconnects': len(self.outages),
+            'outage_s': sum(seconds for _, seconds in self.outages),
+        }
+
+    def report(self):
+        s = self.summary()
+        lines = [
+            f"samples: {s['samples']} (lost {s['lost_samples']}, {s['loss_percent']:.2f}%)",
+            f"gaps: {s['gaps']} (longest {s['longest_gap_ms']:.0f} ms), duplicates: {s['duplicates']}, resets: {s['resets']}",
+            f"jitter: std {s['jitter_std_ms']:.2f} ms, p99 under {s['jitter_p99_ms']:+.1f} ms",
+            f"clock drift: {s['drift_ppm']:+.0f} ppm",
+        ]
+        if self.outages:
+            longest = max(seconds for _, seconds in self.outages)
+            lines.append(f"disconnects: {s['disconnects']} (offline {s['outage_s']:.1f} s, longest {longest:.1f} s)")
+        for host_time, gap in list(self.recent_gaps)[-3:]:
+            stamp = time.strftime('%H:%M:%S', time.localtime(host_time))
+            lines.append(f"gap of {gap:.0f} ms at {stamp}")
+        return lines
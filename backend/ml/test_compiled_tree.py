@@ -0,0 +1,185 @@
+#!/usr/bin/env python3
+"""
+Compiled tree tests for Ctrl-ARM
+Checks that the tree with the scaler folded into its thresholds gives the
+same label as scaler.transform + sklearn predict on every window in data/raw,
+and that a Platt calibration only changes the probability it reports
+"""
+
+import math
+import os
+import pickle
+import sys
+import tempfile
+from pathlib import Path
+
+import numpy as np
+from sklearn.linear_model import LogisticRegression
+from sklearn.preprocessing import StandardScaler
+from sklearn.tree import DecisionTreeClassifier
+
+sys.path.append(os.path.dirname(os.path.abspath(__file__)))
+
+from model_artifact import compile_tree, load_artifact, platt_scale, ARTIFACT_PATH
+from train_model import load_dataset, export_artifact, export_pickle, dataset_digest, MODEL_PATH, DATA_DIR
+from select_model import runtime_classifier
+
+
+_dataset = []
+
+
+def dataset():
+    """Classic features and labels of every labelled window in data/raw, extracted once"""
+    if not _dataset:
+        X, y, _ = load_dataset(sorted(DATA_DIR.glob('*.csv')), use_cache=False)
+        _dataset.extend([X, y])
+    return _dataset
+
+
+def fitted(max_depth):
+    X, y = dataset()
+    scaler = StandardScaler().fit(X)
+    model = DecisionTreeClassifier(max_depth=max_depth, random_state=42).fit(scaler.transform(X), y)
+    return model, scaler
+
+
+def test_matches_sklearn_on_recordings():
+    X, _ = dataset()
+    for max_depth in (4, 12, None):
+        model, scaler = fitted(max_depth)
+        compiled = compile_tree(model, scaler)
+        expected = model.predict(scaler.transform(X))
+        assert np.array_equal(compiled.predict(X), expected), f"batch, depth {max_depth}"
+        one_by_one = [compiled.predict_one(row) for row in X.tolist()]
+        assert one_by_one == expected.tolist(), f"single rows, depth {max_depth}"
+
+
+def test_folded_thresholds_are_exact():
+    # the raw cut goes left and the next float up doesn't, same as sklearn's float32 compare
+    model, scaler = fitted(None)
+    compiled = compile_tree(model, scaler)
+    nodes = model.tree_
+    for node in np.flatnonzero(nodes.children_left != -1):
+        f = nodes.feature[node]
+        cut = compiled.threshold[node]
+        for value, left in ((cut, True), (np.nextafter(cut, np.inf), False)):
+            row = np.zeros((1, len(scaler.mean_)))
+            row[0, f] = value
+            scaled = np.float32(scaler.transform(row)[0, f])
+            assert (float(scaled) <= nodes.threshold[node]) == left, f"node {node} at {value!r}"
+
+
+def test_shipped_artifact():
+    X, _ = dataset()
+    tree, scaler, schema = load_artifact(ARTIFACT_PATH)
+    # trained on the recordings in data/raw, not exported from an older pickle
+    assert schema['training_data'] == dataset_digest(DATA_DIR.glob('*.csv'))
+    assert schema['hop'] < schema['window_size']
+    assert schema['calibration']['method'] == 'platt'
+    compiled = compile_tree(tree, scaler)
+    expected = tree.predict(scaler.transform(X))
+    assert np.array_equal(compiled.predict(X), expected)
+    assert [compiled.predict_one(row) for row in X[::7].tolist()] == expected[::7].tolist()
+
+
+def test_probabilities():
+    # leaf fractions by default, same as sklearn's predict_proba
+    X, _ = dataset()
+    model, scaler = fitted(8)
+    compiled = compile_tree(model, scaler)
+    expected = model.predict_proba(scaler.transform(X))
+    assert np.allclose(compiled.predict_proba(X), expected)
+    for row, proba in zip(X[::11].tolist(), expected[::11]):
+        label, probability = compiled.classify_one(row)
+        assert label == model.classes_[np.argmax(proba)] and math.isclose(probability, proba.max())
+
+
+def test_calibration():
+    X, _ = dataset()
+    model, scaler = fitted(8)
+    calibration = {'method': 'platt', 'slope': 2.0, 'intercept': -0.5}
+    compiled = compile_tree(model, scaler, calibration=calibration)
+    proba = model.predict_proba(scaler.transform(X))
+
+    # same labels as the uncalibrated tree, probabilities mapped and never 0 or 1
+    labels, probabilities = compiled.classify(X)
+    assert np.array_equal(labels, model.classes_[proba.argmax(axis=1)])
+    assert np.allclose(probabilities, platt_scale(proba.max(axis=1), calibration))
+    assert ((probabilities > 0) & (probabilities < 1)).all()
+    assert [compiled.classify_one(row) for row in X[::11].tolist()] == \
+        list(zip(labels[::11].tolist(), probabilities[::11].tolist()))
+    # a positive slope keeps the leaves in the same order of confidence
+    order = np.argsort(compiled.leaf_proba.max(axis=1), kind='stable')
+    assert np.all(np.diff(compiled.leaf_confidence[order]) >= 0)
+
+    # the artifact carries it to the controllers
+    with tempfile.TemporaryDirectory() as tmp:
+        path = Path(tmp) / 'model.npz'
+        assert export_artifact(model, scaler, path=path, calibration=calibration)
+        tree, array_scaler, schema = load_artifact(path)
+        assert schema['calibration'] == calibration
+        loaded = compile_tree(tree, array_scaler)
+        assert np.array_equal(loaded.classify(X)[1], probabilities)
+
+
+def test_export_pickle():
+    with open(MODEL_PATH, 'rb') as f:
+        data = pickle.load(f)
+    with tempfile.TemporaryDirectory() as tmp:
+        # the shipped pickle exports to the shipped artifact
+        path = Path(tmp) / 'model.npz'
+        assert export_pickle(MODEL_PATH, path)
+        _, _, exported = load_artifact(path)
+        _, _, shipped = load_artifact(ARTIFACT_PATH)
+        assert {k: v for k, v in exported.items() if k != 'created'} == \
+            {k: v for k, v in shipped.items() if k != 'created'}
+
+        # one that doesn't record how its windows were cut is refused
+        old = Path(tmp) / 'old.pkl'
+        with open(old, 'wb') as f:
+            pickle.dump({'model': data['model'], 'scaler': data['scaler']}, f)
+        assert not export_pickle(old, Path(tmp) / 'old.npz')
+        assert not (Path(tmp) / 'old.npz').exists()
+
+
+def test_selection_times_runtime_call():
+    # model selection times what the tree stage runs: the compiled tree, else predict_proba
+    X, y = dataset()
+    model, scaler = fitted(4)
+    rows = X[::13].tolist()
+    compiled = compile_tree(model, scaler)
+    assert [runtime_classifier(model, scaler)(row) for row in rows] == [compiled.classify_one(row) for row in rows]
+
+    X_scaled = scaler.transform(X)
+    logistic = LogisticRegression(max_iter=500).fit(X_scaled, y)
+    proba = logistic.predict_proba(X_scaled[::13])
+    classify = runtime_classifier(logistic, scaler)
+    for row, expected in zip(rows, proba):
+        label, probability = classify(row)
+        assert label == logistic.classes_[np.argmax(expected)] and math.isclose(probability, expected.max())
+
+
+def test_nan_raises():
+    model, scaler = fitted(4)
+    compiled = compile_tree(model, scaler)
+    row = [float('nan')] * model.n_features_in_
+    for predict in (compiled.predict_one, lambda r: compiled.predict([r])):
+        try:
+            predict(row)
+        except ValueError:
+            continue
+        raise AssertionError("NaN features were classified")
+
+
+def main():
+    tests = [test_matches_sklearn_on_recordings, test_folded_thresholds_are_exact,
+             test_shipped_artifact, test_export_pickle, test_probabilities, test_calibration,
+             test_selection_times_runtime_call, test_nan_raises]
+    for test in tests:
+        test()
+        print(f"ok  {test.__name__}")
+    print(f"\n{len(tests)} compiled tree tests passed")
+
+
+if __name__ == "__main__":
+    main()
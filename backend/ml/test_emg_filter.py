@@ -0,0 +1,76 @@
+#!/usr/bin/env python3
+"""
+EMG conditioning tests for Ctrl-ARM
+Streams the recordings in data/raw through the stateful filter chain in
+blocks and checks the envelope against sosfilt over the whole signal
+"""
+
+import os
+import sys
+
+import numpy as np
+from scipy import signal
+
+sys.path.append(os.path.dirname(os.path.abspath(__file__)))
+
+from emg_filter import EMGFilter, condition
+from train_model import load_recordings as recordings
+
+
+def whole_signal(chain, emg):
+    """The chain's filters run once over the whole recording with plain sosfilt"""
+    zi = signal.sosfilt_zi(chain.band_sos)[:, :, None] * emg[0]
+    band = signal.sosfilt(chain.band_sos, emg, axis=0, zi=zi)[0]
+    rectified = np.abs(band)
+    zi = signal.sosfilt_zi(chain.envelope_sos)[:, :, None] * rectified[0]
+    return signal.sosfilt(chain.envelope_sos, rectified, axis=0, zi=zi)[0]
+
+
+def in_blocks(chain, emg, rng):
+    """Envelope of emg fed through the chain in random block sizes, empty ones included"""
+    chain.reset()
+    blocks = []
+    start = 0
+    while start < len(emg):
+        size = int(rng.integers(0, 40))
+        blocks.append(chain.process(emg[start:start + size]))
+        start += size
+    return np.vstack(blocks)
+
+
+def test_blocks_match_whole_signal():
+    rng = np.random.default_rng(0)
+    for notch_hz in (50.0, 60.0):
+        chain = EMGFilter(notch_hz=notch_hz)
+        for name, emg in recordings():
+            reference = whole_signal(chain, emg)
+            assert np.array_equal(in_blocks(chain, emg, rng), reference), f"{name}, {notch_hz} Hz notch"
+            assert np.array_equal(condition(emg, notch_hz=notch_hz), reference), name
+
+
+def test_one_sample_at_a_time():
+    chain = EMGFilter()
+    _, emg = recordings()[0]
+    streamed = np.vstack([chain.process(emg[i:i + 1]) for i in range(len(emg))])
+    assert np.array_equal(streamed, whole_signal(chain, emg))
+
+
+def test_reset_starts_over():
+    chain = EMGFilter()
+    _, emg = recordings()[0]
+    first = chain.process(emg)
+    chain.process(emg[::-1])
+    chain.reset()
+    assert np.array_equal(chain.process(emg), first)
+
+
+def main():
+    tests = [test_blocks_match_whole_signal, test_one_sample_at_a_time, test_reset_starts_over]
+    for test in tests:
+        test()
+        print(f"ok  {test.__name__}")
+    print(f"\n{len(tests)} emg conditioning tests passed")
+
+
+if __name__ == "__main__":
+    main()
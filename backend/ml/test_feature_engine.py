@@ -0,0 +1,116 @@
+#!/usr/bin/env python3
+"""
+Feature engine tests for Ctrl-ARM
+Streams the recordings in data/raw through the incremental feature engine
+and checks every window against the from-scratch features
+"""
+
+import math
+import os
+import sys
+
+import numpy as np
+
+sys.path.append(os.path.dirname(os.path.abspath(__file__)))
+
+from feature_engine import IncrementalFeatures
+from feature_registry import window_features, extract, sliding_windows, set_window, feature_names, \
+    LazyExtractor, FEATURE_SETS, FEATURE_NAMES
+from train_model import load_recordings as recordings, DATA_DIR
+
+BASELINE = (30.0, 35.0)
+
+
+def assert_same(incremental, reference, where):
+    for name, a, b in zip(FEATURE_NAMES, incremental, reference):
+        if math.isnan(b):
+            assert math.isnan(a), f"{where}: {name} {a} != nan"
+        else:
+            assert math.isclose(a, b, rel_tol=1e-9, abs_tol=1e-9), f"{where}: {name} {a} != {b}"
+
+
+def check_stream(name, emg, window_size=15, every=15, resync_every=4096):
+    engine = IncrementalFeatures(window_size, resync_every=resync_every)
+    checked = 0
+    for end, (emg1, emg2) in enumerate(emg.tolist(), 1):
+        engine.add(emg1, emg2)
+        if end % every == 0 and engine.full:
+            window = emg[end - window_size:end]
+            reference = window_features(window[:, 0], window[:, 1], *BASELINE)
+            assert_same(engine.features(*BASELINE), reference, f"{name} sample {end}")
+            checked += 1
+    return checked
+
+
+def test_parity_on_recordings():
+    # the windows the controllers classify, across every recording
+    files = checked = 0
+    with np.errstate(invalid='ignore', divide='ignore'):
+        for name, emg in recordings():
+            checked += check_stream(name, emg)
+            files += 1
+    assert files > 0, f"no recordings in {DATA_DIR}"
+    assert checked > 0
+
+
+def test_parity_every_sample():
+    # classifying on every sample, with drift correction kicking in often
+    with np.errstate(invalid='ignore', divide='ignore'):
+        for i, (name, emg) in enumerate(recordings()):
+            if i % 40 == 0:
+                check_stream(name, emg, every=1, resync_every=97)
+
+
+def test_non_integer_input():
+    rng = np.random.default_rng(0)
+    emg = 500 + rng.normal(0, 80, size=(20000, 2)).cumsum(axis=0) * 0.01
+    check_stream('random walk', emg, window_size=40, every=7, resync_every=1000)
+
+
+def test_flat_window():
+    engine = IncrementalFeatures(5)
+    for i in range(5):
+        engine.add(100.0, 120.0 + i)
+    features = engine.features()
+    assert math.isnan(features[FEATURE_NAMES.index('correlation')])
+    assert features[FEATURE_NAMES.index('left_std')] == 0
+    assert features[FEATURE_NAMES.index('left_ptp')] == 0
+
+
+def test_mav_ignores_offset():
+    # mav measures activity around the window mean, not the adc level it sits at
+    mav = [feature_names('time_domain').index(f"{side}_mav") for side in ('left', 'right')]
+    flat = np.full((1, 15, 2), 500.0)
+    assert np.allclose(extract(flat, 'time_domain')[0, mav], 0.0)
+
+    wave = 500.0 + 10.0 * np.where(np.arange(16) % 2, 1.0, -1.0)[None, :, None] * np.ones((1, 1, 2))
+    assert np.allclose(extract(wave, 'time_domain')[0, mav], 10.0)
+    assert np.allclose(extract(wave + 1000.0, 'time_domain')[0, mav], 10.0)
+
+
+def test_lazy_extractor():
+    # the columns a model reads match extract() exactly, the rest are left nan
+    rng = np.random.default_rng(0)
+    for feature_set in FEATURE_SETS:
+        size = set_window(feature_set)
+        windows = np.concatenate([sliding_windows(emg, size, 97) for _, emg in recordings()[::10]])
+        with np.errstate(invalid='ignore', divide='ignore'):
+            full = extract(windows, feature_set, BASELINE)
+            for _ in range(5):
+                used = rng.random(full.shape[1]) < 0.3
+                lazy = LazyExtractor(feature_set, used).extract(windows, BASELINE)
+                assert np.array_equal(lazy[:, used], full[:, used], equal_nan=True), feature_set
+                assert np.isnan(lazy[:, ~used]).all(), feature_set
+
+
+def main():
+    tests = [test_parity_on_recordings, test_parity_every_sample,
+             test_non_integer_input, test_flat_window, test_mav_ignores_offset, test_lazy_extractor]
+    for test in tests:
+        test()
+        print(f"ok  {test.__name__}")
+    print(f"\n{len(tests)} feature engine tests passed")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,185 @@
+#!/usr/bin/env python3
+"""
+Gesture cascade tests for Ctrl-ARM
+Checks that a window goes on to the next stage when a stage abstains or
+can't run, ends as rest when the stages it went on to abstain too, and
+keeps the abstaining stage's label when no later stage can run. Also
+checks that windowing survives the reader overrunning the ring buffer
+"""
+
+import os
+import sys
+import threading
+import time
+
+import numpy as np
+
+sys.path.append(os.path.dirname(os.path.abspath(__file__)))
+
+from gesture_cascade import GestureCascade, CascadeStages
+from ring_buffer import RingBuffer
+from feature_engine import IncrementalFeatures
+from serial_ingest import NUM_COLUMNS
+
+
+def stage(result):
+    def run(context):
+        return result
+    return run
+
+
+def failing(context):
+    raise ValueError("feature out of range")
+
+
+def test_first_confident_stage_answers():
+    cascade = GestureCascade([('threshold', stage(('left_hard', 1.0))),
+                              ('tree', stage(('rest', 0.9)))])
+    assert cascade.run(None) == 'left_hard'
+    assert cascade.stats['threshold'].hits == 1
+    assert cascade.stats['tree'].calls == 0
+
+
+def test_abstain_escalates():
+    cascade = GestureCascade([('threshold', stage(('both_flex', 0.5))),
+                              ('personal', stage(None)),
+                              ('tree', stage(('left_hard', 0.4)))])
+    assert cascade.run(None) == 'rest'
+    assert cascade.stats['threshold'].abstains == 1 and cascade.stats['tree'].abstains == 1
+    assert cascade.stats['personal'].skips == 1
+    assert cascade.fallbacks == 1
+
+    # lowering the threshold stage's bar lets it answer the same window
+    cascade = GestureCascade([('threshold', stage(('both_flex', 0.5))),
+                              ('tree', stage(('left_hard', 0.4)))], abstain={'threshold': 0.5})
+    assert cascade.run(None) == 'both_flex'
+
+
+def test_no_later_stage_keeps_label():
+    # thresholds only, or models that can't run: the abstaining stage's answer stands
+    cascade = GestureCascade([('threshold', stage(('both_flex', 0.5))),
+                              ('personal', stage(None)),
+                              ('tree', failing)])
+    assert cascade.run(None) == 'both_flex'
+    assert cascade.stats['threshold'].hits == 1 and cascade.stats['threshold'].abstains == 0
+    assert cascade.stats['personal'].skips == 1 and cascade.stats['tree'].skips == 1
+    assert cascade.fallbacks == 0
+
+
+def test_from_config():
+    functions = {'threshold': stage(('rest', 1.0)), 'tree': stage(('left_hard', 0.7))}
+    cascade = GestureCascade.from_config(functions, {'stages': ['tree', 'threshold'], 'abstain': {'tree': 0.8}})
+    assert [name for name, _, _ in cascade.stages] == ['tree', 'threshold']
+    assert cascade.abstain_below('tree') == 0.8
+    assert cascade.run(None) == 'rest'
+    assert cascade.stats['tree'].abstains == 1 and cascade.stats['threshold'].hits == 1
+    assert len(cascade.report()) == 4
+
+    try:
+        GestureCascade.from_config(functions, {'stages': ['threshold', 'svm']})
+    except ValueError:
+        return
+    raise AssertionError("an unknown stage was accepted")
+
+
+class RacingBuffer(RingBuffer):
+    """Ring buffer whose reader pushes a buffer's worth of samples right before the given window() call"""
+
+    def __init__(self, capacity, race_on):
+        super().__init__(capacity, NUM_COLUMNS)
+        self.race_on = race_on
+        self.calls = 0
+
+    def window(self, length, end=None):
+        self.calls += 1
+        if self.calls == self.race_on:
+            push(self, self.capacity)
+        return super().window(length, end)
+
+
+def push(samples, count):
+    rng = np.random.default_rng(samples.total)
+    return samples.push(rng.normal(100, 20, (count, NUM_COLUMNS)))
+
+
+class Controller(CascadeStages):
+    """Just what collect_windows reads off a controller"""
+
+    def __init__(self, samples):
+        self.samples = samples
+        self.features = IncrementalFeatures(15)
+        self.process_interval = 15
+        self.model_window = 15
+        self.baseline_left = self.baseline_right = 30.0
+        self.skipped_windows = 0
+
+
+def test_overrun_while_collecting():
+    # a buffer behind before collecting starts
+    controller = Controller(RingBuffer(64, NUM_COLUMNS))
+    total = push(controller.samples, 200)
+    assert len(controller.collect_windows(0, total)) == 3
+    assert controller.skipped_windows == 136 // 15
+
+    # overwritten between reading the oldest sample and copying the batch out
+    controller = Controller(RacingBuffer(64, race_on=1))
+    total = push(controller.samples, 60)
+    assert controller.collect_windows(0, total) == []
+    assert controller.skipped_windows == 60 // 15 and controller.features.count == 0
+
+    # overwritten before the second window is copied out, the ones after it are gone too
+    controller = Controller(RacingBuffer(64, race_on=3))
+    total = push(controller.samples, 60)
+    pending = controller.collect_windows(0, total)
+    assert len(pending) == 1 and controller.skipped_windows == 3
+
+    # and it carries on from what is still in the buffer: 124 + 30 pushed, samples
+    # from 90 held, windows end at 105, 120, 135 and 150, the ones at 75 and 90 are gone
+    more = push(controller.samples, 30)
+    assert more == 154
+    assert len(controller.collect_windows(total, more)) == 4
+    assert controller.skipped_windows == 3 + 2
+
+
+def test_overrun_keeps_thread_running():
+    # the reader outruns a consumer that takes its time over every batch
+    controller = Controller(RingBuffer(64, NUM_COLUMNS))
+    errors, windows = [], []
+    running = True
+
+    def consume():
+        processed = controller.samples.total
+        try:
+            while running:
+                total = controller.samples.wait(processed, timeout=0.1)
+                windows.extend(controller.collect_windows(processed, total))
+                processed = total
+                time.sleep(0.002)
+        except Exception as e:
+            errors.append(e)
+
+    consumer = threading.Thread(target=consume)
+    consumer.start()
+    deadline = time.time() + 0.5
+    while time.time() < deadline:
+        push(controller.samples, 50)
+    time.sleep(0.05)
+    alive = consumer.is_alive()
+    running = False
+    consumer.join()
+
+    assert alive and not errors, errors
+    assert controller.skipped_windows > 0 and windows
+
+
+def main():
+    tests = [test_first_confident_stage_answers, test_abstain_escalates, test_no_later_stage_keeps_label,
+             test_from_config, test_overrun_while_collecting, test_overrun_keeps_thread_running]
+    for test in tests:
+        test()
+        print(f"ok  {test.__name__}")
+    print(f"\n{len(tests)} gesture cascade tests passed")
+
+
+if __name__ == "__main__":
+    main()
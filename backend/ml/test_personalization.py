@@ -0,0 +1,134 @@
+#!/usr/bin/env python3
+"""
+Personalization tests for Ctrl-ARM
+Teaches the online gesture model synthetic feature vectors and checks what
+it predicts, that a checkpoint restores it, that old windows fade out past
+its memory, and that controller feedback reaches it
+"""
+
+import os
+import sys
+import tempfile
+from pathlib import Path
+
+import numpy as np
+
+sys.path.append(os.path.dirname(os.path.abspath(__file__)))
+
+from personalization import OnlineGestureModel
+from gesture_cascade import CascadeStages
+from feature_registry import feature_names, CLASSIC
+from serial_ingest import NUM_COLUMNS, EMG1, EMG2
+
+NAMES = [f"f{i}" for i in range(4)]
+CENTERS = {'left_flex': np.array([5.0, 0.0, 1.0, 0.0]), 'right_flex': np.array([0.0, 5.0, 0.0, 1.0])}
+
+
+def taught(samples=20, seed=0, **settings):
+    rng = np.random.default_rng(seed)
+    model = OnlineGestureModel(NAMES, **settings)
+    for _ in range(samples):
+        for label, center in CENTERS.items():
+            model.update(center + rng.normal(0, 0.5, len(NAMES)), label)
+    return model
+
+
+def test_update_then_predict():
+    model = OnlineGestureModel(NAMES, min_samples=5)
+    assert not model.ready and model.predict(CENTERS['left_flex']) == (None, 0.0)
+    assert not model.update([np.nan, 0, 0, 0], 'left_flex')
+
+    model = taught()
+    assert model.ready and model.updates == 2 * 20
+    for label, center in CENTERS.items():
+        predicted, posterior = model.predict(center)
+        assert predicted == label and posterior > 0.99
+
+    # halfway between the classes it isn't sure, and says so below its confidence
+    middle = (CENTERS['left_flex'] + CENTERS['right_flex']) / 2
+    label, posterior = model.predict(middle)
+    assert label is None and posterior < model.confidence
+    assert model.predict(middle, confidence=0.0)[0] in CENTERS
+
+
+def test_checkpoint_round_trip():
+    model = taught()
+    with tempfile.TemporaryDirectory() as tmp:
+        path = Path(tmp) / 'personal_model.npz'
+        model.save(path)
+        assert not model.dirty
+
+        restored = OnlineGestureModel(NAMES)
+        assert restored.load(path)
+        assert restored.labels == model.labels and restored.updates == model.updates
+        assert np.array_equal(restored.means, model.means)
+        assert np.array_equal(restored.variances, model.variances)
+        rows = np.random.default_rng(1).normal(2.5, 3.0, (50, len(NAMES)))
+        assert [restored.predict(row) for row in rows] == [model.predict(row) for row in rows]
+
+        # a checkpoint for other features is ignored, as is a missing one
+        assert not OnlineGestureModel(NAMES[:3]).load(path)
+        assert not OnlineGestureModel(NAMES).load(Path(tmp) / 'missing.npz')
+
+
+def test_forgets_past_memory():
+    # the electrodes moved, left_flex now shows up at a new place
+    model = taught(samples=10, memory=10)
+    moved = CENTERS['left_flex'] + 3.0
+    for _ in range(50):
+        model.update(moved, 'left_flex')
+
+    k = model.labels.index('left_flex')
+    # a plain running mean would still be 50/60 of the way there
+    assert np.allclose(model.means[k], moved, atol=0.05)
+    assert model.counts[k] == 60
+    assert model.predict(moved)[0] == 'left_flex'
+
+    # with a long memory the old placement still pulls the mean back
+    patient = taught(samples=10, memory=1000)
+    for _ in range(50):
+        patient.update(moved, 'left_flex')
+    assert not np.allclose(patient.means[patient.labels.index('left_flex')], moved, atol=0.3)
+
+
+class Controller(CascadeStages):
+    """Just what the feedback path reads off a controller"""
+
+    def __init__(self):
+        self.feature_set = CLASSIC
+        self.baseline_left = self.baseline_right = 30.0
+        self.decision_tree = None
+        self.personal = OnlineGestureModel(feature_names(CLASSIC))
+        self.last_detection = None
+
+
+def test_feedback_from_controller():
+    controller = Controller()
+    assert controller.learn_from_feedback('confirm') is None
+
+    window = np.zeros((15, NUM_COLUMNS))
+    window[:, [EMG1, EMG2]] = np.random.default_rng(0).normal(200, 20, (15, 2))
+    controller.last_detection = ('both_flex', window)
+    # a typo doesn't become a gesture class
+    assert controller.learn_from_feedback('correct', 'bothflex') is None
+    assert controller.learn_from_feedback('correct', 'left_flex') == 'left_flex'
+    assert controller.personal.labels == ['left_flex'] and controller.last_detection is None
+
+    # each detection is learned from once
+    assert controller.learn_from_feedback('confirm') is None
+    controller.last_detection = ('both_flex', window)
+    assert controller.learn_from_feedback('confirm') == 'both_flex'
+    assert controller.personal.updates == 2
+
+
+def main():
+    tests = [test_update_then_predict, test_checkpoint_round_trip, test_forgets_past_memory,
+             test_feedback_from_controller]
+    for test in tests:
+        test()
+        print(f"ok  {test.__name__}")
+    print(f"\n{len(tests)} personalization tests passed")
+
+
+if __name__ == "__main__":
+    main()
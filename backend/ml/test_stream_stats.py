@@ -0,0 +1,99 @@
+#!/usr/bin/env python3
+"""
+Stream health tests for Ctrl-ARM
+Feeds synthetic device timestamps with known drops, duplicates, jitter and
+clock skew through StreamHealth and checks what it reports
+"""
+
+import os
+import sys
+
+import numpy as np
+
+sys.path.append(os.path.dirname(os.path.abspath(__file__)))
+
+from stream_stats import StreamHealth
+
+RATE_HZ = 200
+PERIOD_MS = 1000.0 / RATE_HZ
+
+
+def device_clock(seconds, jitter_ms=0.0):
+    """Nominal 200 Hz timestamps, odd samples late and even ones early by jitter_ms / 2"""
+    k = np.arange(int(seconds * RATE_HZ))
+    return k * PERIOD_MS + np.where(k % 2, jitter_ms / 2, -jitter_ms / 2)
+
+
+def feed(health, device_ms, drift_ppm=0.0, offset_ms=5000.0, block=20, seed=0):
+    """Read the stream in blocks, each arriving 1-4 ms after its last sample on a skewed host clock"""
+    rng = np.random.default_rng(seed)
+    aligned = []
+    for start in range(0, len(device_ms), block):
+        chunk = device_ms[start:start + block]
+        host_ms = chunk[-1] * (1 + drift_ppm * 1e-6) + offset_ms + rng.uniform(1.0, 4.0)
+        aligned.append(health.update(chunk, host_ms / 1000.0))
+    return np.concatenate(aligned)
+
+
+def test_gaps_and_duplicates():
+    device_ms = device_clock(30)
+    # a 3 sample hole, a 1 sample hole and a 40 sample (200 ms) hole
+    dropped = np.r_[1000:1003, 2500, 4000:4040]
+    device_ms = np.delete(device_ms, dropped)
+    # two samples sent twice
+    device_ms = np.insert(device_ms, [3000, 5000], device_ms[[2999, 4999]])
+
+    health = StreamHealth(RATE_HZ)
+    feed(health, device_ms)
+    s = health.summary()
+    assert s['samples'] == len(device_ms)
+    assert s['lost_samples'] == len(dropped)
+    assert s['gaps'] == 3
+    assert s['longest_gap_ms'] == 41 * PERIOD_MS
+    assert s['duplicates'] == 2
+    assert s['resets'] == 0
+
+
+def test_jitter():
+    health = StreamHealth(RATE_HZ)
+    feed(health, device_clock(10, jitter_ms=1.0))
+    s = health.summary()
+    # every interval is 1 ms off the nominal period
+    assert abs(s['jitter_std_ms'] - 1.0) < 1e-3
+    assert s['jitter_p99_ms'] <= 1.5
+    assert s['lost_samples'] == 0 and s['duplicates'] == 0
+
+
+def test_drift_and_alignment():
+    drift_ppm = 300.0
+    device_ms = device_clock(120)
+    health = StreamHealth(RATE_HZ)
+    aligned = feed(health, device_ms, drift_ppm)
+    assert abs(health.summary()['drift_ppm'] - drift_ppm) < 20
+
+    # once the fit has settled, samples land within a few ms of when they were taken on the host clock
+    true_host = (device_ms * (1 + drift_ppm * 1e-6) + 5000.0) / 1000.0
+    late = slice(len(device_ms) // 2, None)
+    assert np.abs(aligned[late] - true_host[late]).max() < 0.005
+
+
+def test_reset():
+    health = StreamHealth(RATE_HZ)
+    feed(health, device_clock(5) + 60000.0)
+    # the board restarted, its clock begins at zero again
+    feed(health, device_clock(5), offset_ms=70000.0)
+    s = health.summary()
+    assert s['resets'] == 1
+    assert s['lost_samples'] == 0 and s['duplicates'] == 0
+
+
+def main():
+    tests = [test_gaps_and_duplicates, test_jitter, test_drift_and_alignment, test_reset]
+    for test in tests:
+        test()
+        print(f"ok  {test.__name__}")
+    print(f"\n{len(tests)} stream health tests passed")
+
+
+if __name__ == "__main__":
+    main()
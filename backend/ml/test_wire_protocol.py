@@ -0,0 +1,120 @@
+#!/usr/bin/env python3
+"""
+Wire protocol tests for Ctrl-ARM
+Feeds synthetic byte streams through the binary frame decoder and the
+auto-detecting serial reader
+"""
+
+import os
+import sys
+
+import numpy as np
+
+sys.path.append(os.path.dirname(os.path.abspath(__file__)))
+
+from wire_protocol import FrameDecoder, encode_frames, FRAME_SIZE
+from serial_ingest import SerialBlockReader, detect_format
+
+
+def make_block(n, seed=0):
+    rng = np.random.default_rng(seed)
+    block = np.zeros((n, 9))
+    block[:, 0] = 1000 + 5 * np.arange(n)
+    block[:, 1:3] = rng.integers(0, 1024, size=(n, 2))
+    block[:, 3:6] = np.round(rng.uniform(-2, 2, size=(n, 3)), 3)
+    block[:, 6:9] = np.round(rng.uniform(-500, 500, size=(n, 3)), 1)
+    return block
+
+
+def to_csv(block):
+    lines = [f"{int(r[0])},{int(r[1])},{int(r[2])}," + ",".join(f"{v:.3f}" for v in r[3:]) for r in block]
+    return ("\r\n".join(lines) + "\r\n").encode()
+
+
+class FakeSerial:
+    """Hands out a byte stream in fixed size chunks like a serial port"""
+
+    def __init__(self, data, chunk=64):
+        self.chunks = [data[i:i + chunk] for i in range(0, len(data), chunk)]
+        self.buffer = b''
+
+    def refill(self):
+        if not self.buffer and self.chunks:
+            self.buffer = self.chunks.pop(0)
+
+    @property
+    def in_waiting(self):
+        self.refill()
+        return len(self.buffer)
+
+    def read(self, n):
+        self.refill()
+        out, self.buffer = self.buffer[:n], self.buffer[n:]
+        return out
+
+
+def test_roundtrip():
+    block = make_block(200)
+    decoded = FrameDecoder().decode_block(encode_frames(block))
+    assert decoded.shape == (200, 9)
+    assert np.allclose(decoded, block, atol=1e-9)
+
+
+def test_split_across_reads():
+    block = make_block(50)
+    data = encode_frames(block)
+    decoder = FrameDecoder()
+    parts = [decoder.decode_block(data[i:i + 7]) for i in range(0, len(data), 7)]
+    assert np.allclose(np.vstack(parts), block)
+    assert decoder.bad_frames == 0
+
+
+def test_resync_after_corruption():
+    block = make_block(100)
+    data = bytearray(encode_frames(block))
+    data[10 * FRAME_SIZE + 8] ^= 0xFF               # flip a payload byte in frame 10
+    del data[40 * FRAME_SIZE + 3:40 * FRAME_SIZE + 9]  # drop bytes from frame 40
+    data = b'# Starting XIAO\r\n' + bytes(data)
+
+    decoder = FrameDecoder()
+    decoded = decoder.decode_block(data)
+    expected = np.delete(block, [10, 40], axis=0)
+
+    assert np.allclose(decoded, expected)
+    assert decoder.bad_frames == 2
+    assert decoder.skipped_bytes > 0
+
+
+def test_detect_format():
+    block = make_block(10)
+    assert detect_format(encode_frames(block)) == 'binary'
+    assert detect_format(b'# format: csv\r\n' + to_csv(block)) == 'csv'
+    assert detect_format(b'# Starting XIAO\r\n') is None
+
+
+def test_reader_auto_detects_both_formats():
+    block = make_block(300)
+    for data in (encode_frames(block), b'# Starting XIAO\r\n' + to_csv(block)):
+        reader = SerialBlockReader(FakeSerial(data))
+        blocks = []
+        while True:
+            got = reader.read_block()
+            if not len(got) and not reader.serial_conn.in_waiting:
+                break
+            blocks.append(got)
+        received = np.vstack(blocks)
+        assert np.allclose(received[:, :9], block, atol=1e-9)
+        assert reader.health.lost_samples == 0
+
+
+def main():
+    tests = [test_roundtrip, test_split_across_reads, test_resync_after_corruption,
+             test_detect_format, test_reader_auto_detects_both_formats]
+    for test in tests:
+        test()
+        print(f"ok  {test.__name__}")
+    print(f"\n{len(tests)} wire protocol tests passed")
+
+
+if __name__ == "__main__":
+    main()
@@ -2,13 +2,35 @@ import pandas as pd
 import numpy as np
 from pathlib import Path
 from sklearn.tree import DecisionTreeClassifier
+from sklearn.linear_model import LogisticRegression
 from sklearn.preprocessing import StandardScaler
-from sklearn.model_selection import train_test_split
+from sklearn.model_selection import GroupShuffleSplit
 from sklearn.metrics import accuracy_score, classification_report
 import pickle
+import argparse
+import hashlib
+import time
+from concurrent.futures import ProcessPoolExecutor, as_completed
+from functools import lru_cache
 
-def extract_features(filepath):
-    # extract features from a csv file
+from feature_cache import FeatureCache, file_digest
+from emg_filter import condition, add_conditioning_arguments, conditioning_from_args
+from feature_registry import (feature_names, feature_set_version, extract, sliding_windows, set_window,
+                              FEATURE_SETS, FEATURES_VERSION, DEFAULT_FEATURE_SET, DEFAULT_WINDOW)
+from model_artifact import save_artifact, split_features, leaf_fractions, logit, platt_scale, ARTIFACT_PATH
+
+MODEL_PATH = Path(__file__).parent / "emg_model.pkl"
+DATA_DIR = Path(__file__).parent.parent.parent / "data" / "raw"
+
+# windows as long as the controllers' window_size. training steps through
+# them faster than the controllers' process_interval of 15, overlapping
+# windows give ~5x the examples of one recording
+WINDOW_SIZE = DEFAULT_WINDOW
+HOP = 3
+
+def extract_features(filepath, conditioning=None, feature_set=DEFAULT_FEATURE_SET,
+                     window_size=WINDOW_SIZE, hop=HOP):
+    # feature matrix, one row per window of the csv file
     try:
         df = pd.read_csv(filepath)
         
@@ -18,37 +40,34 @@ def extract_features(filepath):
         if len(emg_cols) < 2:
             return None
         
-        emg1_data = df[emg_cols[0]].values
-        emg2_data = df[emg_cols[1]].values
+        emg = df[emg_cols[:2]].values.astype(np.float64)
+
+        # same chain the controllers run live, over the whole recording
+        if conditioning:
+            emg = condition(emg, **conditioning)
         
         # use middle portion for features
-        start = int(len(emg1_data) * 0.2)
-        end = int(len(emg1_data) * 0.8)
-        emg1 = emg1_data[start:end]
-        emg2 = emg2_data[start:end]
+        start = int(len(emg) * 0.2)
+        end = int(len(emg) * 0.8)
         
         # calculate baseline from first 20%
-        baseline1 = np.mean(emg1_data[:start])
-        baseline2 = np.mean(emg2_data[:start])
-        
-        # extract features
-        features = [
-            np.mean(emg1),                    # mean
-            np.std(emg1),                     # std
-            np.max(emg1),                     # max
-            np.max(emg1) - np.min(emg1),      # peak to peak
-            np.sqrt(np.mean(emg1**2)),        # rms
-            np.mean(emg2),
-            np.std(emg2),
-            np.max(emg2),
-            np.max(emg2) - np.min(emg2),
-            np.sqrt(np.mean(emg2**2)),
-            np.corrcoef(emg1, emg2)[0, 1] if len(emg1) > 1 else 0,  # correlation
-            np.mean(emg1) - baseline1,        # activity left
-            np.mean(emg2) - baseline2         # activity right
-        ]
-        
-        return features
+        baseline = emg[:start].mean(axis=0)
+
+        # every window of the middle portion at once, spectral sets need longer ones
+        size = set_window(feature_set, window_size)
+        windows = sliding_windows(emg[start:end], size, hop)
+        if len(windows) == 0:
+            return None
+
+        # drop windows that span a pause in the recording
+        if 'timestamp_ms' in df.columns:
+            steps = np.diff(df['timestamp_ms'].values[start:end].astype(np.float64))
+            paused = steps > 4 * np.median(steps)
+            if paused.any():
+                spans_pause = sliding_windows(paused[:, None], size - 1, hop)[:, :, 0].any(axis=1)
+                windows = windows[~spans_pause[:len(windows)]]
+
+        return extract(windows, feature_set, baseline)
         
     except Exception as e:
         print(f"error processing {filepath}: {e}")
@@ -80,65 +99,242 @@ def get_label(filename):
     else:
         return None
 
-def train():
+@lru_cache(maxsize=4)
+def load_recordings(data_dir=DATA_DIR):
+    # (file name, emg1/emg2 samples) of every non-empty csv, read once per process
+    recordings = []
+    for path in sorted(Path(data_dir).glob('*.csv')):
+        emg = np.loadtxt(path, delimiter=',', skiprows=1, usecols=(1, 2), ndmin=2)
+        if len(emg):
+            recordings.append((path.name, emg))
+    return tuple(recordings)
+
+def load_dataset(csv_files, conditioning=None, feature_set=DEFAULT_FEATURE_SET, use_cache=True, jobs=None,
+                 hop=HOP):
+    # window features of every labelled file, each window keeps its file as its group.
+    # cached files are read back, the rest are extracted on a process pool
+    started = time.time()
+    cache = FeatureCache({
+        'features': feature_set_version(feature_set),
+        'window_size': set_window(feature_set, WINDOW_SIZE),
+        'hop': hop,
+        'conditioning': conditioning
+    })
+
+    labelled = [(path, get_label(path.stem)) for path in csv_files]
+    labelled = [(path, label) for path, label in labelled if label is not None]
+
+    results = {}
+    pending = {}
+    for i, (path, label) in enumerate(labelled):
+        key = cache.key(path) if use_cache else None
+        features = cache.load(key) if use_cache else None
+        if features is None:
+            pending[i] = key
+        else:
+            results[i] = features
+
+    if pending:
+        print(f"\nprocessing {len(pending)} files...")
+        with ProcessPoolExecutor(max_workers=jobs) as pool:
+            futures = {pool.submit(extract_features, labelled[i][0], conditioning, feature_set, hop=hop): i
+                       for i in pending}
+            for done, future in enumerate(as_completed(futures), 1):
+                i = futures[future]
+                features = future.result()
+                # unreadable files are cached too, as no windows
+                results[i] = features if features is not None else np.empty((0, 0))
+                if use_cache:
+                    cache.save(pending[i], results[i])
+                if done % 20 == 0:
+                    print(f"  processed {done}/{len(pending)} files")
+
+    if use_cache:
+        print(f"\nfeature cache: {cache.hits}/{len(labelled)} files cached ({cache.hit_rate():.0%} hit rate)")
+    print(f"features ready in {time.time() - started:.1f}s")
+
+    X, y, groups = [], [], []
+    for i, (path, label) in enumerate(labelled):
+        features = results[i]
+        if len(features):
+            X.append(features)
+            y.append(np.full(len(features), label))
+            groups.append(np.full(len(features), i))
+    if not X:
+        return np.empty((0, 0)), np.empty(0, dtype=str), np.empty(0, dtype=int)
+    return np.vstack(X), np.concatenate(y), np.concatenate(groups)
+
+def save_model(model, scaler, conditioning=None, feature_set=DEFAULT_FEATURE_SET, path=MODEL_PATH, hop=HOP,
+               **extra):
+    # everything the controllers need to rebuild the features the model was trained on
+    with open(path, 'wb') as f:
+        pickle.dump({
+            'model': model,
+            'scaler': scaler,
+            'conditioning': conditioning,
+            'feature_set': feature_set,
+            'feature_names': feature_names(feature_set),
+            'window_size': set_window(feature_set, WINDOW_SIZE),
+            'hop': hop,
+            **extra
+        }, f)
+
+def top_label(model, X, y):
+    # probability of the model's top label for each window, and whether it was
+    # right. for a tree that is the leaf's training fraction
+    proba = model.predict_proba(X)
+    return proba.max(axis=1), model.classes_[proba.argmax(axis=1)] == y
+
+def fit_platt(confidence, correct, windows=None, files=None):
+    # platt scaling, a logistic fit of whether the top label was right on
+    # the logit of its probability. two parameters are about what a few
+    # held-out recordings pin down, and unlike the raw fractions it never
+    # claims certainty
+    if correct.all() or not correct.any():
+        return None
+    fit = LogisticRegression().fit(logit(confidence)[:, None], correct)
+    return {'method': 'platt', 'slope': float(fit.coef_[0, 0]), 'intercept': float(fit.intercept_[0]),
+            'windows': windows, 'files': files}
+
+def calibration_scores(confidence, correct, bins=10):
+    # log loss and expected calibration error of the top label
+    p = np.clip(confidence, 1e-12, 1 - 1e-12)
+    log_loss = -np.mean(np.where(correct, np.log(p), np.log(1 - p)))
+    binned = np.minimum((confidence * bins).astype(int), bins - 1)
+    error = sum((binned == b).mean() * abs(confidence[binned == b].mean() - correct[binned == b].mean())
+                for b in np.unique(binned))
+    return log_loss, error
+
+def calibrate(model, X, y, groups):
+    # platt scaling fitted on the held-out files. the scores come from fitting
+    # on half of those files and scoring on the other half, both ways round
+    confidence, correct = top_label(model, X, y)
+    files = np.unique(groups)
+    first = np.isin(groups, files[::2])
+    raw, calibrated = [], []
+    for fit, score in ((first, ~first), (~first, first)):
+        calibration = fit_platt(confidence[fit], correct[fit]) if fit.any() and score.any() else None
+        if calibration:
+            raw.append(calibration_scores(confidence[score], correct[score]))
+            calibrated.append(calibration_scores(platt_scale(confidence[score], calibration), correct[score]))
+
+    calibration = fit_platt(confidence, correct, len(X), len(files))
+    if calibration is None:
+        print("\nevery held-out window is right (or wrong), no calibration fitted")
+        return None
+    if raw:
+        (raw_loss, raw_error), (loss, error) = np.mean(raw, axis=0), np.mean(calibrated, axis=0)
+        print(f"\nheld-out calibration: log loss {raw_loss:.3f} -> {loss:.3f}, "
+              f"top label error {raw_error:.1%} -> {error:.1%}")
+        calibration['held_out'] = {'log_loss': [round(raw_loss, 4), round(loss, 4)],
+                                   'top_label_error': [round(raw_error, 4), round(error, 4)]}
+    print(f"platt scaling: slope {calibration['slope']:.2f}, intercept {calibration['intercept']:.2f}")
+    return calibration
+
+def export_artifact(model, scaler, conditioning=None, feature_set=DEFAULT_FEATURE_SET,
+                    training_data=None, path=ARTIFACT_PATH, leaf_proba=None, calibration=None, hop=HOP,
+                    window_size=None):
+    # the tree and scaler as plain arrays the controllers load with numpy alone
+    if not isinstance(model, DecisionTreeClassifier):
+        # a stale artifact would shadow the new pickle
+        Path(path).unlink(missing_ok=True)
+        print(f"{type(model).__name__} has no numpy artifact, controllers will unpickle it")
+        return False
+
+    import sklearn
+    tree = model.tree_
+    classes = [str(label) for label in model.classes_]
+    arrays = {
+        'children_left': tree.children_left,
+        'children_right': tree.children_right,
+        'feature': tree.feature,
+        'threshold': tree.threshold,
+        'leaf_class': tree.value[:, 0, :].argmax(axis=1),
+        'used_features': split_features(tree.children_left, tree.feature, model.n_features_in_),
+        # training fractions, the calibration maps their top label at runtime
+        'leaf_proba': leaf_proba if leaf_proba is not None else leaf_fractions(model),
+        'classes': np.array(classes),
+        'scaler_mean': scaler.mean_,
+        'scaler_scale': scaler.scale_
+    }
+    schema = {
+        'model': 'decision_tree',
+        'feature_set': feature_set,
+        'feature_names': feature_names(feature_set),
+        'features_version': FEATURES_VERSION,
+        'window_size': set_window(feature_set, WINDOW_SIZE) if window_size is None else window_size,
+        'hop': hop,
+        'labels': classes,
+        'conditioning': conditioning,
+        'training_data': training_data,
+        'calibration': calibration,
+        'created': time.strftime('%Y-%m-%dT%H:%M:%S'),
+        'sklearn_version': sklearn.__version__
+    }
+    save_artifact(arrays, schema, path)
+    return True
+
+def dataset_digest(csv_files):
+    # names carry the labels, so they are part of the hash
+    digest = hashlib.sha256()
+    for path in sorted(csv_files):
+        if get_label(path.stem) is not None:
+            digest.update(f"{path.name}:{file_digest(path)}\n".encode())
+    return digest.hexdigest()
+
+def export_pickle(model_path=MODEL_PATH, artifact_path=ARTIFACT_PATH):
+    # artifact for a pickle from save_model, stamped with the windows it records.
+    # an older pickle doesn't say how its windows were cut, so it isn't exported
+    with open(model_path, 'rb') as f:
+        data = pickle.load(f)
+    missing = [key for key in ('feature_set', 'window_size', 'hop') if data.get(key) is None]
+    if missing:
+        print(f"{model_path.name} doesn't record its {', '.join(missing)}, retrain it with train_model.py")
+        return False
+    if export_artifact(data['model'], data['scaler'], data.get('conditioning'), data['feature_set'],
+                       data.get('training_data'), artifact_path, data.get('leaf_proba'), data.get('calibration'),
+                       data['hop'], data['window_size']):
+        print(f"exported {model_path.name} to {artifact_path}")
+        return True
+    return False
+
+def train(conditioning=None, feature_set=DEFAULT_FEATURE_SET, use_cache=True, jobs=None, hop=HOP):
     print("training decision tree model")
+    print(f"feature set: {feature_set}, windows every {hop} samples")
     print("-"*60)
     
     # find data directory
-    data_dir = Path(__file__).parent.parent.parent / "data" / "raw"
+    data_dir = DATA_DIR
     if not data_dir.exists():
         print("no data directory found!")
         print("please collect gesture data first")
         return
     
     # get csv files
-    csv_files = list(data_dir.glob("*.csv"))
+    csv_files = sorted(data_dir.glob("*.csv"))
     print(f"found {len(csv_files)} csv files")
     
     if len(csv_files) == 0:
         print("no data files found")
         return
     
-    # extract features and labels
-    X = []
-    y = []
-    
-    print("\nprocessing files...")
-    for i, filepath in enumerate(csv_files):
-        if i % 20 == 0:
-            print(f"  processed {i}/{len(csv_files)} files")
-        
-        # get label from filename
-        label = get_label(filepath.stem)
-        if label is None:
-            continue
-        
-        # extract features
-        features = extract_features(filepath)
-        if features is not None:
-            X.append(features)
-            y.append(label)
-    
-    print(f"\nextracted {len(X)} samples")
-    
-    if len(X) < 10:
-        print("not enough data to train (need at least 10 samples)")
+    X, y, groups = load_dataset(csv_files, conditioning, feature_set, use_cache, jobs, hop)
+    if len(X) == 0 or len(np.unique(groups)) < 10:
+        print("not enough data to train (need at least 10 files)")
         return
-    
-    # convert to arrays
-    X = np.array(X)
-    y = np.array(y)
+    print(f"\nextracted {len(X)} windows from {len(np.unique(groups))} files")
     
     # print class distribution
     unique, counts = np.unique(y, return_counts=True)
     print("\nclass distribution:")
     for label, count in zip(unique, counts):
-        print(f"  {label:12s}: {count:3d}")
+        print(f"  {label:12s}: {count:6d}")
     
-    # split data
-    X_train, X_test, y_train, y_test = train_test_split(
-        X, y, test_size=0.2, random_state=42, stratify=y if len(unique) > 1 else None
-    )
+    # split by file, windows of one recording are too alike to test on
+    split = GroupShuffleSplit(n_splits=1, test_size=0.2, random_state=42)
+    train_index, test_index = next(split.split(X, y, groups))
+    X_train, X_test = X[train_index], X[test_index]
+    y_train, y_test = y[train_index], y[test_index]
     
     print(f"\ntraining samples: {len(X_train)}")
     print(f"testing samples: {len(X_test)}")
@@ -166,28 +362,24 @@ def train():
     print(f"\nmodel accuracy: {accuracy:.2%}")
     print("\nclassification report:")
     print(classification_report(y_test, y_pred))
+
+    # probabilities for the controllers' abstain thresholds, from recordings the tree never saw
+    calibration = calibrate(model, X_test_scaled, y_test, groups[test_index])
     
     # save model
     print("\nsaving model...")
-    model_path = Path(__file__).parent / "emg_model.pkl"
-    with open(model_path, 'wb') as f:
-        pickle.dump({
-            'model': model,
-            'scaler': scaler
-        }, f)
-    
-    print(f"model saved to {model_path}")
+    training_data = dataset_digest(csv_files)
+    save_model(model, scaler, conditioning, feature_set, hop=hop, training_data=training_data,
+               calibration=calibration)
+    print(f"model saved to {MODEL_PATH}")
+    if export_artifact(model, scaler, conditioning, feature_set, training_data,
+                       calibration=calibration, hop=hop):
+        print(f"artifact saved to {ARTIFACT_PATH}")
     
     # show feature importances
     print("\nfeature importances:")
-    feature_names = [
-        'left_mean', 'left_std', 'left_max', 'left_ptp', 'left_rms',
-        'right_mean', 'right_std', 'right_max', 'right_ptp', 'right_rms',
-        'correlation', 'left_activity', 'right_activity'
-    ]
-    
     importances = model.feature_importances_
-    important_features = [(name, imp) for name, imp in zip(feature_names, importances) if imp > 0.01]
+    important_features = [(name, imp) for name, imp in zip(feature_names(feature_set), importances) if imp > 0.01]
     important_features.sort(key=lambda x: x[1], reverse=True)
     
     for name, importance in important_features:
@@ -196,4 +388,18 @@ def train():
     print("\ntraining complete! use smart_control.py to test")
 
 if __name__ == "__main__":
-    train()
+    parser = argparse.ArgumentParser(description='Train the emg gesture decision tree')
+    parser.add_argument('--features', choices=sorted(FEATURE_SETS), default=DEFAULT_FEATURE_SET,
+                        help='feature set to train on, recorded in the model')
+    add_conditioning_arguments(parser)
+    parser.add_argument('--hop', type=int, default=HOP,
+                        help=f'samples between training windows, default {HOP} (overlapping)')
+    parser.add_argument('--no-cache', action='store_true', help='extract every file again, ignore cached features')
+    parser.add_argument('--jobs', type=int, help='worker processes for feature extraction, default one per cpu')
+    parser.add_argument('--export-only', action='store_true', help='write the artifact for the current emg_model.pkl and exit')
+    args = parser.parse_args()
+    if args.export_only:
+        export_pickle()
+    else:
+        train(conditioning_from_args(args), args.features, use_cache=not args.no_cache, jobs=args.jobs,
+              hop=args.hop)
@@ -0,0 +1,141 @@
+"""
+Binary wire protocol for the XIAO streamer
+Fixed 23 byte little-endian frames, decoded in bulk with np.frombuffer
+
+    offset  size  field
+    0       2     sync word a5 5a
+    2       4     uint32 timestamp_ms
+    6       4     uint16 emg1, emg2
+    10      6     int16 accel x/y/z   (g * ACCEL_SCALE)
+    16      6     int16 gyro x/y/z    (dps * GYRO_SCALE)
+    22      1     crc8 (poly 0x07) over bytes 2..21
+"""
+
+import numpy as np
+
+SYNC = b'\xa5\x5a'
+ACCEL_SCALE = 1000.0
+GYRO_SCALE = 10.0
+CRC_POLY = 0x07
+
+FRAME_DTYPE = np.dtype([
+    ('sync', 'u1', (2,)),
+    ('timestamp_ms', '<u4'),
+    ('emg', '<u2', (2,)),
+    ('accel', '<i2', (3,)),
+    ('gyro', '<i2', (3,)),
+    ('crc', 'u1'),
+])
+FRAME_SIZE = FRAME_DTYPE.itemsize
+
+
+def _crc8_table(poly):
+    table = np.zeros(256, dtype=np.uint8)
+    for i in range(256):
+        crc = i
+        for _ in range(8):
+            crc = ((crc << 1) ^ poly) & 0xFF if crc & 0x80 else (crc << 1) & 0xFF
+        table[i] = crc
+    return table
+
+
+CRC_TABLE = _crc8_table(CRC_POLY)
+
+
+def crc8_rows(rows):
+    """CRC8 of every row of a (n, k) uint8 array, one table lookup per column"""
+    crc = np.zeros(len(rows), dtype=np.uint8)
+    for col in range(rows.shape[1]):
+        crc = CRC_TABLE[crc ^ rows[:, col]]
+    return crc
+
+
+def encode_frames(block):
+    """Encode an (n, 9) sample block into frame bytes, same as the firmware"""
+    block = np.asarray(block, dtype=np.float64).reshape(-1, 9)
+    frames = np.zeros(len(block), dtype=FRAME_DTYPE)
+    frames['sync'] = np.frombuffer(SYNC, dtype=np.uint8)
+    frames['timestamp_ms'] = block[:, 0].astype(np.int64) & 0xFFFFFFFF
+    frames['emg'] = np.clip(block[:, 1:3], 0, 0xFFFF)
+    frames['accel'] = np.clip(np.round(block[:, 3:6] * ACCEL_SCALE), -32768, 32767)
+    frames['gyro'] = np.clip(np.round(block[:, 6:9] * GYRO_SCALE), -32768, 32767)
+
+    raw = frames.view(np.uint8).reshape(len(frames), FRAME_SIZE)
+    frames['crc'] = crc8_rows(raw[:, 2:FRAME_SIZE - 1])
+    return frames.tobytes()
+
+
+def frames_to_block(frames):
+    """Convert decoded frames to an (n, 9) block in serial_ingest.FIELDS order"""
+    block = np.empty((len(frames), 9), dtype=np.float64)
+    block[:, 0] = frames['timestamp_ms']
+    block[:, 1:3] = frames['emg']
+    block[:, 3:6] = frames['accel'] / ACCEL_SCALE
+    block[:, 6:9] = frames['gyro'] / GYRO_SCALE
+    return block
+
+
+class FrameDecoder:
+    """Incremental frame decoder that resyncs after corrupt or missing bytes"""
+
+    def __init__(self):
+        self.pending = b''
+        self.frames_decoded = 0
+        self.bad_frames = 0
+        self.skipped_bytes = 0
+
+    def decode(self, data):
+        """Decode every complete frame in pending + data into a structured array"""
+        data = self.pending + data
+        buf = np.frombuffer(data, dtype=np.uint8)
+        limit = len(buf) - FRAME_SIZE + 1
+        if limit <= 0:
+            self.pending = data
+            return np.zeros(0, dtype=FRAME_DTYPE)
+
+        # every position that could start a frame, checked all at once
+        starts = np.flatnonzero((buf[:limit] == SYNC[0]) & (buf[1:limit + 1] == SYNC[1]))
+        payload = buf[starts[:, None] + np.arange(2, FRAME_SIZE - 1)]
+        valid = crc8_rows(payload) == buf[starts + FRAME_SIZE - 1]
+        good = starts[valid]
+
+        # a sync word inside a payload can pass the crc by chance, keep the first
+        if len(good) > 1 and np.any(np.diff(good) < FRAME_SIZE):
+            keep = []
+            next_free = 0
+            for start in good.tolist():
+                if start >= next_free:
+                    keep.append(start)
+                    next_free = start + FRAME_SIZE
+            good = np.array(keep, dtype=np.intp)
+
+        # failed candidates that aren't just bytes inside an accepted frame
+        bad = starts[~valid]
+        if len(bad) and len(good):
+            owner = np.maximum(np.searchsorted(good, bad, side='right') - 1, 0)
+            inside = (bad >= good[owner]) & (bad < good[owner] + FRAME_SIZE)
+            bad = bad[~inside]
+        self.bad_frames += len(bad)
+
+        consumed = int(good[-1]) + FRAME_SIZE if len(good) else 0
+        scanned = max(consumed, limit)
+        self.skipped_bytes += scanned - len(good) * FRAME_SIZE
+        self.pending = data[scanned:]
+
+        if len(good) == 0:
+            return np.zeros(0, dtype=FRAME_DTYPE)
+
+        if good[-1] - good[0] == (len(good) - 1) * FRAME_SIZE:
+            # back to back frames, view them in place
+            frames = np.frombuffer(data, dtype=FRAME_DTYPE, count=len(good), offset=int(good[0]))
+        else:
+            raw = buf[good[:, None] + np.arange(FRAME_SIZE)]
+            frames = np.frombuffer(raw.tobytes(), dtype=FRAME_DTYPE)
+
+        self.frames_decoded += len(frames)
+        return frames
+
+    def decode_block(self, data):
+        """Decode straight to an (n, 9) sample block"""
+        return frames_to_block(self.decode(data))
+
@@ -14,6 +14,13 @@ interface EMGData {
   baseline_right: number
   activation_threshold: number
   strong_threshold: number
+  last_detection: string | null
+}
+
+// sent once when the visualizer connects
+interface HelloMessage {
+  type: 'hello'
+  gestures: string[]
 }
 
 type GestureType = 'rest' | 'left_flex' | 'right_flex' | 'both_flex' | 'left_strong' | 'right_strong' | 'both_strong'
@@ -28,6 +35,8 @@ function Visualizer({ isVisible, onClose }: VisualizerProps) {
   const [isConnected, setIsConnected] = useState<boolean>(false)
   const [currentGesture, setCurrentGesture] = useState<GestureType>('rest')
   const [connectionStatus, setConnectionStatus] = useState<string>('disconnected')
+  const [feedbackGestures, setFeedbackGestures] = useState<string[]>([])
+  const [correction, setCorrection] = useState<string>('')
   const wsRef = useRef<WebSocket | null>(null)
   const canvasRef = useRef<HTMLCanvasElement>(null)
   const animationRef = useRef<number | undefined>(undefined)
@@ -45,7 +54,12 @@ function Visualizer({ isVisible, onClose }: VisualizerProps) {
       
       wsRef.current.onmessage = (event) => {
         try {
-          const data: EMGData = JSON.parse(event.data)
+          const message = JSON.parse(event.data)
+          if ((message as HelloMessage).type === 'hello') {
+            setFeedbackGestures((message as HelloMessage).gestures)
+            return
+          }
+          const data: EMGData = message
           setEmgData(prev => {
             const newData = [...prev, data]
             return newData.slice(-200) // keep only last 200 data points
@@ -80,6 +94,13 @@ function Visualizer({ isVisible, onClose }: VisualizerProps) {
     }
   }, [])
 
+  // the controller folds the last detected window into the personal model
+  const sendFeedback = useCallback((type: 'confirm' | 'correct', gesture?: string) => {
+    if (wsRef.current?.readyState === WebSocket.OPEN) {
+      wsRef.current.send(JSON.stringify({ type, gesture }))
+    }
+  }, [])
+
   const drawEMGCharts = useCallback(() => {
     const canvas = canvasRef.current
     if (!canvas || emgData.length === 0) return
@@ -242,6 +263,8 @@ function Visualizer({ isVisible, onClose }: VisualizerProps) {
   }, [isVisible, connectWebSocket, disconnectWebSocket, startVisualization, stopVisualization, onClose])
 
 
+  const lastDetection = emgData[emgData.length - 1]?.last_detection ?? null
+
   // if electron api is available, don't render react overlay
   // the electron window will handle the visualization
   if (!isVisible || (window as any).electronAPI?.showEMGVisualizer) return null
@@ -288,6 +311,46 @@ function Visualizer({ isVisible, onClose }: VisualizerProps) {
               </div>
             </div>
             
+            <div className="feedback-panel">
+              <h3>Teach Your Model</h3>
+              {lastDetection ? (
+                <>
+                  <div className="status-row">
+                    <span className="status-label">Last gesture:</span>
+                    <span className="status-value">{lastDetection.replace('_', ' ').toUpperCase()}</span>
+                  </div>
+                  <div className="feedback-actions">
+                    <button className="feedback-btn confirm" onClick={() => sendFeedback('confirm')}>
+                      ✓ Correct
+                    </button>
+                    <select
+                      className="feedback-select"
+                      value={correction}
+                      onChange={(e) => setCorrection(e.target.value)}
+                      aria-label="what the gesture actually was"
+                    >
+                      <option value="">actually was...</option>
+                      {feedbackGestures.filter(g => g !== lastDetection).map(g => (
+                        <option key={g} value={g}>{g.replace('_', ' ')}</option>
+                      ))}
+                    </select>
+                    <button
+                      className="feedback-btn correct"
+                      disabled={!correction}
+                      onClick={() => {
+                        sendFeedback('correct', correction)
+                        setCorrection('')
+                      }}
+                    >
+                      Fix
+                    </button>
+                  </div>
+                </>
+              ) : (
+                <p className="feedback-hint">make a gesture, then confirm or correct it here</p>
+              )}
+            </div>
+
             <div className="control-guide">
               <h3>EMG Control Mappings</h3>
               <div className="control-list">
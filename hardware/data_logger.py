@@ -1,4 +1,4 @@
-  import serial
+import serial
 import csv
 import time
 import argparse
@@ -12,6 +12,13 @@ from pathlib import Path
 import signal
 import sys
 
+# shared ingest code lives with the backend
+sys.path.append(str(Path(__file__).parent.parent / 'backend' / 'ml'))
+from sensor_source import SerialSource, add_source_arguments, source_from_args
+from port_discovery import discover_device
+from multi_source import MultiSource
+from serial_ingest import TIMESTAMP, EMG1, EMG2, ACCEL_X, ACCEL_Y, ACCEL_Z, GYRO_X, GYRO_Y, GYRO_Z
+
 ACTION_LABELS = [
     'rest',
     'left_single',
@@ -41,7 +48,7 @@ CALIBRATION_THRESHOLDS = {
 }
 
 class DataLogger:
-    def __init__(self, port, baudrate=115200, output_dir=None):
+    def __init__(self, port=None, baudrate=115200, output_dir=None, source=None):
         self.port = port
         self.baudrate = baudrate
 
@@ -53,7 +60,8 @@ class DataLogger:
         self.output_dir = Path(output_dir)
         self.output_dir.mkdir(parents=True, exist_ok=True)
 
-        self.serial_conn = None
+        # any SensorSource, the serial port unless one is passed in
+        self.source = source
         self.is_recording = False
         self.data_queue = queue.Queue()
         self.current_label = 'rest'
@@ -65,58 +73,34 @@ class DataLogger:
         self.load_gesture_counter()
         
     def connect(self):
+        if self.source is None:
+            self.source = SerialSource(self.port, self.baudrate, settle=2)
+
         try:
-            self.serial_conn = serial.Serial(
-                port=self.port,
-                baudrate=self.baudrate,
-                timeout=1.0
-            )
-            time.sleep(2)
-            
-            # Clear initial messages
-            while self.serial_conn.in_waiting:
-                line = self.serial_conn.readline().decode('utf-8').strip()
-                if line.startswith('#'):
-                    print(f"Device: {line}")
-                    
-            print(f"Connected to {self.port} at {self.baudrate} baud")
+            # the source drops the boot output and keeps the banner lines
+            self.source.open()
+            for line in self.source.comments:
+                print(f"Device: {line}")
+
+            if isinstance(self.source, SerialSource):
+                print(f"Connected to {self.port} at {self.baudrate} baud")
+            else:
+                print(f"Connected to {self.source}")
             return True
             
-        except serial.SerialException as e:
+        except (serial.SerialException, OSError) as e:
             print(f"Failed to connect: {e}")
             return False
     
     def read_serial_thread(self):
         while self.is_recording:
             try:
-                if self.serial_conn and self.serial_conn.in_waiting:
-                    line = self.serial_conn.readline().decode('utf-8').strip()
-
-                    if line and not line.startswith('#'):
-                        try:
-                            values = line.split(',')
-                            if len(values) == 9:
-                                timestamp = int(values[0])
-                                emg = [int(values[i]) for i in range(1, 3)]
-                                imu = [float(values[i]) for i in range(3, 9)]
-
-                                data_point = {
-                                    'timestamp_ms': timestamp,
-                                    'emg1_left': emg[0],
-                                    'emg2_right': emg[1],
-                                    'accel_x': imu[0],
-                                    'accel_y': imu[1],
-                                    'accel_z': imu[2],
-                                    'gyro_x': imu[3],
-                                    'gyro_y': imu[4],
-                                    'gyro_z': imu[5],
-                                    'label': self.current_label
-                                }
-
-                                self.data_queue.put(data_point)
-
-                        except (ValueError, IndexError) as e:
-                            print(f"Parse error: {e} - Line: {line}")
+                # one read per burst of samples, blocks for at most the port timeout
+                block = self.source.read_block()
+                if len(block):
+                    # a multi-board source also has every board's aligned channels
+                    aligned = getattr(self.source, 'last_aligned', None)
+                    self.data_queue.put((self.current_label, block, aligned))
 
             except Exception as e:
                 print(f"Read error: {e}")
@@ -125,10 +109,33 @@ class DataLogger:
     def process_data_thread(self):
         while self.is_recording or not self.data_queue.empty():
             try:
-                data_point = self.data_queue.get(timeout=0.1)
-                self.session_data.append(data_point)
-
-                if len(self.session_data) % 100 == 0:
+                label, block, aligned = self.data_queue.get(timeout=0.1)
+                previous_count = len(self.session_data)
+
+                board_columns = []
+                if aligned is not None:
+                    board_columns = MultiSource.aligned_columns(aligned.shape[1])
+                    aligned = aligned.reshape(len(aligned), -1).tolist()
+
+                for i, row in enumerate(block.tolist()):
+                    sample = {
+                        'timestamp_ms': int(row[TIMESTAMP]),
+                        'emg1_left': int(row[EMG1]),
+                        'emg2_right': int(row[EMG2]),
+                        'accel_x': row[ACCEL_X],
+                        'accel_y': row[ACCEL_Y],
+                        'accel_z': row[ACCEL_Z],
+                        'gyro_x': row[GYRO_X],
+                        'gyro_y': row[GYRO_Y],
+                        'gyro_z': row[GYRO_Z],
+                    }
+                    if board_columns:
+                        sample.update(zip(board_columns, aligned[i]))
+                    sample['label'] = label
+                    self.session_data.append(sample)
+
+                if len(self.session_data) // 100 > previous_count // 100:
+                    data_point = self.session_data[-1]
                     elapsed = (time.time() - self.start_time) if self.start_time else 0
                     print(f"  Samples: {len(self.session_data)} | "
                           f"Time: {elapsed:.1f}s | "
@@ -141,7 +148,7 @@ class DataLogger:
                 continue
     
     def start_recording(self, label='rest', duration=None):
-        if not self.serial_conn:
+        if not self.source or not self.source.is_open:
             print("Not connected! Call connect() first.")
             return False
 
@@ -286,8 +293,8 @@ class DataLogger:
         return CALIBRATION_THRESHOLDS.copy()
 
     def close(self):
-        if self.serial_conn:
-            self.serial_conn.close()
+        if self.source and self.source.is_open:
+            self.source.close()
             print("Connection closed")
 
     def calibrate_thresholds(self, calibration_data=None):
@@ -572,8 +579,10 @@ def main():
                        help='Interactive mode with menu')
     parser.add_argument('--list-ports', action='store_true',
                        help='List available serial ports')
+    add_source_arguments(parser)
 
     args = parser.parse_args()
+    source = source_from_args(args)
 
     if args.list_ports:
         import serial.tools.list_ports
@@ -582,7 +591,14 @@ def main():
             print(f"  {port.device}: {port.description}")
         return
 
-    if not args.port:
+    if not args.port and source is None:
+        # probe all ports at once, keep the connection of the one streaming
+        args.port, conn = discover_device()
+        if args.port:
+            print(f"Auto-detected port: {args.port}")
+            source = SerialSource(args.port, serial_conn=conn)
+
+    if not args.port and source is None:
         import serial.tools.list_ports
         ports = list(serial.tools.list_ports.comports())
 
@@ -608,7 +624,7 @@ def main():
                 return
 
     # Use args.output_dir if provided, otherwise default to project root data/raw
-    logger = DataLogger(args.port, output_dir=args.output_dir)
+    logger = DataLogger(args.port, output_dir=args.output_dir, source=source)
 
     if not logger.connect():
         return
@@ -9,6 +9,10 @@ const float ALPHA = 0.12f;
 const float DEADZONE = 0.01f;
 
 
+// 0 = ascii csv lines (~60 bytes/sample), 1 = 23 byte binary frames
+// the host auto-detects either format
+#define BINARY_FRAMES 0
+
 const int SAMPLE_RATE_HZ = 200;
 const int SAMPLE_PERIOD_MS = 1000 / SAMPLE_RATE_HZ;
 const int EMG_PINS[] = {A0, A1};
@@ -22,6 +26,55 @@ float accelXSm = 0, accelYSm = 0, accelZSm = 0;
 float gyroXSm = 0, gyroYSm = 0, gyroZSm = 0;
 bool firstIMURead = true;
 
+// binary frame: sync, uint32 timestamp, 2x uint16 emg, 3x int16 accel (g*1000),
+// 3x int16 gyro (dps*10), crc8 over everything between sync and crc
+const uint8_t SYNC_0 = 0xA5;
+const uint8_t SYNC_1 = 0x5A;
+const int FRAME_SIZE = 23;
+const float ACCEL_SCALE = 1000.0f;
+const float GYRO_SCALE = 10.0f;
+
+uint8_t crc8(const uint8_t *data, int len) {
+  uint8_t crc = 0;
+  for (int i = 0; i < len; i++) {
+    crc ^= data[i];
+    for (int b = 0; b < 8; b++) {
+      crc = (crc & 0x80) ? (uint8_t)((crc << 1) ^ 0x07) : (uint8_t)(crc << 1);
+    }
+  }
+  return crc;
+}
+
+void putU16(uint8_t *buf, int pos, uint16_t value) {
+  buf[pos] = value & 0xFF;
+  buf[pos + 1] = (value >> 8) & 0xFF;
+}
+
+void putScaled(uint8_t *buf, int pos, float value, float scale) {
+  float scaled = roundf(value * scale);
+  if (scaled > 32767.0f) scaled = 32767.0f;
+  if (scaled < -32768.0f) scaled = -32768.0f;
+  putU16(buf, pos, (uint16_t)(int16_t)scaled);
+}
+
+void sendFrame(unsigned long timestamp, int *emg, float ax, float ay, float az, float gx, float gy, float gz) {
+  uint8_t frame[FRAME_SIZE];
+  frame[0] = SYNC_0;
+  frame[1] = SYNC_1;
+  putU16(frame, 2, timestamp & 0xFFFF);
+  putU16(frame, 4, (timestamp >> 16) & 0xFFFF);
+  putU16(frame, 6, (uint16_t)emg[0]);
+  putU16(frame, 8, (uint16_t)emg[1]);
+  putScaled(frame, 10, ax, ACCEL_SCALE);
+  putScaled(frame, 12, ay, ACCEL_SCALE);
+  putScaled(frame, 14, az, ACCEL_SCALE);
+  putScaled(frame, 16, gx, GYRO_SCALE);
+  putScaled(frame, 18, gy, GYRO_SCALE);
+  putScaled(frame, 20, gz, GYRO_SCALE);
+  frame[22] = crc8(frame + 2, FRAME_SIZE - 3);
+  Serial.write(frame, FRAME_SIZE);
+}
+
 void setup() {
   Serial.begin(115200);
   delay(400);
@@ -46,6 +99,7 @@ void setup() {
   } else {
     Serial.println("# IMU working woohooo");
   }
+  Serial.println(BINARY_FRAMES ? "# format: binary" : "# format: csv");
   startTime = millis();
 }
 
@@ -90,7 +144,10 @@ void loop() {
     
     // time stamp
     unsigned long timestamp = currentTime - startTime;
-    
+
+#if BINARY_FRAMES
+    sendFrame(timestamp, emgValues, accelXSm, accelYSm, accelZSm, gyroXSm, gyroYSm, gyroZSm);
+#else
     // csv 
     Serial.print(timestamp);
     Serial.print(",");
@@ -112,5 +169,6 @@ void loop() {
     Serial.print(",");
     Serial.print(gyroZSm, 3);
     Serial.println();
+#endif
   }
 }